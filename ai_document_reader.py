@@ -1,76 +1,65 @@
+import uuid
 import streamlit as st
-import faiss
-import numpy as np
-from pypdf import PdfReader
-from langchain_ollama import OllamaLLM
-from langchain_huggingface import HuggingFaceEmbeddings 
-from langchain_community.vectorstores import FAISS
-from langchain_text_splitters import CharacterTextSplitter
-from langchain_core.documents import Document
+import pipelines
+from llm_streaming import format_stats
+from hybrid_search import RETRIEVAL_K
+from pdf_pipeline import split_pages
+from shared_resources import (DEFAULT_WORKSPACE, get_embedding_cache, get_llm, get_response_cache,
+                              get_summarizer, get_vector_store, serve_metrics, warm_up)
+from tracing import render_waterfall, trace
 
-#Load AI Model
-llm = OllamaLLM(model="llama3.2:1b")
+#Load the embedding and Ollama models in the background the first time the server runs this page
+warm_up()
+#Stage timings at http://localhost:METRICS_PORT/metrics when METRICS_PORT is set
+serve_metrics()
+#Load AI Model (shared by every session; built once per server process, not on every rerun)
+llm = get_llm()
+#Reuse answers to repeated or near-identical questions over the same retrieved context
+response_cache = get_response_cache(llm.model)
+#Summarize whole documents with concurrent map-reduce over their chunks
+summarizer = get_summarizer(llm.model)
 
-#Load huggingface embedding model
-embedding_model =HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-#Initialize FAISS vector Database
-index = faiss.IndexFlatL2(384)  # Dimension for all-MiniLM-L6-v2 is 384
-vector_store = {}  
+#Embed in length-sorted batches across a process pool, caching results on disk;
+#the huggingface embedding model itself is loaded on first use
+embedding_cache = get_embedding_cache()
+#Each browser session searches only its own namespace (a separate sub-index), named by a random
+#id kept in the page URL so a refresh reopens it. Entering the shared workspace's name (where
+#ingest.py stores) or any other name opens that workspace instead.
+if "workspace" not in st.session_state:
+    st.session_state.workspace = st.query_params.get("workspace") or uuid.uuid4().hex
+workspace = st.sidebar.text_input("Workspace:", key="workspace",
+                                  help="Documents are only searchable in the workspace they were stored in. "
+                                       f"Enter \"{DEFAULT_WORKSPACE}\" to search documents loaded by ingest.py.")
+st.query_params["workspace"] = workspace
+#Open persistent FAISS vector Database (memory-mapped index + SQLite chunk docstore)
+vector_store = get_vector_store("document_reader", workspace)
 summary_text = "" 
-#Function to process PDF document
+#Function to process PDF document: yields page texts in order, extracted in parallel
 def extract_text_from_pdf(uploaded_file):
-    pdf_reader = PdfReader(uploaded_file)
-    text = ""
-    for page in pdf_reader.pages:
-        text += page.extract_text() + "\n"
-    return text
+    yield from pipelines.extract_text_from_pdf(uploaded_file, st.write)
 
-#function to store data in FAISS
-def store_in_faiss(text, filename):
-    global index, vector_store
-    st.write("Storing data in FAISS vector store...")
-    
-    #Split text into chunks
-    splitter = CharacterTextSplitter(chunk_size=500, chunk_overlap=100)
-    texts = splitter.split_text(text)
-
-    #convert texts to embeddings
-    vectors = embedding_model.embed_documents(texts)
-    vectors = np.array(vectors).astype(np.float32)
-
-    #store in FAISS
-    index.add(vectors)
-    vector_store[len(vector_store)] = (filename, texts)
-
-    return "Data stored successfully."
+#function to store data in FAISS (skips documents already in the persistent store, e.g. on Streamlit reruns)
+def store_in_faiss(pages, source):
+    #Split text into chunks; pages are only extracted if the document is new
+    return pipelines.store_in_faiss(vector_store, embedding_cache, source, split_pages(pages, pipelines.make_splitter()),
+                                    st.write)
 
 #Function to generate AI summary
-def generate_summary(text):
+def generate_summary(texts):
     global summary_text
     st.write("Generating summary...")
-    summary_text = llm.invoke(f"Summarize the following document content:\n\n{text[:3000]}")
+    #Stream the final merge of the map-reduce summary into the page
+    stats = {}
+    summary_text = st.write_stream(summarizer.stream_summary(texts, stats))
+    if stats:
+        st.caption(format_stats(stats))
     return summary_text
 
-#function to retrieve relevant info from FAISS
-def retrieve_and_answer(query):
-    global index, vector_store
-    
-    #Convert query to embedding
-    query_vector = np.array(embedding_model.embed_query(query)).astype(np.float32).reshape(1, -1)
-
-    #Search in FAISS
-    D, I = index.search(query_vector, k=2)  # Retrieve top 2 relevant chunks
-    context = ""
-    for idx in I[0]:
-        # Skip invalid indices (FAISS returns -1 for no match)
-        if idx >= 0 and idx < len(vector_store):
-            context += "\n".join(vector_store[idx][1]) + "\n\n"
-
-    if not context:
-        return "No relevant information found in the document."
-    
-    #Ask AI to generate an answer using the context
-    return llm.invoke(f"Using the following context from the document, answer the question:\n\nContext:\n{context}\n\nQuestion: {query}\nAnswer:") 
+#function to retrieve relevant info from FAISS (yields answer tokens as they are generated)
+def retrieve_and_answer(query, stats=None, k=RETRIEVAL_K):
+    yield from pipelines.retrieve_and_answer(query, vector_store, embedding_cache, llm, response_cache, stats, k,
+                                             template=pipelines.DOCUMENT_PROMPT,
+                                             not_found="No relevant information found in the document.")
 
 #Function to allow file download
 def download_summary():
@@ -89,21 +78,32 @@ st.write("Upload a PDF and get an AI-generated summary and Q&A capabilities.")
 #File uploader
 uploaded_file = st.file_uploader("Choose a PDF file", type="pdf")
 if uploaded_file:
-    text = extract_text_from_pdf(uploaded_file)
-    store_message = store_in_faiss(text, uploaded_file.name)
-    st.write(store_message)
+    with trace("upload", file=uploaded_file.name) as t:
+        source = pipelines.document_source(uploaded_file.name, uploaded_file.getvalue())
+        store_message = store_in_faiss(extract_text_from_pdf(uploaded_file), source)
+        st.write(store_message)
 
-    #Generate AI summary
-    summary = generate_summary(text)
-    st.subheader("**AI-Generated Summary:**")
-    st.write(summary)
+        #Generate AI summary
+        st.subheader("**AI-Generated Summary:**")
+        summary = generate_summary(vector_store.get_document_chunks(source))
+    st.session_state.last_trace = t
 
     #Enable file download for summary
     download_summary()
 #User input for questions
 query = st.text_input("Ask a question based on the uploaded document:", "")
+k = st.number_input("Chunks to retrieve:", min_value=1, max_value=20, value=RETRIEVAL_K)
 if query:
-    answer = retrieve_and_answer(query)
     st.subheader("**AI Answer:**")
-    st.write(answer)
+    stats = {}
+    with trace("ask") as t:
+        st.write_stream(retrieve_and_answer(query, stats, int(k)))
+    st.session_state.last_trace = t
+    if stats:
+        st.caption(format_stats(stats))
+    st.caption(f"Response cache hit rate: {response_cache.hit_rate:.0%}")
+
+#Where the last request spent its time: one bar per stage
+if st.sidebar.checkbox("⏱️ Show stage timings") and "last_trace" in st.session_state:
+    render_waterfall(st.session_state.last_trace, st.sidebar)
 
@@ -1,43 +1,44 @@
-import speech_recognition as sr
-import pyttsx3
 from langchain_community.chat_message_histories import ChatMessageHistory
 from langchain_core.prompts import PromptTemplate
 from langchain_ollama import OllamaLLM
+from chat_memory import ConversationMemory
+import pipelines
+from speech_input import SpeechListener, microphone_frames, open_microphone
+from voice_pipeline import BARGE_IN_FACTOR, BargeInMonitor, SpeechWorker, speak_stream
+from tracing import format_trace, start_metrics_server, trace
 
 #Load AI Model
 llm = OllamaLLM(model="llama3.2:1b")
 
 #Initialize chat message history
 chat_history = ChatMessageHistory()
+#Token-budgeted view of the history that is sent with each prompt
+memory = ConversationMemory(llm, chat_history)
 
-#Initialize speech recognition and text-to-speech engines
-engine = pyttsx3.init()
-engine.setProperty('rate', 160)  # Set speaking rate
+#Text-to-speech runs on its own thread and speaks queued sentences while the LLM keeps generating
+speech = SpeechWorker()
 
-#speech Recognition
-recognizer = sr.Recognizer()
+#speech Recognition (local by default; the noise floor is calibrated once and then tracked)
+listener = SpeechListener()
 
 #Function to speak
 def speak(text):
-    engine.say(text)
-    engine.runAndWait()
+    speech.say(text)
+    speech.wait()
 
-#Function to Listen
+#Function to Listen (prints the partial transcript while the user is still speaking)
 def listen():
-    with sr.Microphone() as source:
-        print("Listening...")
-        recognizer.adjust_for_ambient_noise(source)
-        audio = recognizer.listen(source)
+    print("Listening...")
+    frames = microphone_frames(open_microphone())
     try:
-        query = recognizer.recognize_google(audio)
-        print(f"You: {query}")
-        return query.lower()
-    except sr.UnknownValueError:
-        print("Sorry, I did not understand that.")
+        query = listener.listen(frames, on_partial=lambda text: print(f"\r... {text}", end="", flush=True))
+    finally:
+        frames.close()
+    if not query:
+        print("\rSorry, I did not understand that.")
         return None
-    except sr.RequestError:
-        print("Could not request results; check your network connection.")
-        return None    
+    print(f"\rYou: {query}")
+    return query.lower()
     
 #AI chat prompt
 prompt = PromptTemplate(
@@ -45,24 +46,35 @@ prompt = PromptTemplate(
     template="Previous conversation:\n{chat_history}\n\nUser: {question}\nAI:",
 )    
 
-#Function to process AI Responce
+#Function to process AI Responce (yields response tokens as they are generated)
 def run_chain(question):
-    #Retrieve chat history
-    chat_history_text ="\n".join([f"{msg.type.capitalize()}: {msg.content}" for msg in chat_history.messages])
-    #Run the AI Responce generation
-    response = llm.invoke(prompt.format(chat_history=chat_history_text, question=question))
-    # store new user input and AI response in memory
-    chat_history.add_user_message(question)
-    chat_history.add_ai_message(response)
-    return response
+    #Recent turns plus a rolling summary of older ones go into the prompt; the turn is stored
+    #in the history afterwards (as far as it got if interrupted)
+    yield from pipelines.run_chain(question, llm, prompt, memory, chat_history)
+
+#Function to answer out loud: sentences are spoken as soon as they are generated, and talking
+#over the assistant (barge-in) stops it so the next question can be asked right away
+def answer(question):
+    monitor = BargeInMonitor(microphone_frames(open_microphone()), listener.vad.noise.threshold * BARGE_IN_FACTOR)
+    try:
+        response, stats = speak_stream(run_chain(question), speech, monitor.interrupted)
+    finally:
+        monitor.stop()
+    print("AI:", response)
+    if stats["interrupted"]:
+        print("(interrupted)")
+    print(f"First audio after {stats['time_to_first_audio_s']}s")
+#Stage timings at http://localhost:METRICS_PORT/metrics when METRICS_PORT is set
+start_metrics_server()
 #Main Loop
 speak("Hello! I am your AI voice assistant. How can I help you today?")
 while True:
-    query = listen()
+    with trace("voice_turn") as turn:
+        query = listen()
+        if query:
+            if 'exit' in query or 'quit' in query:
+                speak("Goodbye!")
+                break
+            answer(query)
     if query:
-        if 'exit' in query or 'quit' in query:
-            speak("Goodbye!")
-            break
-        ai_response = run_chain(query)
-        print("AI:", ai_response)
-        speak(ai_response)
\ No newline at end of file
+        print(format_trace(turn))
\ No newline at end of file
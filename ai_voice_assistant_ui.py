@@ -1,50 +1,55 @@
 import streamlit as st
 from langchain_community.chat_message_histories import ChatMessageHistory
-import pyttsx3
 from langchain_core.prompts import PromptTemplate
-from langchain_ollama import OllamaLLM
-import speech_recognition as sr
+from shared_resources import get_llm, get_speech_listener, get_speech_worker, serve_metrics, warm_up
+from llm_streaming import format_stats
+import pipelines
+from chat_memory import ConversationMemory
+from speech_input import microphone_frames, open_microphone
+from voice_pipeline import speak_as_generated
+from tracing import render_waterfall, trace
 
-#Load AI Model
-llm = OllamaLLM(model="llama3.2:1b")
+#Load the Ollama model in the background the first time the server runs this page
+warm_up(embedding_model_name=None)
+#Stage timings at http://localhost:METRICS_PORT/metrics when METRICS_PORT is set
+serve_metrics()
+#Load AI Model (shared by every session; built once per server process, not on every rerun)
+llm = get_llm()
 
 #Initialize chat history
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = ChatMessageHistory()
+#Token-budgeted view of the history that is sent with each prompt
+if "memory" not in st.session_state:
+    st.session_state.memory = ConversationMemory(llm, st.session_state.chat_history)
+#Timing of the last streamed response
+if "llm_stats" not in st.session_state:
+    st.session_state.llm_stats = {}
 
-#speech Recognition
-recognizer = sr.Recognizer()
+#speech Recognition (one listener per server process; its noise floor is calibrated once)
+listener = get_speech_listener()
 
-#Function to Speak AI responce
-def speak(text):
-    try:
-        # Initialize engine fresh each time to avoid threading issues with Streamlit
-        engine = pyttsx3.init()
-        engine.setProperty('rate', 160)  # Set speaking rate
-        engine.say(text)
-        engine.runAndWait()
-        engine.stop()
-    except Exception as e:
-        st.warning(f"⚠️ Text-to-speech failed: {str(e)}")
-        # Fallback: just display the text
-        pass
+#Text-to-speech runs on one long-lived worker thread per server process: the engine starts once,
+#replies are queued without blocking the page, and fixed phrases are pre-rendered to WAV
+SORRY = "Sorry, I did not understand that."
+speech = get_speech_worker(prerender=[SORRY])
 
-#Function to listen to voice input
+#Function to listen to voice input (shows the partial transcript while the user is speaking)
 def listen():
-    with sr.Microphone() as source:
-        st.write("Listening...")
-        recognizer.adjust_for_ambient_noise(source)
-        audio = recognizer.listen(source)
+    status = st.empty()
+    status.write("Listening...")
+    frames = microphone_frames(open_microphone())
     try:
-        query = recognizer.recognize_google(audio)
-        print(f"You: {query}")
-        return query.lower()
-    except sr.UnknownValueError:
-        print("Sorry, I did not understand that.")
+        query = listener.listen(frames, on_partial=lambda text: status.write(f"🎙️ {text}"))
+    finally:
+        frames.close()
+    if not query:
+        status.write(SORRY)
+        speech.say(SORRY)
         return None
-    except sr.RequestError:
-        print("Could not request results; check your network connection.")
-        return None 
+    status.write(f"🎙️ {query}")
+    print(f"You: {query}")
+    return query.lower()
 
 #define SI chat prompt
 prompt = PromptTemplate(
@@ -52,16 +57,10 @@ prompt = PromptTemplate(
     template="Previous conversation:\n{chat_history}\n\nUser: {question}\nAI:",
 )
 
-#Function to process AI Responce
+#Function to process AI Responce (yields response tokens as they are generated)
 def run_chain(question):
-    #Retrieve chat history
-    chat_history_text ="\n".join([f"{msg.type.capitalize()}: {msg.content}" for msg in st.session_state.chat_history.messages])
-    #Run the AI Responce generation
-    response = llm.invoke(prompt.format(chat_history=chat_history_text, question=question))
-    # store new user input and AI response in memory
-    st.session_state.chat_history.add_user_message(question)
-    st.session_state.chat_history.add_ai_message(response)
-    return response
+    #Recent turns plus a rolling summary of older ones go into the prompt; the turn is stored in the history afterwards
+    yield from pipelines.run_chain(question, llm, prompt, st.session_state.memory, st.session_state.chat_history, st.session_state.llm_stats)
 
 #Streamlit web UI
 st.set_page_config(page_title="AI Voice Assistant", page_icon="🎤", layout="wide")
@@ -131,8 +130,16 @@ with st.sidebar:
     st.write("💾 Conversation Memory")
     st.write("🧠 Context Awareness")
     
+    #Speech plays in the background, so it can be skipped or stopped while the page stays usable
+    skip_col, stop_col = st.columns(2)
+    if skip_col.button("⏭️ Skip sentence", use_container_width=True):
+        speech.skip()
+    if stop_col.button("⏹️ Stop speaking", use_container_width=True):
+        speech.cancel()
+    
     if st.button("🗑️ Clear All History", use_container_width=True):
         st.session_state.chat_history = ChatMessageHistory()
+        st.session_state.memory = ConversationMemory(llm, st.session_state.chat_history)
         st.rerun()
 
 # Main title
@@ -144,12 +151,18 @@ st.markdown("---")
 col1, col2, col3 = st.columns([1, 2, 1])
 with col2:
     if st.button("🎙️ Start Talking", use_container_width=True):
-        user_query = listen()
+        #A new question interrupts whatever is still being said
+        speech.cancel()
+        #Sentences are spoken after the page has finished; they are added to this trace as they play
+        with trace("voice_turn") as t:
+            user_query = listen()
+            if user_query:
+                #Show the answer as it is generated and speak each sentence as soon as it is complete
+                ai_response = st.write_stream(speak_as_generated(run_chain(user_query), speech))
+        st.session_state.last_trace = t
         if user_query:
-            with st.spinner("🤔 Processing your question..."):
-                ai_response = run_chain(user_query)
             st.success("✅ Response ready!")
-            speak(ai_response)
+            st.caption(format_stats(st.session_state.llm_stats))
 
 st.markdown("---")
 
@@ -163,4 +176,7 @@ else:
         if msg.type == "human":
             st.markdown(f'<div class="user-msg">👤 <strong>You said:</strong><br>{msg.content}</div>', unsafe_allow_html=True)
         else:
-            st.markdown(f'<div class="ai-msg">🤖 <strong>AI responded:</strong><br>{msg.content}</div>', unsafe_allow_html=True)        
\ No newline at end of file
+            st.markdown(f'<div class="ai-msg">🤖 <strong>AI responded:</strong><br>{msg.content}</div>', unsafe_allow_html=True)        
+#Where the last turn spent its time: one bar per stage (rerun the page to see speech that was still playing)
+if st.sidebar.checkbox("⏱️ Show stage timings") and "last_trace" in st.session_state:
+    render_waterfall(st.session_state.last_trace, st.sidebar)
@@ -1,35 +1,27 @@
-import requests
-from bs4 import BeautifulSoup
 import streamlit as st
-from langchain_ollama import OllamaLLM
+import pipelines
+from llm_streaming import format_stats
+from shared_resources import get_llm, get_page_cache, get_summarizer, serve_metrics, warm_up
+from tracing import render_waterfall, trace
 
-#Load AI Model
-llm = OllamaLLM(model="llama3.2:1b")
+#Load the Ollama model in the background the first time the server runs this page
+warm_up(embedding_model_name=None)
+#Stage timings at http://localhost:METRICS_PORT/metrics when METRICS_PORT is set
+serve_metrics()
+#Load AI Model (shared by every session; built once per server process, not on every rerun)
+llm = get_llm()
+#Compressed on-disk HTTP cache; unchanged pages are revalidated (304) instead of re-downloaded
+page_cache = get_page_cache()
+#Summarize whole pages with concurrent map-reduce over their chunks
+summarizer = get_summarizer(llm.model)
 
-#Function to scrape web page content
+#Function to scrape web page content (served from the page cache when unchanged); returns (text, error)
 def scrape_web_page(url):
-    try:
-        st.write(f"Scraping content from: {url}")
-        headers = {
-            "User-Agent": "Mozilla/5.0"
-        }
-        response = requests.get(url, headers=headers)
-
-        if response.status_code != 200:
-            return f"Failed to fetch {url}"
-        
-        #Extract text content using BeautifulSoup
-        soup = BeautifulSoup(response.content, 'html.parser')   
-        paragraphs = soup.find_all('p')
-        text = "\n".join([para.get_text() for para in paragraphs])
-
-        return text[:2000]  # Limit to first 2000 characters for brevity
-    except Exception as e:
-        return f"An error occurred: {str(e)}"
-#Function to generate summary using AI model
-def summarize_content(content):
+    return pipelines.scrape_web_page(url, page_cache, st.write)
+#Function to generate summary using AI model (yields summary tokens as they are generated)
+def summarize_content(content, stats=None):
     st.write("Summarize content...")
-    return llm.invoke(f"Summarize the following content:\n\n{content[:1000]}")
+    yield from summarizer.stream_summary(pipelines.split_text(pipelines.make_splitter(chunk_overlap=0), content), stats)
 #Streamlit web UI
 st.set_page_config(page_title="AI Web Scraper", page_icon="🌐", layout="wide")
 
@@ -105,27 +97,37 @@ with col2:
 
 if url and (scrape_button or url):
     if url.startswith("http://") or url.startswith("https://"):
-        with st.spinner("🔍 Fetching web content..."):
-            content = scrape_web_page(url)
+        with trace("summarize", url=url) as t:
+            with st.spinner("🔍 Fetching web content..."):
+                content, error = scrape_web_page(url)
         
-        if "Failed" in content or "error" in content:
-            st.error(f"❌ {content}")
-        else:
-            # Show content preview
-            with st.expander("📄 View Scraped Content Preview", expanded=False):
-                st.markdown(f'<div class="content-preview">{content[:500]}...</div>', unsafe_allow_html=True)
+            if error:
+                st.error(f"❌ {error}")
+            else:
+                # Show content preview
+                with st.expander("📄 View Scraped Content Preview", expanded=False):
+                    st.markdown(f'<div class="content-preview">{content[:500]}...</div>', unsafe_allow_html=True)
             
-            # Generate and display summary
-            with st.spinner("🤔 AI is analyzing and summarizing..."):
-                summary = summarize_content(content)
+                # Generate and display summary, re-rendering the box as tokens arrive
+                st.markdown("### 📊 AI-Generated Summary:")
+                summary_box = st.empty()
+                summary = ""
+                stats = {}
+                with st.spinner("🤔 AI is analyzing and summarizing..."):
+                    for token in summarize_content(content, stats):
+                        summary += token
+                        summary_box.markdown(f'<div class="summary-box"><strong>Summary:</strong><br><br>{summary}</div>', unsafe_allow_html=True)
             
-            st.success("✅ Summary generated successfully!")
-            st.markdown("### 📊 AI-Generated Summary:")
-            st.markdown(f'<div class="summary-box"><strong>Summary:</strong><br><br>{summary}</div>', unsafe_allow_html=True)
+                st.success("✅ Summary generated successfully!")
+                if stats:
+                    st.caption(format_stats(stats))
+        st.session_state.last_trace = t
     else:
         st.warning("⚠️ Please enter a valid URL starting with http:// or https://")
     
 
             
 
-
+#Where the last request spent its time: one bar per stage
+if st.sidebar.checkbox("⏱️ Show stage timings") and "last_trace" in st.session_state:
+    render_waterfall(st.session_state.last_trace, st.sidebar)
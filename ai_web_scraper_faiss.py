@@ -1,99 +1,131 @@
-import requests
-from bs4 import BeautifulSoup
+import uuid
 import streamlit as st
-import faiss
-import numpy as np
-from langchain_ollama import OllamaLLM
-from langchain_huggingface import HuggingFaceEmbeddings 
-from langchain_community.vectorstores import FAISS
-from langchain_text_splitters import CharacterTextSplitter   
-from langchain_core.documents import Document
+import pipelines
+from llm_streaming import format_stats
+from hybrid_search import RETRIEVAL_K
+from shared_resources import (DEFAULT_WORKSPACE, get_embedding_cache, get_llm, get_page_cache, get_response_cache,
+                              get_vector_store, serve_metrics, warm_up)
+from tracing import render_waterfall, trace
+from web_crawler import WebCrawler
 
-#Load AI Model
-llm = OllamaLLM(model="llama3.2:1b")
+#Load the embedding and Ollama models in the background the first time the server runs this page
+warm_up()
+#Stage timings at http://localhost:METRICS_PORT/metrics when METRICS_PORT is set
+serve_metrics()
+#Load AI Model (shared by every session; built once per server process, not on every rerun)
+llm = get_llm()
+#Compressed on-disk HTTP cache; unchanged pages are revalidated (304) instead of re-downloaded
+page_cache = get_page_cache()
+#Reuse answers to repeated or near-identical questions over the same retrieved context
+response_cache = get_response_cache(llm.model)
 
-#Load Embedding Model
-embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-#Initialize FAISS vector store
-index = faiss.IndexFlatL2(384)  # Dimension for all-MiniLM-L6-v2 is 384
-vector_store = {}
+#Embed in length-sorted batches across a process pool, caching results on disk;
+#the embedding model itself is loaded on first use
+embedding_cache = get_embedding_cache()
+#Each browser session searches only its own namespace (a separate sub-index), named by a random
+#id kept in the page URL so a refresh reopens it. Entering the shared workspace's name (where
+#ingest.py stores) or any other name opens that workspace instead.
+if "workspace" not in st.session_state:
+    st.session_state.workspace = st.query_params.get("workspace") or uuid.uuid4().hex
+workspace = st.sidebar.text_input("Workspace:", key="workspace",
+                                  help="Documents are only searchable in the workspace they were stored in. "
+                                       f"Enter \"{DEFAULT_WORKSPACE}\" to search documents loaded by ingest.py.")
+st.query_params["workspace"] = workspace
+#Open persistent FAISS vector store (memory-mapped index + SQLite chunk docstore)
+vector_store = get_vector_store("web_scraper", workspace)
 
-#Function to scrape web page content
+#Function to scrape web page content (served from the page cache when unchanged); returns (text, error)
 def scrape_web_page(url):
-    try:
-        st.write(f"Scraping content from: {url}")
-        headers = {
-            "User-Agent": "Mozilla/5.0"
-        }
-        response = requests.get(url, headers=headers)
+    return pipelines.scrape_web_page(url, page_cache, st.write, max_chars=5000)  # Limit to first 5000 characters for brevity
 
-        if response.status_code != 200:
-            return f"Failed to fetch {url}"
-        
-        #Extract text content using BeautifulSoup
-        soup = BeautifulSoup(response.content, 'html.parser')   
-        paragraphs = soup.find_all('p')
-        text = "\n".join([p.get_text() for p in paragraphs])
-
-        return text[:5000]  # Limit to first 5000 characters for brevity
-    except Exception as e:
-        return f"An error occurred: {str(e)}"
-    
-#Function to store data in FAISS
+#Function to store data in FAISS (skips pages already in the persistent store, e.g. on Streamlit reruns)
 def store_in_faiss(text, url):
-    global index, vector_store
-    st.write("Storing data in FAISS vector store...")
-    
     #Split text into chunks
-    splitter = CharacterTextSplitter(chunk_size=500, chunk_overlap=100)
-    texts = splitter.split_text(text)
-
-    #convert texts to embeddings
-    vectors = embedding_model.embed_documents(texts)
-    vectors = np.array(vectors).astype(np.float32)
-
-    #store in FAISS
-    index.add(vectors)
-    vector_store[len(vector_store)] = (url, texts)
-
-    return "Data stored successfully."
-#Function to retrieve relevant info from FAISS
-def retrieve_and_answer(query):
-    global index, vector_store
-
-    #Convert query into embedding
-    query_vector = np.array(embedding_model.embed_query(query)).astype(np.float32).reshape(1, -1)
+    chunks = pipelines.split_text(pipelines.make_splitter(), text)
+    return pipelines.store_in_faiss(vector_store, embedding_cache, url, chunks, st.write, kind="Page")
 
-    #Search FAISS for similar vectors
-    D, I = index.search(query_vector, k=2)  # Retrieve top
+#Function to store a batch of crawled pages with one embedding call and one index write;
+#returns the number of pages stored and the duplicate-chunk stats
+def store_pages_in_faiss(pages):
+    splitter = pipelines.make_splitter()
+    documents = []
+    for page in pages:
+        if page.text.strip() and not vector_store.has_document(page.url):
+            documents.append((page.url, pipelines.split_text(splitter, page.text)))
+    #Site-wide nav and footer chunks repeat on every page; only their first copy is kept
+    stored, dedup_stats = pipelines.store_documents_in_faiss(vector_store, embedding_cache, documents)
+    return len(stored), dedup_stats
 
-    context = ""
-    for idx in I[0]:
-        if idx in vector_store:
-            context += "\n".join(vector_store[idx][1]) + "\n\n"
+#Function to crawl a site (seed URLs or a sitemap) straight into FAISS
+def crawl_and_store(seeds, max_depth, max_pages, batch_size=16):
+    crawler = WebCrawler(max_depth=max_depth, max_pages=max_pages)
+    progress = st.empty()
+    batch = []
+    stored = 0
+    removed = 0
+    bytes_saved = 0
+    #Pages stream in while earlier batches are embedded; the crawler pauses if we fall behind
+    for page in crawler.iter_pages(seeds):
+        batch.append(page)
+        if len(batch) >= batch_size:
+            pages_stored, dedup_stats = store_pages_in_faiss(batch)
+            stored += pages_stored
+            removed += dedup_stats["removed"]
+            bytes_saved += dedup_stats["index_bytes_saved"]
+            batch = []
+        progress.write(f"Crawled {crawler.pages_fetched} pages, stored {stored} ({crawler.pages_per_second:.1f} pages/s)")
+    pages_stored, dedup_stats = store_pages_in_faiss(batch)
+    stored += pages_stored
+    removed += dedup_stats["removed"]
+    bytes_saved += dedup_stats["index_bytes_saved"]
+    progress.write(f"Crawled {crawler.pages_fetched} pages, stored {stored} ({crawler.pages_per_second:.1f} pages/s)")
+    st.write(f"🧹 Skipped {removed} duplicate chunks ({removed} embeddings, {bytes_saved / 1024:.0f} KB of index saved)")
+    return f"Crawl finished: {stored} new pages stored, {crawler.errors} errors."
 
-            if not context:
-                return "No relevant information found in the vector store."
-            
-            #Ask AI to generate an answer
-            return llm.invoke(f"Using the following context, answer the question:\n\nContext:\n{context}\n\nQuestion: {query}")
+#Function to retrieve relevant info from FAISS (yields answer tokens as they are generated)
+def retrieve_and_answer(query, stats=None, k=RETRIEVAL_K):
+    yield from pipelines.retrieve_and_answer(query, vector_store, embedding_cache, llm, response_cache, stats, k)
 #Streamlit web UI
 st.title("🌐 AI Web Scraper with FAISS Vector Store")
 st.write("Enter a website URL below and store its knowledge for AI-based Q&A.")
 #User input for website
 url = st.text_input("Website URL:", "")
 if url:
-    content = scrape_web_page(url)
-    if "Failed" in content or "error" in content:
-        st.write(content)
-    else:
-        
-        store_message = store_in_faiss(content, url)
-        st.write(store_message)
+    with trace("scrape", url=url) as t:
+        content, error = scrape_web_page(url)
+        if error:
+            st.write(error)
+        else:
+            
+            store_message = store_in_faiss(content, url)
+            st.write(store_message)
+    st.session_state.last_trace = t
+
+#Crawl many pages at once (seed URLs or a sitemap.xml)
+with st.expander("🕸️ Crawl a whole site"):
+    seeds_text = st.text_area("Seed URLs or sitemap.xml (one per line):", "")
+    max_depth = st.number_input("Link depth:", min_value=0, max_value=5, value=1)
+    max_pages = st.number_input("Max pages:", min_value=1, max_value=100000, value=200)
+    if st.button("Crawl & Store") and seeds_text.strip():
+        seeds = [line.strip() for line in seeds_text.splitlines() if line.strip()]
+        with trace("crawl", seeds=len(seeds)) as t:
+            st.write(crawl_and_store(seeds, int(max_depth), int(max_pages)))
+        st.session_state.last_trace = t
 
 #User input for questions
 query = st.text_input("Ask a question based on stored web content:",) 
+k = st.number_input("Chunks to retrieve:", min_value=1, max_value=20, value=RETRIEVAL_K)
 if query:
-    answer = retrieve_and_answer(query)
     st.subheader("**AI Answer:**")
-    st.write(answer)       
\ No newline at end of file
+    stats = {}
+    with trace("ask") as t:
+        st.write_stream(retrieve_and_answer(query, stats, int(k)))
+    st.session_state.last_trace = t
+    if stats:
+        st.caption(format_stats(stats))
+    st.caption(f"Response cache hit rate: {response_cache.hit_rate:.0%}")
+
+#Where the last request spent its time: one bar per stage
+if st.sidebar.checkbox("⏱️ Show stage timings") and "last_trace" in st.session_state:
+    render_waterfall(st.session_state.last_trace, st.sidebar)
+       
\ No newline at end of file
@@ -1,13 +1,27 @@
 import streamlit as st
 from langchain_community.chat_message_histories import ChatMessageHistory
 from langchain_core.prompts import PromptTemplate
-from langchain_ollama import OllamaLLM
-
-#Load AI Model
-llm = OllamaLLM(model="llama3.2:1b")
+from shared_resources import get_llm, serve_metrics, warm_up
+from llm_streaming import format_stats
+import pipelines
+from chat_memory import ConversationMemory
+from tracing import render_waterfall, trace
+
+#Load the Ollama model in the background the first time the server runs this page
+warm_up(embedding_model_name=None)
+#Stage timings at http://localhost:METRICS_PORT/metrics when METRICS_PORT is set
+serve_metrics()
+#Load AI Model (shared by every session; built once per server process, not on every rerun)
+llm = get_llm()
 #Initialize chat message history
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = ChatMessageHistory()
+#Token-budgeted view of the history that is sent with each prompt
+if "memory" not in st.session_state:
+    st.session_state.memory = ConversationMemory(llm, st.session_state.chat_history)
+#Timing of the last streamed response
+if "llm_stats" not in st.session_state:
+    st.session_state.llm_stats = {}
 
 #Define AI chat prompt template
 prompt = PromptTemplate(
@@ -20,19 +34,10 @@ Previous conversation:
 User: {question}
 AI Assistant:""",
 )    
-#Function to run AI chat with memory
+#Function to run AI chat with memory (yields response tokens as they are generated)
 def run_chain(question):
-    #Retrieve chat history
-    chat_history_text ="\n".join([f"{msg.type.capitalize()}: {msg.content}" for msg in st.session_state.chat_history.messages])
-
-
-    #Run the AI Responce generation
-    response = llm.invoke(prompt.format(chat_history=chat_history_text, question=question))
-
-    # store new user input and AI response in memory
-    st.session_state.chat_history.add_user_message(question)
-    st.session_state.chat_history.add_ai_message(response)
-    return response
+    #Recent turns plus a rolling summary of older ones go into the prompt; the turn is stored in the history afterwards
+    yield from pipelines.run_chain(question, llm, prompt, st.session_state.memory, st.session_state.chat_history, st.session_state.llm_stats)
 
 
 # Streamlit UI
@@ -79,6 +84,7 @@ with st.sidebar:
     
     if st.button("🗑️ Clear Chat History", use_container_width=True):
         st.session_state.chat_history = ChatMessageHistory()
+        st.session_state.memory = ConversationMemory(llm, st.session_state.chat_history)
         st.rerun()
 
 # Main title
@@ -112,9 +118,19 @@ with st.form(key="chat_form", clear_on_submit=True):
         send_button = st.form_submit_button("Send 📤", use_container_width=True)
 
 if send_button and user_input:
-    with st.spinner("🤔 Thinking..."):
-        response = run_chain(user_input)
-        st.rerun()     
+    st.markdown(f'<div class="user-msg">👤 <strong>You:</strong><br>{user_input}</div>', unsafe_allow_html=True)
+    #Render tokens as they arrive instead of waiting for the full response
+    with trace("chat") as t:
+        st.write_stream(run_chain(user_input))
+    st.session_state.last_trace = t
+    st.rerun()     
+
+if st.session_state.llm_stats:
+    st.caption(format_stats(st.session_state.llm_stats))
+
+#Where the last request spent its time: one bar per stage
+if st.sidebar.checkbox("⏱️ Show stage timings") and "last_trace" in st.session_state:
+    render_waterfall(st.session_state.last_trace, st.sidebar)
 
 # Show full chat history
 st.subheader("📜 Chat History")
@@ -0,0 +1,74 @@
+import argparse
+import json
+import sys
+import time
+import pipelines
+from hybrid_search import RETRIEVAL_K
+from shared_resources import DEFAULT_WORKSPACE, get_embedding_cache, get_llm, get_response_cache, get_vector_store
+from tracing import trace
+
+#Answer a file of questions against an app's store without the UI, for evaluation runs and FAQ
+#pre-generation:
+#  python batch_query.py questions.txt --store document_reader --workspace shared --output answers.jsonl
+#questions.txt has one question per line; a .jsonl file has {"id": ..., "question": ...} objects.
+#Answers are written as JSON lines as soon as each one is ready (in completion order, with the
+#question's id), so a long run can be followed with tail -f.
+PROMPTS = {"document_reader": (pipelines.DOCUMENT_PROMPT, "No relevant information found in the document."),
+           "web_scraper": (pipelines.WEB_PROMPT, "No relevant information found in the vector store.")}
+
+
+#[(id, question)]; ids default to the line number
+def read_questions(path):
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith(".jsonl"):
+                entry = json.loads(line)
+                questions.append((entry.get("id", number), entry["question"]))
+            elif not line.startswith("#"):
+                questions.append((number, line))
+    return questions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer many questions against an app's FAISS store.")
+    parser.add_argument("questions", help="text file (one question per line) or .jsonl with id and question")
+    parser.add_argument("--store", choices=sorted(PROMPTS), default="document_reader")
+    parser.add_argument("--workspace", default=DEFAULT_WORKSPACE,
+                        help=f"workspace to search (default: {DEFAULT_WORKSPACE})")
+    parser.add_argument("--output", help="JSONL file to write (default: stdout)")
+    parser.add_argument("--k", type=int, default=RETRIEVAL_K, help="chunks retrieved per question")
+    parser.add_argument("--concurrency", type=int, default=pipelines.BATCH_CONCURRENCY, help="concurrent LLM calls")
+    parser.add_argument("--no-cache", action="store_true", help="always generate, ignoring the response cache")
+    args = parser.parse_args()
+
+    questions = read_questions(args.questions)
+    llm = get_llm()
+    template, not_found = PROMPTS[args.store]
+    vector_store = get_vector_store(args.store, args.workspace)
+    response_cache = None if args.no_cache else get_response_cache(llm.model)
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    failed = 0
+    start = time.perf_counter()
+    with trace("batch_query", questions=len(questions)):
+        results = pipelines.answer_batch([question for _, question in questions], vector_store, get_embedding_cache(),
+                                         llm, response_cache, args.k, template, not_found, args.concurrency)
+        for done, result in enumerate(results, 1):
+            result["id"] = questions[result.pop("index")][0]
+            failed += "error" in result
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            if done % 100 == 0 or done == len(questions):
+                elapsed = time.perf_counter() - start
+                print(f"{done}/{len(questions)} answered, {done / elapsed:.1f} questions/s, {failed} failed",
+                      file=sys.stderr)
+    if out is not sys.stdout:
+        out.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+#Recall@k vs query latency of each FAISS index type against the flat (exact) baseline
+#Run from the repo root: python -m benchmarks.bench_ann --n 100000
+import argparse
+import time
+import numpy as np
+from index_factory import INDEX_TYPES, build_index, min_train_points
+
+
+#Clustered, unit-normalised vectors behave more like sentence embeddings than uniform noise
+def make_vectors(n, dim, rng, clusters=256):
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def recall_at_k(found, truth):
+    return np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--dim", type=int, default=384)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = make_vectors(args.n + args.queries, args.dim, rng)
+    corpus, queries = vectors[:args.n], vectors[args.n:]
+    ids = np.arange(args.n, dtype=np.int64)
+
+    truth = None
+    print(f"{'index':>10} {'build s':>9} {'ms/query':>9} {'recall@' + str(args.k):>10}")
+    for kind in INDEX_TYPES:
+        if args.n < min_train_points(kind, args.n):
+            print(f"{kind:>10}  skipped: needs {min_train_points(kind, args.n)} training points")
+            continue
+        start = time.perf_counter()
+        index = build_index(kind, args.dim, corpus, ids)
+        build_s = time.perf_counter() - start
+        start = time.perf_counter()
+        #One query at a time, matching how retrieve_and_answer searches
+        found = [index.search(q.reshape(1, -1), args.k)[1][0] for q in queries]
+        query_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        if truth is None:
+            truth = found
+        print(f"{kind:>10} {build_s:>9.2f} {query_ms:>9.3f} {recall_at_k(found, truth):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
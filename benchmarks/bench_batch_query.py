@@ -0,0 +1,86 @@
+#Questions per second over one store of --documents synthetic documents, --queries distinct
+#questions per run, without the response cache:
+#  retrieval    embedding and hybrid search only: embed_query + hybrid_search per question vs
+#               one embed_documents call + one hybrid_search_batch (matrix index.search) per batch
+#  per_query    pipelines.retrieve_and_answer in a loop, as the UIs answer one question at a time
+#  batch        pipelines.answer_batch with each --concurrency (LLM calls in flight at once)
+#The LLM is benchmarks/fake_ollama, which serves any number of requests in parallel; a real Ollama
+#server only runs OLLAMA_NUM_PARALLEL generations at once, so set --concurrency to match it.
+#Embeddings come from HashEmbeddings, which gains nothing from batching; sentence-transformers does.
+#Run from the repo root: python -m benchmarks.bench_batch_query --queries 200
+import argparse
+import random
+import tempfile
+import time
+import numpy as np
+import pipelines
+from benchmarks.bench_pipelines import PAGES_PER_DOCUMENT, HashEmbeddings, consume, fact, int_list, make_pages
+from benchmarks.fake_ollama import make_llm, start_fake_ollama
+from faiss_store import FaissStore
+from pdf_pipeline import split_pages
+
+
+def build_store(path, documents):
+    rng = random.Random(documents)
+    store = FaissStore("bench", persist_dir=path)
+    splitter = pipelines.make_splitter()
+    batch = [(f"doc_{document}.pdf", split_pages(make_pages(rng, document, PAGES_PER_DOCUMENT), splitter))
+             for document in range(documents)]
+    pipelines.store_documents_in_faiss(store, HashEmbeddings(), batch)
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--concurrency", type=int_list, default=[1, 4, 8, 16], help="comma-separated")
+    parser.add_argument("--token-ms", type=float, default=5.0)
+    parser.add_argument("--ttft-ms", type=float, default=50.0)
+    parser.add_argument("--prompt-ms-per-kchar", type=float, default=2.0)
+    parser.add_argument("--answer-tokens", type=int, default=40)
+    args = parser.parse_args()
+
+    server, base_url = start_fake_ollama(args.token_ms, args.ttft_ms, args.prompt_ms_per_kchar, args.answer_tokens)
+    llm = make_llm(base_url)
+    embedder = HashEmbeddings()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = build_store(tmp, args.documents)
+            rng = random.Random(0)
+            pages = rng.sample(range(args.documents * PAGES_PER_DOCUMENT), min(args.queries, args.documents * PAGES_PER_DOCUMENT))
+            questions = [f"What is the rated limit of unit {fact(*divmod(n, PAGES_PER_DOCUMENT))[0]}?" for n in pages]
+            print(f"{args.documents} documents, {len(store)} chunks, {len(questions)} questions")
+
+            start = time.perf_counter()
+            for query in questions:
+                query_vector = np.array(embedder.embed_query(query), dtype=np.float32).reshape(1, -1)
+                store.hybrid_search(query_vector, query)
+            single = time.perf_counter() - start
+            start = time.perf_counter()
+            for first in range(0, len(questions), pipelines.QUERY_BATCH_SIZE):
+                group = questions[first:first + pipelines.QUERY_BATCH_SIZE]
+                store.hybrid_search_batch(np.asarray(embedder.embed_documents(group), dtype=np.float32), group)
+            batched = time.perf_counter() - start
+            print(f"{'retrieval':>9}: per query {len(questions) / single:.0f} q/s, batched {len(questions) / batched:.0f} q/s")
+
+            start = time.perf_counter()
+            answers = {}
+            for n, query in enumerate(questions):
+                answers[n] = consume(pipelines.retrieve_and_answer(query, store, embedder, llm))[2]
+            baseline = len(questions) / (time.perf_counter() - start)
+            print(f"{'per_query':>9}: {baseline:.1f} q/s")
+
+            for concurrency in args.concurrency:
+                start = time.perf_counter()
+                results = list(pipelines.answer_batch(questions, store, embedder, llm, concurrency=concurrency))
+                qps = len(questions) / (time.perf_counter() - start)
+                same = sum(result["answer"] == answers[result["index"]] for result in results)
+                print(f"{'batch':>9}: concurrency {concurrency:>2}: {qps:.1f} q/s ({qps / baseline:.1f}x), "
+                      f"{same}/{len(questions)} answers identical to per_query")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#Per-turn cost over a long session: full history (old run_chain) vs ConversationMemory.
+#  prompt size   tokens sent per turn, with an instant stand-in LLM for the summary folds
+#  latency       pipelines.run_chain against benchmarks/fake_ollama serving one generation at a
+#                time (OLLAMA_NUM_PARALLEL=1), so a summary fold competes with the next answer;
+#                --think-ms is the pause between a reply and the next question
+#Run from the repo root: python -m benchmarks.bench_chat_memory --turns 500
+import argparse
+import time
+from langchain_community.chat_message_histories import ChatMessageHistory
+import pipelines
+from benchmarks.bench_pipelines import int_list
+from benchmarks.fake_ollama import make_llm, start_fake_ollama
+from chat_memory import ConversationMemory, estimate_tokens, format_message
+
+PROMPT = "Conversation so far:\n{chat_history}\n\nUser: {question}\nAssistant:"
+
+
+#Stand-in LLM for the background summary folds
+class FakeLLM:
+    def invoke(self, prompt):
+        return "The user and assistant discussed topics " + prompt[-200:]
+
+
+#The old run_chain: every earlier message, verbatim
+class FullHistory:
+    def __init__(self, chat_history):
+        self.chat_history = chat_history
+
+    def build_context(self, question=""):
+        return "\n".join(format_message(msg) for msg in self.chat_history.messages)
+
+    def after_turn(self):
+        pass
+
+    def wait(self):
+        pass
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def prompt_sizes(turns):
+    history = ChatMessageHistory()
+    memory = ConversationMemory(FakeLLM(), history)
+    full, bounded = [], []
+    for turn in range(turns):
+        question = f"Question {turn}: what about item {turn * 7}?"
+        full.append(estimate_tokens("\n".join(format_message(m) for m in history.messages)))
+        bounded.append(estimate_tokens(memory.build_context(question)))
+        history.add_user_message(question)
+        history.add_ai_message(f"Answer {turn}: " + "details " * 40)
+        memory.after_turn()
+        memory.wait()
+
+    print(f"{'turn':>6} {'full history tok':>17} {'memory tok':>11}")
+    for turn in sorted({0, 10, 50, 100, 250, turns - 1}):
+        if turn < turns:
+            print(f"{turn:>6} {full[turn]:>17} {bounded[turn]:>11}")
+    print(f"total prompt tokens: full {sum(full)}, memory {sum(bounded)}")
+
+
+#Time to first token and whole-turn time of every turn
+def latencies(llm, memory, chat_history, turns, think_s):
+    ttft, total = [], []
+    for turn in range(turns):
+        stats = {}
+        start = time.perf_counter()
+        for _ in pipelines.run_chain(f"Question {turn}: what about item {turn * 7}?", llm, PROMPT, memory,
+                                     chat_history, stats):
+            pass
+        total.append(time.perf_counter() - start)
+        ttft.append(stats["ttft_s"])
+        time.sleep(think_s)
+    memory.wait()
+    return ttft, total
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=500, help="turns for the prompt size table")
+    parser.add_argument("--latency-turns", type=int, default=60)
+    parser.add_argument("--think-ms", type=int_list, default=[0, 1000], help="comma-separated")
+    parser.add_argument("--token-ms", type=float, default=5.0)
+    parser.add_argument("--ttft-ms", type=float, default=50.0)
+    parser.add_argument("--prompt-ms-per-kchar", type=float, default=20.0)
+    parser.add_argument("--answer-tokens", type=int, default=40)
+    args = parser.parse_args()
+
+    prompt_sizes(args.turns)
+
+    server, base_url = start_fake_ollama(args.token_ms, args.ttft_ms, args.prompt_ms_per_kchar, args.answer_tokens,
+                                         parallel=1)
+    llm = make_llm(base_url)
+    try:
+        print(f"\nlatency over {args.latency_turns} turns, one generation at a time:")
+        for think_ms in args.think_ms:
+            for name in ("full", "memory"):
+                chat_history = ChatMessageHistory()
+                memory = FullHistory(chat_history) if name == "full" else ConversationMemory(llm, chat_history)
+                ttft, total = latencies(llm, memory, chat_history, args.latency_turns, think_ms / 1000)
+                last = ttft[-10:]
+                print(f"  think {think_ms:>5} ms {name:>6}: ttft p50 {percentile(ttft, 0.5) * 1000:.0f} ms, "
+                      f"p95 {percentile(ttft, 0.95) * 1000:.0f} ms, max {max(ttft) * 1000:.0f} ms, "
+                      f"last 10 turns {sum(last) / len(last) * 1000:.0f} ms; "
+                      f"turn p50 {percentile(total, 0.5) * 1000:.0f} ms")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
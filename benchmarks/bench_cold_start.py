@@ -0,0 +1,82 @@
+#Cold start and per-rerun cost of the document reader's resources, before and after sharing them
+#per process. "before" rebuilds everything on each rerun like the old module-level constructors;
+#"after" goes through shared_resources. Each mode runs in a fresh interpreter so imports count.
+#Resources whose packages are not installed are skipped and listed.
+#Run from the repo root: python -m benchmarks.bench_cold_start
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+CHILD = r"""
+import json, os, sys, time
+start = time.perf_counter()
+import shared_resources as resources
+
+#(name, getter) pairs the document reader touches on every rerun; the old script also
+#loaded the HuggingFace model eagerly at the top
+RESOURCES = [
+    ("llm", resources.get_llm),
+    ("response_cache", resources.get_response_cache),
+    ("summarizer", resources.get_summarizer),
+    ("embedding_cache", resources.get_embedding_cache),
+    ("vector_store", lambda: resources.get_vector_store("document_reader")),
+]
+if os.environ["MODE"] == "before":
+    RESOURCES.append(("embedding_model", resources.get_embedding_model))
+
+skipped = set()
+def rerun():
+    if os.environ["MODE"] == "before":
+        resources._instances.clear()
+    for name, get in RESOURCES:
+        if name in skipped:
+            continue
+        try:
+            get()
+        except ImportError as e:
+            skipped.add(name)
+            print(f"skipping {name}: {e}", file=sys.stderr)
+
+rerun()
+cold = time.perf_counter() - start
+times = []
+for _ in range(int(os.environ["RERUNS"])):
+    t = time.perf_counter()
+    rerun()
+    times.append(time.perf_counter() - t)
+print(json.dumps({"cold_s": cold, "rerun_s": sorted(times)[len(times) // 2] if times else None, "skipped": sorted(skipped),
+                  "heavy_modules": [m for m in ("faiss", "torch", "langchain_huggingface") if m in sys.modules]}))
+"""
+
+
+def run(mode, reruns, persist_dir):
+    env = {"MODE": mode, "RERUNS": str(reruns), "PERSIST_DIR": persist_dir}
+    result = subprocess.run([sys.executable, "-c", CHILD], capture_output=True, text=True, check=True,
+                            env={**os.environ, **env})
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reruns", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        #Create the stores once so both modes open existing files
+        run("after", 0, tmp)
+        results = {mode: run(mode, args.reruns, tmp) for mode in ("before", "after")}
+
+    for mode, result in results.items():
+        print(f"{mode:>6}: cold start {result['cold_s'] * 1000:8.1f} ms  "
+              f"per rerun {result['rerun_s'] * 1000:8.3f} ms  (median of {args.reruns})  "
+              f"heavy modules loaded: {', '.join(result['heavy_modules']) or 'none'}")
+    skipped = sorted(set(results["before"]["skipped"]) | set(results["after"]["skipped"]))
+    if skipped:
+        print(f"not installed, skipped: {', '.join(skipped)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#Compressed vector storage: index size, process RSS, recall@k and latency for float32, fp16, sq8
+#and pq codes, with and without exact re-ranking from the on-disk float32 vectors. Vectors are
+#clustered (like sentence embeddings) rather than uniform noise; queries are perturbed stored
+#vectors and ground truth is exact brute-force search. Each store is opened in a fresh
+#interpreter so its RSS is measured on its own.
+#Run from the repo root: python -m benchmarks.bench_compression --vectors 50000
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import numpy as np
+from faiss_store import FaissStore
+from index_factory import RERANK, STORAGE_TYPES
+
+CHILD = r"""
+import json, os, sys, time
+import numpy as np
+
+def rss():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+from faiss_store import FaissStore
+queries = np.load(os.environ["QUERIES"])
+truth = np.load(os.environ["TRUTH"])
+k = int(os.environ["K"])
+before = rss()
+store = FaissStore("bench", dim=queries.shape[1], persist_dir=os.environ["STORE_DIR"], index_type=os.environ["INDEX_TYPE"],
+                   storage=os.environ["STORAGE"])
+store.search(queries[0], k)
+opened = rss() - before
+result = {"rss": opened, "memory": store.memory_usage()}
+for rerank in (0, int(os.environ["RERANK"])):
+    start = time.perf_counter()
+    found = [store.search(query, k, rerank=rerank)[1] for query in queries]
+    ms = (time.perf_counter() - start) * 1000 / len(queries)
+    #Chunk texts are "chunk <row>", so map chunk ids back to rows of the vector matrix
+    hits = sum(len({int(text.split()[1]) for _, text in store.get_chunks(ids)} & set(expected.tolist()))
+               for ids, expected in zip(found, truth))
+    result[f"rerank{rerank}"] = {"recall": hits / truth.size, "ms": ms}
+print(json.dumps(result))
+"""
+
+
+def clustered_vectors(rng, n, dim, clusters=200):
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, n)] + 0.35 * rng.normal(size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def exact_neighbors(vectors, queries, k):
+    distances = (queries ** 2).sum(1)[:, None] - 2 * queries @ vectors.T + (vectors ** 2).sum(1)[None, :]
+    return np.argsort(distances, axis=1)[:, :k]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vectors", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rerank", type=int, default=RERANK)
+    parser.add_argument("--index-type", default="flat")
+    parser.add_argument("--storage", nargs="+", default=list(STORAGE_TYPES))
+    parser.add_argument("--doc-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = clustered_vectors(rng, args.vectors, args.dim)
+    picks = rng.choice(args.vectors, args.queries, replace=False)
+    queries = vectors[picks] + 0.05 * rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for storage in args.storage:
+            store_dir = os.path.join(tmp, storage)
+            store = FaissStore("bench", dim=args.dim, persist_dir=store_dir, index_type=args.index_type, storage=storage)
+            for doc, start in enumerate(range(0, args.vectors, args.doc_size)):
+                chunk = vectors[start:start + args.doc_size]
+                store.add_document(f"doc{doc}", [f"chunk {start + i}" for i in range(len(chunk))], chunk)
+            del store
+        np.save(os.path.join(tmp, "queries.npy"), queries)
+        np.save(os.path.join(tmp, "truth.npy"), exact_neighbors(vectors, queries, args.k))
+
+        for storage in args.storage:
+            env = {"STORE_DIR": os.path.join(tmp, storage), "STORAGE": storage, "INDEX_TYPE": args.index_type,
+                   "QUERIES": os.path.join(tmp, "queries.npy"), "TRUTH": os.path.join(tmp, "truth.npy"),
+                   "K": str(args.k), "RERANK": str(args.rerank)}
+            output = subprocess.run([sys.executable, "-c", CHILD], capture_output=True, text=True, check=True,
+                                    env={**os.environ, **env}).stdout
+            results[storage] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"{args.vectors} vectors, dim {args.dim}, index type {args.index_type}, recall@{args.k}, rerank x{args.rerank}")
+    for storage, result in results.items():
+        memory = result["memory"]
+        print(f"{storage:>8}: {memory['kind']:>8} {memory['bytes_per_vector']:5d} B/vector  "
+              f"index {memory['index_bytes'] / 2**20:7.1f} MB  RSS +{result['rss'] / 2**20:7.1f} MB  "
+              f"recall {result['rerank0']['recall']:.3f} ({result['rerank0']['ms']:.2f} ms)  "
+              f"reranked {result[f'rerank{args.rerank}']['recall']:.3f} ({result[f'rerank{args.rerank}']['ms']:.2f} ms)")
+
+
+if __name__ == "__main__":
+    main()
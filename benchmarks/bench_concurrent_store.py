@@ -0,0 +1,77 @@
+#Load test: N simulated sessions, each ingesting its own documents and then searching
+#(dense + chunk lookup) while occasionally ingesting more, against one FaissStore.
+#  shared:     every session uses one store and searches everyone's documents
+#  namespaced: every session has its own namespace (sub-index)
+#Run from the repo root: python -m benchmarks.bench_concurrent_store --sessions 1 2 4 8
+import argparse
+import tempfile
+import threading
+import time
+import numpy as np
+from faiss_store import FaissStore
+
+
+def random_document(rng, chunks, dim):
+    vectors = rng.normal(size=(chunks, dim)).astype(np.float32)
+    return [f"chunk {i} " + " ".join(f"w{w}" for w in rng.integers(0, 5000, 40)) for i in range(chunks)], vectors
+
+
+def session(store, seed, args, ready, search_times, ingest_times):
+    rng = np.random.default_rng(seed)
+    for d in range(args.docs):
+        store.add_document(f"session{seed}/doc{d}", *random_document(rng, args.chunks, args.dim))
+    #Time only the mixed search/ingest phase, with every session loaded
+    ready.wait()
+    for n in range(args.searches):
+        if args.ingest_every and n % args.ingest_every == args.ingest_every - 1:
+            start = time.perf_counter()
+            store.add_document(f"session{seed}/extra{n}", *random_document(rng, args.chunks, args.dim))
+            ingest_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        _, ids = store.search(rng.normal(size=args.dim), k=4)
+        store.get_chunks(ids)
+        search_times.append(time.perf_counter() - start)
+
+
+def run(sessions, namespaced, args, tmp):
+    shared = None if namespaced else FaissStore(f"shared{sessions}", dim=args.dim, persist_dir=tmp)
+    search_times, ingest_times = [], []
+    ready = threading.Barrier(sessions + 1)
+    threads = []
+    for i in range(sessions):
+        store = shared if shared is not None else FaissStore(f"ns{sessions}", dim=args.dim, persist_dir=tmp,
+                                                             namespace=f"s{i}")
+        threads.append(threading.Thread(target=session,
+                                        args=(store, i, args, ready, search_times, ingest_times)))
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return (len(search_times) / elapsed, np.percentile(search_times, 50) * 1000, np.percentile(search_times, 95) * 1000,
+            np.percentile(ingest_times, 95) * 1000 if ingest_times else 0.0)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--docs", type=int, default=4)
+    parser.add_argument("--chunks", type=int, default=500)
+    parser.add_argument("--searches", type=int, default=300)
+    parser.add_argument("--ingest-every", type=int, default=50)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--modes", nargs="+", default=["shared", "namespaced"])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in args.modes:
+            for sessions in args.sessions:
+                qps, search_p50, search_p95, ingest_p95 = run(sessions, mode == "namespaced", args, tmp)
+                print(f"{mode:>10} {sessions:>2} sessions: {qps:8.1f} searches/s  search p50 {search_p50:6.2f} ms  "
+                      f"p95 {search_p95:6.2f} ms  ingest p95 {ingest_p95:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+#Pages/sec of the async crawler vs sequential requests.get (the old scrape_web_page path)
+#against a local stand-in site. Run from the repo root: python -m benchmarks.bench_crawler
+import argparse
+import time
+import requests
+from benchmarks.site_server import start_site
+from web_crawler import WebCrawler, parse_page
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.02, help="simulated server latency per request (s)")
+    parser.add_argument("--per-host", type=int, default=8)
+    args = parser.parse_args()
+
+    server, base = start_site(args.pages, args.latency)
+    try:
+        start = time.perf_counter()
+        for n in range(args.pages):
+            response = requests.get(f"{base}/page/{n}", headers={"User-Agent": "Mozilla/5.0"})
+            parse_page(response.content, response.url)
+        sequential = args.pages / (time.perf_counter() - start)
+
+        crawler = WebCrawler(max_depth=0, max_pages=args.pages, per_host=args.per_host)
+        count = sum(1 for _ in crawler.iter_pages([f"{base}/sitemap.xml"]))
+        crawled = crawler.pages_per_second
+
+        link_crawler = WebCrawler(max_depth=10, max_pages=args.pages, per_host=args.per_host)
+        linked = sum(1 for _ in link_crawler.iter_pages([f"{base}/page/0"]))
+    finally:
+        server.shutdown()
+
+    print(f"sequential requests.get: {sequential:8.1f} pages/s")
+    print(f"async crawler (sitemap): {crawled:8.1f} pages/s  ({count} pages, per_host={args.per_host})")
+    print(f"async crawler (links):   {link_crawler.pages_per_second:8.1f} pages/s  ({linked} pages)")
+
+
+if __name__ == "__main__":
+    main()
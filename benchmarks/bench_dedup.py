@@ -0,0 +1,99 @@
+#Near-duplicate chunk elimination on a synthetic site: every page repeats a nav block, a footer
+#and a few boilerplate paragraphs (some with the page number or date changed) around a unique
+#body. Pages are chunked like the apps (500 chars, 100 overlap) and ingested --batch pages at a
+#time: duplicates only count within one batch, so 1 is an upload and 16 a crawl batch.
+#Reports embeddings / index bytes saved, dedup cost per chunk, and unique chunks wrongly dropped.
+#Run from the repo root: python -m benchmarks.bench_dedup --pages 500 --batch 1,16
+import argparse
+import logging
+import tempfile
+import time
+import numpy as np
+from langchain_text_splitters import CharacterTextSplitter
+from benchmarks.bench_pipelines import int_list
+from chunk_dedup import drop_duplicates
+from faiss_store import FaissStore
+
+WORDS = ("index vector query cache model token server request latency memory disk batch cluster "
+         "update release config error metric thread process storage network page user search").split()
+NAV = "Home | Products | Solutions | Pricing | Docs | Blog | Careers | Contact | Sign in | Start free trial"
+FOOTER = ("Copyright {year} Example Corp. All rights reserved. Example is a registered trademark. "
+          "Privacy policy, cookie settings, terms of service, accessibility statement and sitemap. "
+          "Example Corp, 100 Main Street, Springfield. Support is available 24/7 at support@example.com.")
+BOILERPLATE = [
+    "Subscribe to our newsletter to get product updates, release notes and engineering stories delivered "
+    "to your inbox every month. You can unsubscribe at any time using the link in every email we send.",
+    "Was this page helpful? Let us know by rating it below. Your feedback helps our documentation team "
+    "decide which guides to improve next, and every comment is read by a human being on the team.",
+    "This page was last reviewed on {date} by the documentation team. If you find an error or something "
+    "out of date, open an issue in the public docs repository and we will fix it as soon as possible.",
+]
+
+
+def sentence(rng):
+    return " ".join(rng.choice(WORDS, int(rng.integers(8, 16)))).capitalize() + f" {rng.integers(1e6)}."
+
+
+def make_page(rng, number):
+    body = [" ".join(sentence(rng) for _ in range(5)) for _ in range(int(rng.integers(3, 8)))]
+    parts = [NAV, *body, *BOILERPLATE, FOOTER]
+    return "\n\n".join(parts).format(year=2024, date=f"2024-{number % 12 + 1:02d}-{number % 28 + 1:02d}"), body
+
+
+def run(args, batch_size):
+    rng = np.random.default_rng(0)
+    vector_rng = np.random.default_rng(1)
+    splitter = CharacterTextSplitter(chunk_size=500, chunk_overlap=100)
+    totals = {"chunks": 0, "removed": 0, "embeddings_saved": 0, "index_bytes_saved": 0}
+    wrongly_dropped = 0
+    body_chunks = 0
+    dedup_seconds = 0.0
+    with tempfile.TemporaryDirectory() as tmp:
+        store = FaissStore("bench", dim=args.dim, persist_dir=tmp)
+        for first in range(0, args.pages, batch_size):
+            pages = [make_page(rng, number) for number in range(first, min(first + batch_size, args.pages))]
+            texts = [splitter.split_text(text) for text, _ in pages]
+            start = time.perf_counter()
+            kept, stats = drop_duplicates(store, [t for page in texts for t in page])
+            dedup_seconds += time.perf_counter() - start
+            for key in totals:
+                totals[key] += stats[key]
+            kept = iter(kept)
+            next_kept = next(kept, None)
+            for number, (page_texts, (_, body)) in enumerate(zip(texts, pages), first):
+                #A chunk holding any unique body text must survive
+                unique = [t for t in page_texts if any(paragraph[:60] in t for paragraph in body)]
+                body_chunks += len(unique)
+                #kept is the batch's chunks in order minus the duplicates: walk it to split it by page
+                page_kept = []
+                for t in page_texts:
+                    if t == next_kept:
+                        page_kept.append(t)
+                        next_kept = next(kept, None)
+                wrongly_dropped += sum(t not in page_kept for t in unique)
+                store.add_document(f"page{number}", page_kept,
+                                   vector_rng.normal(size=(len(page_kept), args.dim)).astype(np.float32))
+        stored = len(store)
+
+    print(f"batches of {batch_size} pages: {args.pages} pages, chunks {totals['chunks']}, stored {stored}")
+    print(f"  duplicates removed: {totals['removed']} ({totals['removed'] / totals['chunks']:.0%}), "
+          f"embeddings saved {totals['embeddings_saved']}, index bytes saved {totals['index_bytes_saved'] / 1024:.0f} KB")
+    print(f"  dedup cost: {dedup_seconds * 1e6 / totals['chunks']:.0f} us/chunk")
+    print(f"  unique body chunks wrongly dropped: {wrongly_dropped} of {body_chunks}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--batch", type=int_list, default=[1, 16], help="pages per ingest, comma-separated")
+    parser.add_argument("--dim", type=int, default=384)
+    args = parser.parse_args()
+    #Paragraphs slightly over chunk_size are kept whole; the splitter warns about each one
+    logging.getLogger("langchain_text_splitters").setLevel(logging.ERROR)
+
+    for batch_size in args.batch:
+        run(args, batch_size)
+
+
+if __name__ == "__main__":
+    main()
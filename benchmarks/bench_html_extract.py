@@ -0,0 +1,73 @@
+#Throughput and main-text quality of the html_extract backends over saved HTML fixtures.
+#Each fixtures/html/<name>.html has a hand-checked <name>.txt with the page's main content;
+#quality is token-level precision / recall / F1 against it.
+#Run from the repo root: python -m benchmarks.bench_html_extract
+import argparse
+import os
+import re
+import time
+from collections import Counter
+from html_extract import StreamingExtractor, extract
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "html")
+TOKEN = re.compile(r"\w+")
+
+
+def load_fixtures():
+    fixtures = []
+    for name in sorted(os.listdir(FIXTURES)):
+        if name.endswith(".html"):
+            base = name[:-len(".html")]
+            with open(os.path.join(FIXTURES, name), "rb") as f:
+                html = f.read()
+            with open(os.path.join(FIXTURES, base + ".txt"), encoding="utf-8") as f:
+                expected = f.read()
+            fixtures.append((base, html, expected))
+    return fixtures
+
+
+def token_f1(text, expected):
+    got = Counter(TOKEN.findall(text.lower()))
+    want = Counter(TOKEN.findall(expected.lower()))
+    overlap = sum((got & want).values())
+    precision = overlap / sum(got.values()) if got else 0.0
+    recall = overlap / sum(want.values()) if want else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if overlap else 0.0
+    return precision, recall, f1
+
+
+def extract_streaming(html, url, chunk_size=16 * 1024):
+    extractor = StreamingExtractor(url)
+    for start in range(0, len(html), chunk_size):
+        extractor.feed(html[start:start + chunk_size])
+    return extractor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    fixtures = load_fixtures()
+    total_bytes = sum(len(html) for _, html, _ in fixtures)
+    runs = {
+        "bs4 (current)": lambda html, url: extract(html, url, backend="bs4"),
+        "lxml": lambda html, url: extract(html, url, backend="lxml"),
+        "lxml streaming": extract_streaming,
+    }
+    for label, run in runs.items():
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for name, html, _ in fixtures:
+                run(html, f"https://example.org/{name}")
+        seconds = time.perf_counter() - start
+        pages = args.repeat * len(fixtures)
+        print(f"{label:>15}: {pages / seconds:8.1f} pages/s  {total_bytes * args.repeat / seconds / 2**20:6.1f} MB/s")
+        for name, html, expected in fixtures:
+            text, _ = run(html, f"https://example.org/{name}")
+            precision, recall, f1 = token_f1(text, expected)
+            print(f"{'':>17}{name:<16} P {precision:.2f}  R {recall:.2f}  F1 {f1:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#Recall and latency of dense, BM25 and RRF-fused hybrid retrieval on a synthetic corpus.
+#Chunks belong to topics; their vectors are the topic centre plus noise and their text mixes
+#topic words with a unique code (part number / error code). Like a sentence embedder on such
+#codes, the vectors ignore the code. Three query sets, each targeting one chunk:
+#  semantic:   vector near the target chunk, text shares a couple of the target's words
+#  paraphrase: vector near the target chunk, text only has words common to its whole topic
+#  exact:      text naming the target's code, vector only near its topic
+#Run from the repo root: python -m benchmarks.bench_hybrid --chunks 50000
+import argparse
+import string
+import tempfile
+import time
+import numpy as np
+from faiss_store import FaissStore
+from hybrid_search import DENSE_WEIGHT, KEYWORD_WEIGHT
+
+TOPIC_WORDS = 8
+
+
+def make_corpus(rng, chunks, topics, dim, vocab_size=5000):
+    vocab = ["w" + "".join(rng.choice(list(string.ascii_lowercase), 6)) for _ in range(vocab_size)]
+    centres = rng.normal(size=(topics, dim)).astype(np.float32)
+    topic_words = [rng.choice(vocab, TOPIC_WORDS, replace=False) for _ in range(topics)]
+    chunk_topics = rng.integers(0, topics, chunks)
+    texts, codes = [], []
+    for i, topic in enumerate(chunk_topics):
+        code = f"{''.join(rng.choice(list(string.ascii_uppercase), 2))}-{rng.integers(1000, 99999)}-{i}"
+        words = list(rng.choice(topic_words[topic], 12)) + list(rng.choice(vocab, 20))
+        words.insert(int(rng.integers(0, len(words))), code)
+        texts.append(" ".join(words))
+        codes.append(code)
+    vectors = centres[chunk_topics] + 0.6 * rng.normal(size=(chunks, dim)).astype(np.float32)
+    return texts, codes, vectors, centres, chunk_topics, topic_words
+
+
+def make_queries(rng, queries, texts, codes, vectors, centres, chunk_topics, topic_words):
+    dim = vectors.shape[1]
+    semantic, paraphrase, exact = [], [], []
+    for target in rng.integers(0, len(texts), queries):
+        vector = vectors[target] + 0.15 * rng.normal(size=dim).astype(np.float32)
+        topic = " ".join(rng.choice(topic_words[chunk_topics[target]], 3))
+        own = " ".join(rng.choice(texts[target].split()[-20:], 2))
+        semantic.append((vector, f"tell me about {topic} {own}", target))
+        paraphrase.append((vector, f"tell me about {topic}", target))
+    for target in rng.integers(0, len(texts), queries):
+        vector = centres[chunk_topics[target]] + 0.6 * rng.normal(size=dim).astype(np.float32)
+        exact.append((vector, f"what does {codes[target]} mean", target))
+    return semantic, paraphrase, exact
+
+
+def evaluate(store, queries, mode, k, weights):
+    hits = 0
+    seconds = []
+    for vector, text, target in queries:
+        start = time.perf_counter()
+        if mode == "dense":
+            _, ids = store.search(vector, k)
+        elif mode == "bm25":
+            _, ids = store.keyword_search(text, k)
+        else:
+            _, ids = store.hybrid_search(vector, text, k, weights)
+        seconds.append(time.perf_counter() - start)
+        #Chunk i of the single benchmark document has position i
+        hits += any(chunk_id & 0xFFFFFFFF == target for chunk_id in ids)
+    return hits / len(queries), np.percentile(seconds, 50) * 1000, np.percentile(seconds, 95) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--topics", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--k", type=int, nargs="+", default=[2, 5, 10])
+    parser.add_argument("--keyword-weight", type=float, default=KEYWORD_WEIGHT)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    texts, codes, vectors, centres, chunk_topics, topic_words = make_corpus(
+        rng, args.chunks, args.topics, args.dim)
+    query_sets = make_queries(rng, args.queries, texts, codes, vectors, centres, chunk_topics, topic_words)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = FaissStore("bench", dim=args.dim, persist_dir=tmp, index_type="flat")
+        start = time.perf_counter()
+        store.add_document("corpus", texts, vectors)
+        print(f"indexed {args.chunks} chunks (FAISS + BM25) in {time.perf_counter() - start:.2f}s")
+        for k in args.k:
+            for label, queries in zip(("semantic", "paraphrase", "exact-term"), query_sets):
+                for mode in ("dense", "bm25", "hybrid"):
+                    recall, p50, p95 = evaluate(store, queries, mode, k, (DENSE_WEIGHT, args.keyword_weight))
+                    print(f"k={k:<3} {label:>10} {mode:>6}: recall@k {recall:5.2f}  p50 {p50:6.2f} ms  p95 {p95:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
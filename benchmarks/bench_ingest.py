@@ -0,0 +1,87 @@
+#Bulk ingestion throughput: --documents synthetic PDFs (--pages pages each) stored
+#  per_document  one pipelines.store_in_faiss call per PDF, as an upload in the document reader does
+#                (one embedding call and one index save per document)
+#  ingest        ingest.py's path: PDFs extracted in --workers processes, stored in batches of
+#                --batch-chunks chunks (one embedding call and one index save per batch)
+#  resume        ingest stopped after half the PDFs, then run again over all of them from its checkpoint
+#Embeddings come from HashEmbeddings (benchmarks/bench_pipelines), so the numbers are extraction,
+#chunking, dedup and index writes; with the real model, embedding dominates both paths.
+#Run from the repo root: python -m benchmarks.bench_ingest --documents 100,400
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import pipelines
+from benchmarks.bench_pipelines import HashEmbeddings, int_list, make_pages, write_pdf
+from faiss_store import FaissStore
+from ingest import CHECKPOINT_FILE, INGEST_BATCH_CHUNKS, INGEST_WORKERS, Checkpoint, find_pdfs, ingest, load_pdf
+from pdf_pipeline import split_pages
+
+
+def write_corpus(root, documents, pages):
+    rng = random.Random(documents)
+    for document in range(documents):
+        #A few hundred PDFs per folder, like an exported document tree
+        folder = os.path.join(root, f"folder_{document // 250:03d}")
+        os.makedirs(folder, exist_ok=True)
+        write_pdf(os.path.join(folder, f"doc_{document:05d}.pdf"), make_pages(rng, document, pages))
+
+
+def quiet(message):
+    pass
+
+
+def run_ingest(items, path, args):
+    store = FaissStore("ingest", persist_dir=path)
+    checkpoint = Checkpoint(os.path.join(store.path, CHECKPOINT_FILE))
+    start = time.perf_counter()
+    with ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        counts = ingest(items, load_pdf, pool, store, HashEmbeddings(), checkpoint, args.batch_chunks,
+                        args.workers * 4, log=quiet)
+    checkpoint.close()
+    return store, counts, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documents", type=int_list, default=[100, 400], help="PDFs per run, comma-separated")
+    parser.add_argument("--pages", type=int, default=4, help="pages per PDF")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS)
+    parser.add_argument("--batch-chunks", type=int, default=INGEST_BATCH_CHUNKS)
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, {args.workers} workers, batches of {args.batch_chunks} chunks")
+    for documents in args.documents:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = os.path.join(tmp, "pdfs")
+            write_corpus(root, documents, args.pages)
+            items = find_pdfs(root)
+
+            store = FaissStore("per_document", persist_dir=os.path.join(tmp, "per_document"))
+            embedder = HashEmbeddings()
+            start = time.perf_counter()
+            for source, path in items:
+                chunks = split_pages(pipelines.extract_text_from_pdf(path), pipelines.make_splitter())
+                pipelines.store_in_faiss(store, embedder, source, chunks)
+            seconds = time.perf_counter() - start
+            print(f"{'per_document':>12} {documents} PDFs: {seconds:.1f}s, {documents / seconds:.1f} docs/s, "
+                  f"{len(store)} chunks, {documents} index saves")
+
+            ingested, counts, seconds = run_ingest(items, os.path.join(tmp, "ingest"), args)
+            saves = -(-counts["chunks"] // args.batch_chunks)
+            print(f"{'ingest':>12} {documents} PDFs: {seconds:.1f}s, {documents / seconds:.1f} docs/s, "
+                  f"{len(ingested)} chunks, {saves} index saves")
+
+            path = os.path.join(tmp, "resume")
+            _, first, first_seconds = run_ingest(items[:documents // 2], path, args)
+            resumed, second, second_seconds = run_ingest(items, path, args)
+            print(f"{'resume':>12} {documents} PDFs: {first['stored']} stored, then {second['skipped']} skipped "
+                  f"and {second['stored']} stored in {second_seconds:.1f}s; {len(resumed)} chunks "
+                  f"({'same as' if len(resumed) == len(ingested) else 'DIFFERENT from'} one run)")
+
+
+if __name__ == "__main__":
+    main()
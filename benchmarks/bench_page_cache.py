@@ -0,0 +1,49 @@
+#Repeat scrapes through PageCache vs plain requests.get + BeautifulSoup against a local site.
+#Run from the repo root: python -m benchmarks.bench_page_cache
+import argparse
+import tempfile
+import time
+import requests
+from bs4 import BeautifulSoup
+from benchmarks.site_server import start_site
+from page_cache import PageCache
+
+
+def extract_text(html, url):
+    soup = BeautifulSoup(html, "html.parser")
+    return "\n".join(p.get_text() for p in soup.find_all("p"))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    server, base = start_site(args.pages, args.latency)
+    urls = [f"{base}/page/{n}" for n in range(args.pages)]
+    try:
+        start = time.perf_counter()
+        for url in urls:
+            extract_text(requests.get(url).content, url)
+        uncached = time.perf_counter() - start
+
+        with tempfile.TemporaryDirectory() as tmp:
+            rows = []
+            for label, max_age in (("first fetch", 0), ("revalidate (304)", 0), ("fresh hit", 3600)):
+                cache = PageCache(path=f"{tmp}/pages.sqlite", max_age=max_age)
+                start = time.perf_counter()
+                for url in urls:
+                    cache.get(url, extract_text)
+                rows.append((label, time.perf_counter() - start, cache.stats()))
+    finally:
+        server.shutdown()
+
+    print(f"{'no cache':>17}: {uncached * 1000 / args.pages:7.1f} ms/page")
+    for label, seconds, stats in rows:
+        print(f"{label:>17}: {seconds * 1000 / args.pages:7.1f} ms/page  "
+              f"{stats['bytes_saved'] / 1024:8.0f} KB saved  {stats['seconds_saved']:.2f}s saved")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+#End-to-end timings of the apps' pipelines (pipelines.py) without Ollama, HuggingFace or the
+#network, so a run takes a couple of minutes on a laptop and runs can be compared over time:
+#  extract_text_from_pdf  the PDF fixtures in benchmarks/fixtures/pdf (regenerate with --write-fixtures)
+#  store_in_faiss         synthetic documents at each --corpus size (documents), chunked like the document reader
+#  retrieve_and_answer    --queries questions per corpus size, cold and then from the response cache
+#  scrape_web_page        the HTML fixtures from a local server: fetched, fresh from cache, revalidated (304)
+#  run_chain              --turns chat turns on top of each --history size (turns already in the conversation)
+#The LLM is benchmarks/fake_ollama (Ollama's HTTP API with --token-ms per token and a first token
+#after --ttft-ms plus --prompt-ms-per-kchar; OllamaLLM is used when langchain_ollama is installed);
+#embeddings come from HashEmbeddings, a deterministic stand-in for the sentence-transformers model.
+#Results are printed and written as JSON (--output); --compare OLD.json shows the change per metric.
+#Run from the repo root: python -m benchmarks.bench_pipelines --output results.json
+import argparse
+import glob
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime, timezone
+import numpy as np
+from langchain_community.chat_message_histories import ChatMessageHistory
+from langchain_core.prompts import PromptTemplate
+import pipelines
+from benchmarks.fake_ollama import make_llm, start_fake_ollama
+from benchmarks.site_server import start_site
+from chat_memory import ConversationMemory
+from embedding_cache import EmbeddingCache
+from embedding_engine import EmbeddingEngine
+from faiss_store import FaissStore
+from page_cache import PageCache
+from pdf_pipeline import split_pages
+from response_cache import ResponseCache
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+PDF_FIXTURES = {"short_note": 2, "manual": 12, "handbook": 48}  # Name: pages
+PAGES_PER_DOCUMENT = 4
+CHAT_PROMPT = PromptTemplate(input_variables=["chat_history", "question"],
+                             template="Previous conversation:\n{chat_history}\n\nUser: {question}\nAI:")
+VOCABULARY = ("system", "pressure", "valve", "sensor", "report", "quarter", "network", "storage", "policy",
+              "customer", "invoice", "update", "schedule", "battery", "module", "signal", "reading", "limit",
+              "service", "record", "shipment", "warranty", "firmware", "cooling", "panel", "access", "backup",
+              "contract", "supplier", "inspection", "safety", "voltage", "channel", "release", "error", "window",
+              "the", "of", "and", "to", "in", "is", "for", "with", "on", "at", "by", "from", "after", "before")
+TOKEN = re.compile(r"\w+")
+
+
+#Deterministic stand-in for the sentence-transformers model: words are hashed into a signed
+#bag-of-words vector (feature hashing), so texts sharing words are close
+class HashEmbeddings:
+    model_name = "hash-embeddings"
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def embed_query(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in TOKEN.findall(text.lower()):
+            h = zlib.crc32(word.encode("utf-8"))
+            vector[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+
+#The fact on each page ("Unit D0003P2 has ...") that questions ask about
+def fact(document, page):
+    code = f"D{document:04d}P{page}"
+    return code, f"Unit {code} has a rated limit of {(document * 7 + page * 13) % 900 + 100} volts."
+
+
+#Pages of filler paragraphs, each with its fact somewhere in it
+def make_pages(rng, document, pages, sentences=30):
+    texts = []
+    for page in range(pages):
+        lines = [" ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(8, 16))).capitalize() + "."
+                 for _ in range(sentences)]
+        lines.insert(rng.randint(0, sentences), fact(document, page)[1])
+        texts.append("\n\n".join(" ".join(lines[i:i + 3]) for i in range(0, len(lines), 3)))
+    return texts
+
+
+#Minimal PDF writer: Helvetica text, one compressed content stream per page
+def write_pdf(path, pages, width=90, lines_per_page=56):
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        lines, line = [], ""
+        for word in text.split():
+            if line and len(line) + len(word) >= width:
+                lines.append(line)
+                line = ""
+            line += ("" if not line else " ") + word
+        lines = (lines + [line])[:lines_per_page]
+        escaped = [l.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") for l in lines]
+        stream = zlib.compress(("BT /F1 9 Tf 12 TL 50 750 Td " + " ".join(f"({l}) '" for l in escaped) + " ET").encode("latin-1"))
+        objects.append((f"<< /Length {len(stream)} /Filter /FlateDecode >>", stream))
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> "
+                       f"/Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        if isinstance(obj, tuple):
+            out += f"{number} 0 obj\n{obj[0]}\nstream\n".encode() + obj[1] + b"\nendstream\nendobj\n"
+        else:
+            out += f"{number} 0 obj\n{obj}\nendobj\n".encode()
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def write_fixtures():
+    os.makedirs(os.path.join(FIXTURES, "pdf"), exist_ok=True)
+    for n, (name, pages) in enumerate(PDF_FIXTURES.items()):
+        path = os.path.join(FIXTURES, "pdf", f"{name}.pdf")
+        write_pdf(path, make_pages(random.Random(n), n, pages))
+        print(f"wrote {path} ({pages} pages, {os.path.getsize(path) / 1024:.0f} KB)")
+
+
+def percentiles(seconds):
+    ms = np.array(seconds) * 1000
+    return {"p50_ms": round(float(np.percentile(ms, 50)), 2), "p90_ms": round(float(np.percentile(ms, 90)), 2),
+            "mean_ms": round(float(ms.mean()), 2)}
+
+
+#Time a token generator: (seconds to the first token, total seconds, text)
+def consume(tokens):
+    start = time.perf_counter()
+    first = None
+    parts = []
+    for token in tokens:
+        first = first or time.perf_counter()
+        parts.append(token)
+    end = time.perf_counter()
+    return (first or end) - start, end - start, "".join(parts)
+
+
+def bench_extract(args):
+    results = []
+    for path in sorted(glob.glob(os.path.join(FIXTURES, "pdf", "*.pdf"))):
+        runs = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            pages = list(pipelines.extract_text_from_pdf(path))
+            runs.append(time.perf_counter() - start)
+        best = min(runs)
+        results.append({"params": {"fixture": os.path.basename(path), "pages": len(pages)},
+                        "metrics": {"best_ms": round(best * 1000, 2), "pages_per_s": round(len(pages) / best, 1),
+                                    "chars": sum(len(p) for p in pages)}})
+    return results
+
+
+#Store --corpus documents, then ask --queries questions about facts in them (twice: the second
+#pass is answered from the response cache)
+def bench_store_and_retrieve(args, llm, tmp):
+    splitter = pipelines.make_splitter()
+    store_results, retrieve_results = [], []
+    for documents in args.corpus:
+        rng = random.Random(documents)
+        path = os.path.join(tmp, f"corpus_{documents}")
+        store = FaissStore("bench", persist_dir=path)
+        embedder = EmbeddingCache(EmbeddingEngine(HashEmbeddings(), workers=1), path=os.path.join(path, "embeddings.sqlite"))
+        store_times = []
+        start = time.perf_counter()
+        for document in range(documents):
+            pages = make_pages(rng, document, PAGES_PER_DOCUMENT)
+            document_start = time.perf_counter()
+            pipelines.store_in_faiss(store, embedder, f"doc_{document}.pdf", split_pages(pages, splitter))
+            store_times.append(time.perf_counter() - document_start)
+        total = time.perf_counter() - start
+        chunks = len(store)
+        store_results.append({"params": {"documents": documents, "chunks": chunks},
+                              "metrics": {"total_s": round(total, 3), "chunks_per_s": round(chunks / total, 1),
+                                          **{f"document_{key}": value for key, value in percentiles(store_times).items()}}})
+
+        response_cache = ResponseCache(llm.model, path=os.path.join(path, "responses.sqlite"))
+        #Distinct questions, so the cold pass really misses the response cache
+        pages = rng.sample(range(documents * PAGES_PER_DOCUMENT), min(args.queries, documents * PAGES_PER_DOCUMENT))
+        questions = [f"What is the rated limit of unit {fact(*divmod(n, PAGES_PER_DOCUMENT))[0]}?" for n in pages]
+        metrics = {}
+        for run in ("cold", "cached"):
+            ttft, total, prompt_chars = [], [], []
+            for query in questions:
+                stats = {}
+                first, seconds, _ = consume(pipelines.retrieve_and_answer(query, store, embedder, llm, response_cache, stats))
+                ttft.append(first)
+                total.append(seconds)
+                prompt_chars.append(stats.get("prompt_chars", 0))
+            metrics.update({f"{run}_ttft_{key}": value for key, value in percentiles(ttft).items()})
+            metrics[f"{run}_total_p50_ms"] = percentiles(total)["p50_ms"]
+            if run == "cold":
+                metrics["prompt_chars_mean"] = round(float(np.mean(prompt_chars)))
+        retrieve_results.append({"params": {"documents": documents, "chunks": chunks, "queries": args.queries}, "metrics": metrics})
+    return store_results, retrieve_results
+
+
+def bench_scrape(args, tmp):
+    files = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURES, "html", "*.html"))):
+        with open(path, encoding="utf-8") as f:
+            files[f"/fixtures/{os.path.basename(path)}"] = f.read()
+    server, base = start_site(pages=0, latency=args.site_latency_ms / 1000, files=files)
+    urls = [base + path for path in files]
+    seconds = {"fetched": [], "fresh": [], "revalidated": []}
+    try:
+        #Each repeat starts from an empty cache: download, then fresh hits, then 304 revalidations
+        for repeat in range(args.repeat):
+            page_cache = PageCache(path=os.path.join(tmp, f"pages_{repeat}.sqlite"))
+            for run in seconds:
+                page_cache.max_age = 0 if run == "revalidated" else 3600
+                chars = 0
+                for url in urls:
+                    start = time.perf_counter()
+                    chars += len(pipelines.scrape_web_page(url, page_cache)[0])
+                    seconds[run].append(time.perf_counter() - start)
+        results = [{"params": {"pages": len(urls), "cache": run, "site_latency_ms": args.site_latency_ms},
+                    "metrics": {**percentiles(times), "chars": chars}} for run, times in seconds.items()]
+    finally:
+        server.shutdown()
+    return results
+
+
+#--turns new turns on top of a conversation that already has history turns. Memory folds run
+#in the background during a turn as in the apps, but are waited for between turns so every
+#run sees the same summary state.
+def bench_chat(args, llm):
+    results = []
+    for history in args.history:
+        chat_history = ChatMessageHistory()
+        for turn in range(history):
+            chat_history.add_user_message(f"Question {turn}: what is the status of module {turn}?")
+            chat_history.add_ai_message(f"Module {turn} passed inspection and its firmware is up to date. " * 3)
+        memory = ConversationMemory(llm, chat_history)
+        ttft, total, prompt_chars = [], [], []
+        for turn in range(args.turns):
+            stats = {}
+            first, seconds, _ = consume(pipelines.run_chain(f"And what about module {turn}?", llm, CHAT_PROMPT,
+                                                            memory, chat_history, stats))
+            ttft.append(first)
+            total.append(seconds)
+            prompt_chars.append(stats.get("prompt_chars", 0))
+            memory.wait()
+        results.append({"params": {"history_turns": history, "turns": args.turns},
+                        "metrics": {**{f"ttft_{key}": value for key, value in percentiles(ttft).items()},
+                                    "total_p50_ms": percentiles(total)["p50_ms"],
+                                    "prompt_chars_mean": round(float(np.mean(prompt_chars)))}})
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(FIXTURES)).stdout.strip() or None
+    except OSError:
+        return None
+
+
+#Print old -> new for every metric of results present in both runs
+def compare(old, new):
+    old_results = {(r["pipeline"], json.dumps(r["params"], sort_keys=True)): r["metrics"] for r in old["results"]}
+    print(f"\nchange since {old['meta'].get('git_commit')} ({old['meta'].get('timestamp')})")
+    for result in new["results"]:
+        before = old_results.get((result["pipeline"], json.dumps(result["params"], sort_keys=True)))
+        if before is None:
+            continue
+        changes = [f"{key} {before[key]} -> {value} ({(value - before[key]) / before[key]:+.0%})"
+                   for key, value in result["metrics"].items() if isinstance(before.get(key), (int, float)) and before[key]]
+        print(f"{result['pipeline']:>21} {result['params']}: " + "; ".join(changes))
+
+
+def int_list(text):
+    return [int(n) for n in text.split(",") if n]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", type=int_list, default=[10, 50, 200], help="documents per corpus, comma-separated")
+    parser.add_argument("--history", type=int_list, default=[0, 10, 50, 200], help="chat history sizes in turns")
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3, help="PDF extraction and page scraping runs")
+    parser.add_argument("--token-ms", type=float, default=5.0)
+    parser.add_argument("--ttft-ms", type=float, default=50.0)
+    parser.add_argument("--prompt-ms-per-kchar", type=float, default=2.0)
+    parser.add_argument("--answer-tokens", type=int, default=40)
+    parser.add_argument("--site-latency-ms", type=float, default=20.0)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="earlier JSON results to compare against")
+    parser.add_argument("--write-fixtures", action="store_true")
+    args = parser.parse_args()
+    if args.write_fixtures:
+        write_fixtures()
+        return
+
+    server, base_url = start_fake_ollama(args.token_ms, args.ttft_ms, args.prompt_ms_per_kchar, args.answer_tokens)
+    llm = make_llm(base_url)
+    run = {"meta": {"timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"), "git_commit": git_commit(),
+                    "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+                    "llm_client": type(llm).__name__, "args": {k: v for k, v in vars(args).items()
+                                                              if k not in ("output", "compare", "write_fixtures")}},
+           "results": []}
+
+    def record(pipeline, results):
+        for result in results:
+            run["results"].append({"pipeline": pipeline, **result})
+            print(f"{pipeline:>21} {result['params']}: "
+                  + ", ".join(f"{key} {value}" for key, value in result["metrics"].items()), flush=True)
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            record("extract_text_from_pdf", bench_extract(args))
+            store_results, retrieve_results = bench_store_and_retrieve(args, llm, tmp)
+            record("store_in_faiss", store_results)
+            record("retrieve_and_answer", retrieve_results)
+            record("scrape_web_page", bench_scrape(args, tmp))
+            record("run_chain", bench_chat(args, llm))
+    finally:
+        server.shutdown()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(run, f, indent=1)
+        print(f"wrote {args.output}")
+    else:
+        json.dump(run, sys.stdout, indent=1)
+        print()
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), run)
+
+
+if __name__ == "__main__":
+    main()
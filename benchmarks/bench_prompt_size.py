@@ -0,0 +1,49 @@
+#Compare the retrieval prompt built from whole documents (old behaviour) with top-k chunks
+#Run from the repo root: python -m benchmarks.bench_prompt_size
+import tempfile
+import time
+import numpy as np
+from faiss_store import FaissStore, split_chunk_id
+
+PAGES = 200
+CHARS_PER_PAGE = 2500
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 100
+K = 2
+
+
+def make_chunks(rng):
+    words = ["alpha", "beta", "gamma", "delta", "epsilon", "zeta", "theta", "kappa"]
+    text = " ".join(rng.choice(words, size=PAGES * CHARS_PER_PAGE // 6))
+    step = CHUNK_SIZE - CHUNK_OVERLAP
+    return [text[i:i + CHUNK_SIZE] for i in range(0, len(text), step)]
+
+
+def main():
+    rng = np.random.default_rng(0)
+    texts = make_chunks(rng)
+    vectors = rng.standard_normal((len(texts), 384)).astype(np.float32)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = FaissStore("bench", persist_dir=tmp)
+        store.add_document("manual.pdf", texts, vectors)
+        query = rng.standard_normal(384).astype(np.float32)
+
+        start = time.perf_counter()
+        _, ids = store.search(query, k=K)
+        chunk_context = "".join(chunk + "\n\n" for _, chunk in store.get_chunks(ids))
+        chunk_ms = (time.perf_counter() - start) * 1000
+
+        #Old behaviour: every chunk of each hit document went into the prompt
+        start = time.perf_counter()
+        doc_ids = {split_chunk_id(i)[0] for i in ids}
+        doc_context = "".join("\n".join(texts) + "\n\n" for _ in doc_ids)
+        doc_ms = (time.perf_counter() - start) * 1000
+
+    print(f"chunks indexed: {len(texts)} ({PAGES} pages)")
+    for label, context, ms in (("whole document", doc_context, doc_ms), (f"top-{K} chunks", chunk_context, chunk_ms)):
+        #~4 characters per token is the usual rule of thumb for English text
+        print(f"{label:>15}: {len(context):>8} chars  ~{len(context) // 4:>7} tokens  build {ms:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
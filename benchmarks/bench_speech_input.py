@@ -0,0 +1,146 @@
+#End-of-speech-to-transcript latency and endpointing accuracy of speech_input.SpeechListener
+#over the WAV fixtures in benchmarks/fixtures/speech. Each fixture has a .json label file with
+#the true utterance boundaries; the listener is run once per labelled utterance on one frame
+#stream, so the noise floor carries over like it does between turns. The bundled fixtures are
+#synthetic voiced syllables over different noise (regenerate with --write-fixtures); drop in
+#real 16 kHz mono recordings with labels to test on actual speech.
+#--backend fake checks VAD and endpointing without a speech model; vosk needs VOSK_MODEL_PATH.
+#Run from the repo root: python -m benchmarks.bench_speech_input
+import argparse
+import glob
+import json
+import os
+import wave
+import numpy as np
+from speech_input import FRAME_MS, SAMPLE_RATE, SpeechListener, make_backend, wav_frames
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "speech")
+
+
+#Stands in for a recognizer: reports a partial every 10 frames and decodes instantly
+class FakeBackend:
+    def start(self):
+        return FakeSession()
+
+
+class FakeSession:
+    def __init__(self):
+        self.frames = 0
+
+    def accept(self, frame):
+        self.frames += 1
+        return f"[{self.frames * FRAME_MS} ms of speech]" if self.frames % 10 == 0 else None
+
+    def finish(self):
+        return f"[{self.frames * FRAME_MS} ms of speech]"
+
+
+#Counts the frames read so far, to place each listen() call's relative times in the file
+class CountedFrames:
+    def __init__(self, frames):
+        self.frames = frames
+        self.position = 0
+
+    def __iter__(self):
+        for frame in self.frames:
+            self.position += 1
+            yield frame
+
+
+#A word is 1-3 voiced syllables (harmonics of a gliding pitch under a smooth envelope)
+def synth_word(rng, level):
+    parts = []
+    for _ in range(int(rng.integers(1, 4))):
+        n = int(SAMPLE_RATE * rng.uniform(0.12, 0.25))
+        t = np.arange(n) / SAMPLE_RATE
+        pitch = rng.uniform(110, 220) * (1 + 0.1 * t / t[-1])
+        phase = 2 * np.pi * np.cumsum(pitch) / SAMPLE_RATE
+        voice = sum(np.sin(h * phase) / h for h in range(1, 6)) * np.hanning(n)
+        parts += [voice / np.sqrt(np.mean(voice ** 2)) * level, np.zeros(int(SAMPLE_RATE * rng.uniform(0.02, 0.06)))]
+    return np.concatenate(parts[:-1])
+
+
+#Utterances over background noise that changes linearly from noise_from to noise_to (RMS), plus
+#optional 50 Hz mains hum; the file ends TAIL_S after the last word
+TAIL_S = 1.5
+
+
+def synth_fixture(rng, segments, noise_from, noise_to, speech_level, hum=0.0):
+    speech = np.zeros(60 * SAMPLE_RATE)
+    labels = []
+    for start, words, pause in segments:
+        position = int(start * SAMPLE_RATE)
+        for w in range(words):
+            word = synth_word(rng, speech_level)
+            speech[position:position + word.size] += word
+            end = position + word.size
+            position = end + int(SAMPLE_RATE * (pause if w == words // 2 else rng.uniform(0.08, 0.18)))
+        labels.append([start, round(end / SAMPLE_RATE, 3)])
+    speech = speech[:end + int(TAIL_S * SAMPLE_RATE)]
+    t = np.arange(speech.size) / SAMPLE_RATE
+    audio = speech + rng.normal(size=t.size) * np.linspace(noise_from, noise_to, t.size) + hum * np.sin(2 * np.pi * 50 * t)
+    return np.clip(audio, -32768, 32767).astype(np.int16), labels
+
+
+def write_fixtures():
+    rng = np.random.default_rng(0)
+    fixtures = {
+        #[(utterance start s, words, pause after the middle word s)], noise from, noise to, speech level, hum
+        "quiet_room": ([(1.0, 8, 0.15)], 30, 30, 2000),
+        "noisy_fan": ([(1.2, 8, 0.15)], 250, 250, 2500, 400),
+        "rising_noise": ([(1.0, 6, 0.1), (7.0, 6, 0.1)], 40, 350, 2500),
+        "hesitation": ([(0.8, 10, 0.35)], 60, 60, 2000),
+    }
+    os.makedirs(FIXTURES, exist_ok=True)
+    for name, (segments, noise_from, noise_to, level, *hum) in fixtures.items():
+        audio, labels = synth_fixture(rng, segments, noise_from, noise_to, level, *hum)
+        with wave.open(os.path.join(FIXTURES, f"{name}.wav"), "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(SAMPLE_RATE)
+            wav.writeframes(audio.tobytes())
+        with open(os.path.join(FIXTURES, f"{name}.json"), "w") as f:
+            json.dump({"utterances": labels}, f, indent=1)
+        print(f"wrote {name}.wav ({audio.size / SAMPLE_RATE:.1f} s, {len(labels)} utterances)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", default="fake", help="fake, vosk or google")
+    parser.add_argument("--realtime", action="store_true", help="pace frames like a live microphone")
+    parser.add_argument("--write-fixtures", action="store_true")
+    args = parser.parse_args()
+    if args.write_fixtures:
+        write_fixtures()
+        return
+
+    backend = FakeBackend() if args.backend == "fake" else make_backend(args.backend)
+    print(f"backend {args.backend}; frames {FRAME_MS} ms")
+    for path in sorted(glob.glob(os.path.join(FIXTURES, "*.wav"))):
+        with open(path[:-4] + ".json") as f:
+            labels = json.load(f)["utterances"]
+        listener = SpeechListener(backend)
+        counted = CountedFrames(wav_frames(path, realtime=args.realtime))
+        frames = iter(counted)
+        for n, (true_start, true_end) in enumerate(labels):
+            partials = []
+            #The listener reports times relative to where this listen() call started reading
+            offset = counted.position * FRAME_MS / 1000
+            text = listener.listen(frames, on_partial=partials.append)
+            if text is None:
+                print(f"{os.path.basename(path):>18} #{n}: missed")
+                continue
+            stats = listener.last_stats
+            start_error = (offset + stats["speech_start_s"] - true_start) * 1000
+            end_error = (offset + stats["speech_end_s"] - true_end) * 1000
+            print(f"{os.path.basename(path):>18} #{n}: end-of-speech -> transcript {stats['latency_ms']:6.1f} ms "
+                  f"(endpoint {stats['endpoint_ms']} + decode {stats['transcript_ms']})  "
+                  f"start {start_error:+5.0f} ms  end {end_error:+5.0f} ms  "
+                  f"noise floor {stats['noise_floor']:6.1f}  {len(partials)} partials  {text!r}")
+        extra = listener.listen(frames)
+        if extra is not None:
+            print(f"{os.path.basename(path):>18}: spurious utterance detected ({extra!r})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#Per-turn text-to-speech overhead in the voice UI, before and after the persistent speech worker.
+#  before: every reply builds a new engine (pyttsx3.init) and blocks the page until it has spoken
+#  after:  one SpeechWorker per process; replies are queued, sentences rendered to WAV once and
+#          repeated ones replayed from the cache
+#Reports page-blocking time and time from submitting a reply to its first audio. --engine fake
+#(default) uses an engine with --init-ms startup cost; --engine pyttsx3 uses the real one.
+#Run from the repo root: python -m benchmarks.bench_tts_worker
+import argparse
+import threading
+import time
+import numpy as np
+from voice_pipeline import CachedSpeechBackend, Pyttsx3Backend, SpeechWorker, WavPlayer
+
+#Replies of a short session; the greeting and the fallback repeat
+TURNS = [
+    "Hello! How can I help you today?",
+    "The capital of France is Paris.",
+    "Sorry, I did not understand that.",
+    "It is about 330 metres tall.",
+    "Sorry, I did not understand that.",
+    "Hello! How can I help you today?",
+    "Tickets are cheaper online.",
+    "Sorry, I did not understand that.",
+]
+
+
+#Engine with a startup cost that speaks, or renders, at fixed rates
+class FakeEngine:
+    def __init__(self, args):
+        self.args = args
+        self._stop = threading.Event()
+        time.sleep(args.init_ms / 1000 * args.scale)
+
+    def _sleep(self, seconds):
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end and not self._stop.is_set():
+            time.sleep(0.001)
+
+    def say(self, text):
+        self._stop.clear()
+        self._sleep(len(text.split()) / self.args.words_per_s * self.args.scale)
+
+    def stop(self):
+        self._stop.set()
+
+    def render(self, text):
+        time.sleep(len(text.split()) / self.args.words_per_s / self.args.render_speedup * self.args.scale)
+        return text.encode()
+
+
+#Plays "WAV" produced by FakeEngine.render and records when playback starts
+class FakePlayer:
+    def __init__(self, args):
+        self.args = args
+        self._stop = threading.Event()
+        self.started = []
+
+    def reset(self):
+        self._stop.clear()
+
+    def play(self, wav):
+        self.started.append(time.perf_counter())
+        end = time.perf_counter() + len(wav.split()) / self.args.words_per_s * self.args.scale
+        while time.perf_counter() < end and not self._stop.is_set():
+            time.sleep(0.001)
+
+    def stop(self):
+        self._stop.set()
+
+
+#Real PyAudio playback, recording when each WAV starts playing
+class TimedWavPlayer(WavPlayer):
+    def __init__(self):
+        super().__init__()
+        self.started = []
+
+    def play(self, wav_bytes):
+        self.started.append(time.perf_counter())
+        super().play(wav_bytes)
+
+
+def before(args, make_engine):
+    blocked, first_audio = [], []
+    for text in TURNS:
+        start = time.perf_counter()
+        engine = make_engine()
+        first_audio.append(time.perf_counter() - start)
+        engine.say(text)
+        blocked.append(time.perf_counter() - start)
+    return blocked, first_audio
+
+
+def after(args, make_engine):
+    player = TimedWavPlayer() if args.engine == "pyttsx3" else FakePlayer(args)
+    worker = SpeechWorker(lambda: CachedSpeechBackend(make_engine(), player))
+    worker.prerender([TURNS[0], TURNS[2]])
+    worker.wait()
+    blocked, first_audio = [], []
+    for text in TURNS:
+        start = time.perf_counter()
+        worker.say(text)
+        blocked.append(time.perf_counter() - start)
+        worker.wait()
+        first_audio.append(player.started[-1] - start)
+    worker.close()
+    return blocked, first_audio
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--engine", default="fake", help="fake or pyttsx3")
+    parser.add_argument("--init-ms", type=float, default=250.0)
+    parser.add_argument("--words-per-s", type=float, default=2.7)
+    parser.add_argument("--render-speedup", type=float, default=20.0, help="rendering speed / real time")
+    parser.add_argument("--scale", type=float, default=0.1)
+    args = parser.parse_args()
+    if args.engine == "pyttsx3":
+        args.scale = 1.0
+        make_engine = Pyttsx3Backend
+    else:
+        make_engine = lambda: FakeEngine(args)
+
+    print(f"engine {args.engine}, {len(TURNS)} turns (real-time equivalents, scale {args.scale:g})")
+    for name, run in (("before", before), ("after", after)):
+        blocked, first_audio = run(args, make_engine)
+        blocked, first_audio = np.array(blocked) / args.scale * 1000, np.array(first_audio) / args.scale * 1000
+        print(f"{name:>6}: page blocked {blocked.mean():8.1f} ms/turn  startup to first audio "
+              f"mean {first_audio.mean():6.1f} ms  (min {first_audio.min():6.1f}, max {first_audio.max():6.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#Time to first audio for a spoken answer: serial (generate the whole answer, then speak it, like
+#the old voice loop) vs pipelined (voice_pipeline.speak_stream speaks each sentence as soon as it
+#is generated), plus how fast barge-in stops speech and generation. The LLM and TTS are fakes
+#with configurable token rate and speaking rate; --scale shrinks every delay so the run is quick,
+#and results are reported scaled back to real time.
+#Run from the repo root: python -m benchmarks.bench_voice_pipeline
+import argparse
+import threading
+import time
+from voice_pipeline import SpeechWorker, speak_stream
+
+ANSWER = ("Sure, here is a quick overview. The Eiffel Tower was built for the 1889 World's Fair in Paris. "
+          "It is about 330 metres tall, including its antennas. For 41 years it was the tallest structure "
+          "in the world, e.g. taller than the Washington Monument. Today it draws nearly seven million "
+          "visitors a year. You can reach the top by lift, or climb the stairs to the second floor. "
+          "Tickets are cheaper if you book online in advance. Let me know if you want opening hours.")
+
+
+#Streams ANSWER word by word at tokens_per_s
+class FakeLLM:
+    def __init__(self, tokens_per_s, scale):
+        self.delay = scale / tokens_per_s
+        self.tokens_generated = 0
+
+    def stream(self, prompt):
+        for word in ANSWER.split(" "):
+            time.sleep(self.delay)
+            self.tokens_generated += 1
+            yield word + " "
+
+
+#"Speaks" at words_per_s, in small slices so stop() takes effect like a real engine's
+class FakeTTS:
+    def __init__(self, words_per_s, scale, startup_s=0.0):
+        self.seconds_per_word = scale / words_per_s
+        self._stop = threading.Event()
+        self.stopped_at = None
+        time.sleep(startup_s * scale)
+
+    def say(self, text):
+        self._stop.clear()
+        end = time.perf_counter() + len(text.split()) * self.seconds_per_word
+        while time.perf_counter() < end:
+            if self._stop.is_set():
+                return
+            time.sleep(0.002)
+
+    def stop(self):
+        self.stopped_at = time.perf_counter()
+        self._stop.set()
+
+
+def serial(args):
+    llm, tts = FakeLLM(args.tokens_per_s, args.scale), FakeTTS(args.words_per_s, args.scale)
+    start = time.perf_counter()
+    text = "".join(llm.stream(""))
+    first_audio = time.perf_counter() - start
+    tts.say(text)
+    return first_audio / args.scale, (time.perf_counter() - start) / args.scale
+
+
+def pipelined(args):
+    llm = FakeLLM(args.tokens_per_s, args.scale)
+    worker = SpeechWorker(lambda: FakeTTS(args.words_per_s, args.scale))
+    _, stats = speak_stream(llm.stream(""), worker)
+    worker.close()
+    return stats["time_to_first_audio_s"] / args.scale, stats["total_s"] / args.scale, stats["sentences"]
+
+
+#Talk over the assistant barge_in_after seconds into its answer
+def barge_in(args):
+    llm = FakeLLM(args.tokens_per_s, args.scale)
+    backends = []
+    worker = SpeechWorker(lambda: backends.append(FakeTTS(args.words_per_s, args.scale)) or backends[0])
+    interrupted = threading.Event()
+    timer = threading.Timer(args.barge_in_after * args.scale, interrupted.set)
+    timer.start()
+    start = time.perf_counter()
+    _, stats = speak_stream(llm.stream(""), worker, interrupted)
+    returned = time.perf_counter()
+    worker.close()
+    barged_at = start + args.barge_in_after * args.scale
+    return ((backends[0].stopped_at - barged_at) * 1000 / args.scale, (returned - barged_at) * 1000 / args.scale,
+            llm.tokens_generated, len(ANSWER.split(" ")), stats["interrupted"])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens-per-s", type=float, default=25.0)
+    parser.add_argument("--words-per-s", type=float, default=2.7)  # pyttsx3 rate 160 wpm
+    parser.add_argument("--barge-in-after", type=float, default=3.0)
+    parser.add_argument("--scale", type=float, default=0.1)
+    args = parser.parse_args()
+
+    serial_first, serial_total = serial(args)
+    pipe_first, pipe_total, sentences = pipelined(args)
+    stop_ms, return_ms, generated, total_tokens, interrupted = barge_in(args)
+    print(f"fake LLM {args.tokens_per_s:g} tokens/s, fake TTS {args.words_per_s:g} words/s, "
+          f"{len(ANSWER.split())} words (real-time equivalents, scale {args.scale:g})")
+    print(f"   serial: first audio {serial_first:6.2f} s  turn {serial_total:6.2f} s")
+    print(f"pipelined: first audio {pipe_first:6.2f} s  turn {pipe_total:6.2f} s  ({sentences} sentences)")
+    print(f" barge-in: interrupted={interrupted}, speech stopped {stop_ms:.0f} ms and speak_stream returned "
+          f"{return_ms:.0f} ms after the user spoke; {generated} of {total_tokens} tokens generated")
+
+
+if __name__ == "__main__":
+    main()
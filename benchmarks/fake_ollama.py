@@ -0,0 +1,141 @@
+#Local stand-in for the Ollama HTTP API (POST /api/generate and /api/chat, streamed NDJSON
+#like the real server) with deterministic answers and configurable latency, so the pipelines
+#can be benchmarked offline and runs stay comparable:
+#  first token after ttft_ms + prompt_ms_per_kchar per 1000 prompt characters (prompt
+#  evaluation grows with the retrieved context and the chat history), then one token every token_ms
+#parallel limits the generations running at once (OLLAMA_NUM_PARALLEL); others wait their turn
+import hashlib
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ("the", "answer", "is", "based", "on", "context", "document", "value", "system", "page",
+         "memory", "result", "model", "data", "shows", "that", "and", "with", "each", "part")
+
+
+#Same prompt, same answer: words picked by a generator seeded from the prompt hash
+def fake_answer(prompt, tokens):
+    rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).digest())
+    return [rng.choice(WORDS) + ("." if i % 12 == 11 else "") + " " for i in range(tokens)]
+
+
+def make_handler(token_ms, ttft_ms, prompt_ms_per_kchar, tokens, parallel=None):
+    slots = threading.BoundedSemaphore(parallel) if parallel else None
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def _chunk(self, data):
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        def do_POST(self):
+            if slots is None:
+                return self._generate()
+            with slots:
+                return self._generate()
+
+        def _generate(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if self.path == "/api/chat":
+                prompt = "\n".join(m.get("content", "") for m in body.get("messages", []))
+            elif self.path == "/api/generate":
+                prompt = body.get("prompt", "")
+            else:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            model = body.get("model", "fake")
+            chat = self.path == "/api/chat"
+            start = time.perf_counter()
+            #An empty prompt only loads the model (warm_up does this)
+            answer = fake_answer(prompt, tokens) if prompt else []
+            if answer:
+                time.sleep((ttft_ms + prompt_ms_per_kchar * len(prompt) / 1000) / 1000)
+
+            def message(text, done):
+                message = {"model": model, "created_at": datetime.now(timezone.utc).isoformat(), "done": done}
+                if chat:
+                    message["message"] = {"role": "assistant", "content": text}
+                else:
+                    message["response"] = text
+                if done:
+                    message.update(done_reason="stop", total_duration=int((time.perf_counter() - start) * 1e9),
+                                   prompt_eval_count=len(prompt) // 4 + 1, eval_count=len(answer))
+                return message
+
+            if not body.get("stream", True):
+                time.sleep(token_ms * len(answer) / 1000)
+                data = json.dumps(message("".join(answer), True)).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                for n, token in enumerate(answer):
+                    if n:
+                        time.sleep(token_ms / 1000)
+                    self._chunk(json.dumps(message(token, False)).encode() + b"\n")
+                self._chunk(json.dumps(message("", True)).encode() + b"\n")
+                self._chunk(b"")
+            except (BrokenPipeError, ConnectionResetError):
+                #The client stopped reading (e.g. a closed stream); nothing left to send
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+#Start the server on a free port in a background thread; returns (server, base_url)
+def start_fake_ollama(token_ms=5.0, ttft_ms=50.0, prompt_ms_per_kchar=2.0, tokens=40, parallel=None):
+    server = ThreadingHTTPServer(("127.0.0.1", 0),
+                                 make_handler(token_ms, ttft_ms, prompt_ms_per_kchar, tokens, parallel))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+#Just enough of OllamaLLM (stream, invoke, model) to talk to an Ollama-compatible server,
+#for environments without langchain_ollama
+class OllamaHTTPClient:
+    def __init__(self, model, base_url):
+        import requests
+
+        self.model = model
+        self.base_url = base_url
+        self._session = requests.Session()
+
+    def stream(self, prompt):
+        with self._session.post(f"{self.base_url}/api/generate", json={"model": self.model, "prompt": prompt},
+                                stream=True) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if line:
+                    chunk = json.loads(line)
+                    if chunk.get("response"):
+                        yield chunk["response"]
+
+    def invoke(self, prompt):
+        return "".join(self.stream(prompt))
+
+
+#The apps' LLM client pointed at base_url: OllamaLLM when langchain_ollama is installed
+def make_llm(base_url, model="fake"):
+    try:
+        from langchain_ollama import OllamaLLM
+    except ImportError:
+        return OllamaHTTPClient(model, base_url)
+    return OllamaLLM(model=model, base_url=base_url)
@@ -0,0 +1,68 @@
+#Local stand-in website for crawler benchmarks: /page/<n> links to a few other pages,
+#plus /robots.txt and /sitemap.xml. Pages carry an ETag and answer If-None-Match with 304.
+#Optional per-request latency simulates a remote host; files maps extra paths to HTML served as-is.
+import hashlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PARAGRAPH = "<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor.</p>"
+PAGE_PADDING = 200  # Paragraphs per page, roughly a 20 KB article
+
+
+def make_handler(pages, latency, links_per_page=3, files=None):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, so connection pooling is visible
+        disable_nagle_algorithm = True  # avoid 40 ms delayed-ACK stalls on reused connections
+
+        def _send(self, status, body, content_type="text/html"):
+            data = body.encode("utf-8")
+            etag = '"' + hashlib.md5(data).hexdigest() + '"'
+            if status == 200 and self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            time.sleep(latency)
+            if files and self.path in files:
+                return self._send(200, files[self.path])
+            if self.path == "/robots.txt":
+                return self._send(200, "User-agent: *\nDisallow: /private/\n", "text/plain")
+            if self.path == "/sitemap.xml":
+                locs = "".join(f"<url><loc>{self.base}/page/{n}</loc></url>" for n in range(pages))
+                return self._send(200, f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{locs}</urlset>',
+                                  "application/xml")
+            if self.path.startswith("/page/"):
+                n = int(self.path.rsplit("/", 1)[1])
+                if n < pages:
+                    links = "".join(f'<a href="/page/{(n * links_per_page + i) % pages}">next</a>'
+                                    for i in range(1, links_per_page + 1))
+                    return self._send(200, f"<html><body><h1>Page {n}</h1>{PARAGRAPH * PAGE_PADDING}{links}"
+                                           f'<a href="/private/{n}">private</a></body></html>')
+            self._send(404, "not found")
+
+        @property
+        def base(self):
+            return f"http://{self.headers['Host']}"
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+#Start the server on a free port in a background thread; returns (server, base_url)
+def start_site(pages=200, latency=0.02, files=None):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(pages, latency, files=files))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
@@ -0,0 +1,121 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from tracing import span
+
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", 1024))
+MEMORY_RECENT_TURNS = int(os.getenv("MEMORY_RECENT_TURNS", 6))
+MEMORY_RECALL_K = 2
+#Aged-out turns folded into the summary together; folds run after a reply, never before one
+MEMORY_FOLD_TURNS = int(os.getenv("MEMORY_FOLD_TURNS", 4))
+
+FOLD_PROMPT = """Update the running summary of a conversation with the new messages below. Keep it short and keep names, facts and decisions.
+
+Current summary:
+{summary}
+
+New messages:
+{messages}
+
+Updated summary:"""
+
+
+#Rough token count (~4 characters per token) so we do not need a tokenizer
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+
+def format_message(msg):
+    return f"{msg.type.capitalize()}: {msg.content}"
+
+
+#Bounded prompt history: recent turns verbatim, older turns folded into a rolling summary
+#(updated in the background) and, if an embedding model is given, recalled by similarity.
+#Turns that aged out but are not folded yet stay verbatim, so nothing drops out of the prompt.
+class ConversationMemory:
+    def __init__(self, llm, chat_history, max_tokens=MEMORY_TOKEN_BUDGET, recent_turns=MEMORY_RECENT_TURNS,
+                 embedding_model=None, recall_k=MEMORY_RECALL_K, fold_turns=MEMORY_FOLD_TURNS):
+        self.llm = llm
+        self.chat_history = chat_history
+        self.max_tokens = max_tokens
+        self.recent_turns = recent_turns
+        self.embedding_model = embedding_model
+        self.recall_k = recall_k
+        self.fold_turns = fold_turns
+        self.summary = ""
+        self.folded = 0  # Messages already folded into the summary
+        self._recall_texts = []
+        self._recall_vectors = []
+        self._lock = threading.Lock()
+        self._pending = None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    #Index of the first message kept verbatim: newest turns that fit the budget
+    def _verbatim_start(self, messages):
+        used = 0
+        start = len(messages)
+        while start > 0 and len(messages) - start < self.recent_turns * 2:
+            cost = estimate_tokens(format_message(messages[start - 1]))
+            if used + cost > self.max_tokens:
+                break
+            used += cost
+            start -= 1
+        return start
+
+    def _fold(self, messages, end):
+        lines = "\n".join(format_message(msg) for msg in messages)
+        #Runs on the background thread, so it shows up in the metrics but not in the request's trace
+        with span("llm.invoke", purpose="memory_fold", messages=len(messages)):
+            summary = self.llm.invoke(FOLD_PROMPT.format(summary=self.summary or "(none)", messages=lines))
+        vectors = self.embedding_model.embed_documents(
+            [format_message(msg) for msg in messages]) if self.embedding_model else []
+        with self._lock:
+            self.summary = summary.strip()
+            self.folded = end
+            for msg, vector in zip(messages, vectors):
+                self._recall_texts.append(format_message(msg))
+                self._recall_vectors.append(np.asarray(vector, dtype=np.float32))
+
+    #Call once a reply is finished. Folds aged-out messages in the background once fold_turns
+    #turns have piled up: on a serial Ollama server a fold delays whatever is generated next, so
+    #it runs while the user reads the reply, and only every few turns.
+    def after_turn(self):
+        if self._pending is not None and not self._pending.done():
+            return
+        messages = list(self.chat_history.messages)
+        end = self._verbatim_start(messages)
+        with self._lock:
+            start = self.folded
+        if end - start >= self.fold_turns * 2:
+            self._pending = self._executor.submit(self._fold, messages[start:end], end)
+
+    def _recall(self, question):
+        if not self.embedding_model or not self._recall_vectors:
+            return []
+        query = np.asarray(self.embedding_model.embed_query(question), dtype=np.float32)
+        with self._lock:
+            matrix = np.stack(self._recall_vectors)
+            texts = list(self._recall_texts)
+        scores = matrix @ query
+        return [texts[i] for i in np.argsort(-scores)[:self.recall_k]]
+
+    #History text for the prompt; size stays bounded however long the conversation gets
+    def build_context(self, question=""):
+        messages = list(self.chat_history.messages)
+        with self._lock:
+            summary = self.summary
+            folded = self.folded
+        start = min(self._verbatim_start(messages), folded)
+        parts = []
+        if summary:
+            parts.append(f"Summary of earlier conversation: {summary}")
+        recalled = self._recall(question) if question else []
+        if recalled:
+            parts.append("Relevant earlier messages:\n" + "\n".join(recalled))
+        parts.extend(format_message(msg) for msg in messages[start:])
+        return "\n".join(parts)
+
+    def wait(self):
+        if self._pending is not None:
+            self._pending.result()
@@ -0,0 +1,90 @@
+import hashlib
+import os
+import zlib
+import numpy as np
+
+#Chunks whose estimated Jaccard similarity (over word shingles) reaches this are duplicates
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", 0.8))
+SHINGLE_WORDS = 3
+NUM_PERM = 128
+#16 bands of 8 rows: pairs above ~0.7 similarity share a band with high probability,
+#and every candidate is then checked against DEDUP_THRESHOLD on the full signature
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERM // LSH_BANDS
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_rng = np.random.RandomState(1)
+_A = _rng.randint(1, 1 << 32, NUM_PERM, dtype=np.uint64)
+_B = _rng.randint(0, 1 << 32, NUM_PERM, dtype=np.uint64)
+
+
+def normalize(text):
+    return " ".join(text.lower().split())
+
+
+def shingle_hashes(text):
+    words = normalize(text).split()
+    if len(words) <= SHINGLE_WORDS:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    return np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+
+
+#MinHash signature: for each of NUM_PERM hash functions, the minimum over the text's shingles
+def minhash_signature(text):
+    hashes = shingle_hashes(text)
+    permuted = (np.outer(hashes, _A) + _B) % _PRIME & _MAX_HASH
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+#One signed 64-bit key per LSH band (band index included, so bands never collide with each other)
+def band_keys(signature):
+    keys = []
+    for band in range(LSH_BANDS):
+        rows = signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+        digest = hashlib.blake2b(band.to_bytes(2, "little") + rows.tobytes(), digest_size=8).digest()
+        keys.append(int.from_bytes(digest, "little", signed=True))
+    return keys
+
+
+def estimated_similarity(a, b):
+    return float(np.mean(a == b))
+
+
+#For each text, whether it (near-)duplicates an earlier text in the list. Only repeats within
+#one document or batch count: checking against every stored chunk dropped whole documents that
+#were uploaded again under another name, or left a new version with only its changes.
+def duplicate_mask(texts):
+    seen_exact = set()
+    bands = {}
+    signatures = []
+    mask = []
+    for text in texts:
+        exact = normalize(text)
+        if exact in seen_exact:
+            mask.append(True)
+            continue
+        seen_exact.add(exact)
+        signature = minhash_signature(text)
+        keys = band_keys(signature)
+        candidates = {i for key in keys for i in bands.get(key, ())}
+        duplicate = any(estimated_similarity(signature, signatures[i]) >= DEDUP_THRESHOLD for i in candidates)
+        mask.append(duplicate)
+        if not duplicate:
+            for key in keys:
+                bands.setdefault(key, []).append(len(signatures))
+        signatures.append(signature)
+    return mask
+
+
+#Keep the first occurrence of every (near-)duplicate chunk in texts. Returns (kept texts, stats)
+#where stats reports the embeddings and index bytes of store the dropped chunks would have cost.
+def drop_duplicates(store, texts):
+    duplicate = duplicate_mask(texts)
+    kept = [text for text, dup in zip(texts, duplicate) if not dup]
+    removed = len(texts) - len(kept)
+    stats = {"chunks": len(texts), "removed": removed, "embeddings_saved": removed,
+             "index_bytes_saved": removed * store.bytes_per_vector()}
+    return kept, stats
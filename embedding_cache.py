@@ -0,0 +1,123 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+from shared_resources import PERSIST_DIR
+from tracing import span
+
+#Cap the on-disk cache at ~256 MB of vectors unless told otherwise
+MAX_CACHE_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+
+#Content-addressed key: the same text embedded by the same model always hits
+def cache_key(model_name, text):
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).digest()
+
+
+#On-disk embedding cache (SQLite blobs, float16 by default) with LRU eviction
+class EmbeddingCache:
+    def __init__(self, embedding_model, model_name=None, path=None, dtype=np.float16, max_bytes=MAX_CACHE_BYTES):
+        self.embedding_model = embedding_model
+        self.model_name = model_name or getattr(embedding_model, "model_name", type(embedding_model).__name__)
+        self.dtype = np.dtype(dtype)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        path = path or os.path.join(PERSIST_DIR, "embedding_cache.sqlite")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._db.commit()
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def _get_many(self, keys):
+        found = {}
+        #Stay under SQLite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            for key, blob in self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch):
+                found[key] = np.frombuffer(blob, dtype=self.dtype)
+        if found:
+            now = time.time()
+            self._db.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, k) for k in found])
+        return found
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        #Drop least recently used rows until we are back under the cap
+        excess = total - self.max_bytes
+        freed = 0
+        stale = []
+        for key, size in self._db.execute("SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_used"):
+            stale.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._db.executemany("DELETE FROM embeddings WHERE key = ?", stale)
+
+    #Embed texts, computing only the cache misses; returns a float32 (n, dim) array. Misses come
+    #back exactly as the model computed them, hits as stored (float16 by default).
+    def embed_documents(self, texts):
+        with span("embed_documents", texts=len(texts)) as attrs:
+            return self._embed_documents(texts, attrs)
+
+    def _embed_documents(self, texts, attrs):
+        keys = [cache_key(self.model_name, text) for text in texts]
+        #The lock only covers the database: the model call can take minutes for a large document,
+        #and other sessions' lookups and embeddings must not wait for it
+        with self._lock:
+            cached = self._get_many(list(set(keys)))
+            self._db.commit()
+            missing = {}
+            for key, text in zip(keys, texts):
+                if key not in cached and key not in missing:
+                    missing[key] = text
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        attrs["misses"] = len(missing)
+        if missing:
+            vectors = self.embedding_model.embed_documents(list(missing.values()))
+            now = time.time()
+            rows = []
+            for key, vector in zip(missing, vectors):
+                #The caller gets the model's float32 vector (it feeds the store's exact vectors);
+                #only the cached copy is rounded to the cache dtype
+                vector = np.asarray(vector, dtype=np.float32)
+                cached[key] = vector
+                rows.append((key, vector.astype(self.dtype).tobytes(), now))
+            with self._lock:
+                self._db.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+                self._evict()
+                self._db.commit()
+        if not keys:
+            return np.empty((0, 0), dtype=np.float32)
+        out = np.empty((len(keys), len(cached[keys[0]])), dtype=np.float32)
+        for i, key in enumerate(keys):
+            out[i] = cached[key]
+        return out
+
+    #Queries are not cached: they are rarely repeated and embed in a few ms
+    def embed_query(self, text):
+        with span("embed_query"):
+            return self.embedding_model.embed_query(text)
+
+    #Many queries in one model call, uncached and at full precision like embed_query
+    #(all-MiniLM embeds queries and documents the same way); returns a float32 (n, dim) array
+    def embed_queries(self, texts):
+        with span("embed_query", queries=len(texts)):
+            return np.asarray(self.embedding_model.embed_documents(texts), dtype=np.float32)
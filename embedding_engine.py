@@ -0,0 +1,82 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 64))
+#Every worker loads its own copy of the model, so only a couple by default
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", min(2, os.cpu_count() or 1)))
+
+#Per-process embedding model, loaded once by the pool initializer
+_worker_model = None
+
+
+def _init_worker(model_name):
+    global _worker_model
+    try:
+        #One intra-op thread per process; the pool provides the parallelism
+        import torch
+        torch.set_num_threads(1)
+    except ImportError:
+        pass
+    from langchain_huggingface import HuggingFaceEmbeddings
+    _worker_model = HuggingFaceEmbeddings(model_name=model_name)
+
+
+def _embed_batch(texts):
+    return np.asarray(_worker_model.embed_documents(texts), dtype=np.float32)
+
+
+#Split texts into batches of similar length so each batch pads to a similar size
+def length_sorted_batches(texts, batch_size):
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+
+#Batched, multi-process embedding that fills a preallocated float32 array
+class EmbeddingEngine:
+    def __init__(self, embedding_model, model_name=None, dim=384, batch_size=EMBED_BATCH_SIZE, workers=EMBED_WORKERS):
+        self.embedding_model = embedding_model
+        self.model_name = model_name or embedding_model.model_name
+        self.dim = dim
+        self.batch_size = batch_size
+        self.workers = workers
+        self._pool = None
+
+    #Workers are spawned, not forked: forking the Streamlit server after warm_up has started
+    #torch's threads can leave a child deadlocked on a lock held by one of them
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker, initargs=(self.model_name,)
+            )
+        return self._pool
+
+    #Embed texts into out[i] for texts[i]; returns out (allocated if not given)
+    def embed_into(self, texts, out=None):
+        if out is None:
+            out = np.empty((len(texts), self.dim), dtype=np.float32)
+        batches = length_sorted_batches(texts, self.batch_size)
+        #Small inputs are not worth shipping to the pool
+        if self.workers <= 1 or len(batches) <= 1:
+            for batch in batches:
+                out[batch] = self.embedding_model.embed_documents([texts[i] for i in batch])
+            return out
+        pool = self._get_pool()
+        futures = {pool.submit(_embed_batch, [texts[i] for i in batch]): batch for batch in batches}
+        for future in as_completed(futures):
+            out[futures[future]] = future.result()
+        return out
+
+    #Drop-in replacement for HuggingFaceEmbeddings.embed_documents
+    def embed_documents(self, texts):
+        return self.embed_into(texts)
+
+    def embed_query(self, text):
+        return self.embedding_model.embed_query(text)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
@@ -0,0 +1,445 @@
+import os
+import re
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
+import faiss
+import numpy as np
+from hybrid_search import DENSE_WEIGHT, KEYWORD_WEIGHT, candidate_count, keyword_query, reciprocal_rank_fusion
+from index_factory import (INDEX_TYPE, RERANK, TRAINED_TYPES, VECTOR_STORAGE, build_index, bytes_per_vector, export_vectors,
+                           index_kind, index_overhead_bytes, index_storage, needs_rebuild, set_search_params, target_kind,
+                           target_storage)
+from rwlock import RWLock
+from shared_resources import PERSIST_DIR
+from tracing import span
+
+try:
+    import fcntl
+except ImportError:
+    #Windows: no lock across processes, so only one process may write a store at a time
+    fcntl = None
+
+EMBEDDING_DIM = 384  # Dimension for all-MiniLM-L6-v2
+INDEX_ADD_BATCH = 4096  # Rows per index.add call when ingesting large documents
+CHUNK_BITS = 32  # Low bits of a chunk id hold the chunk's position in its document
+
+
+DOCSTORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    source TEXT UNIQUE NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    doc_id INTEGER NOT NULL REFERENCES documents(id),
+    position INTEGER NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+    text, content='chunks', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TABLE IF NOT EXISTS chunk_vectors (
+    chunk_id INTEGER PRIMARY KEY,
+    vector BLOB NOT NULL
+);
+"""
+
+
+#Pack (document id, chunk position) into one 64-bit FAISS id
+def make_chunk_id(doc_id, position):
+    return (doc_id << CHUNK_BITS) | position
+
+
+def split_chunk_id(chunk_id):
+    return chunk_id >> CHUNK_BITS, chunk_id & ((1 << CHUNK_BITS) - 1)
+
+
+#Directory-safe form of a tenant / session namespace
+def namespace_dir(namespace):
+    return re.sub(r"[^A-Za-z0-9_-]", "_", namespace)[:64] or "_"
+
+
+#sqlite3 connections sit in reference cycles and would stay open until the cyclic GC runs
+def _close_connections(connections):
+    for _, db in connections:
+        db.close()
+
+
+#One caller's documents waiting for the next index write
+class _PendingWrite:
+    def __init__(self, documents):
+        self.documents = documents
+        self.added = 0
+        self.error = None
+        self.done = False
+
+
+#Persistent FAISS index opened memory-mapped, plus a SQLite chunk docstore with a BM25
+#(FTS5) keyword index over the same chunks. A namespace (tenant or session) gets its own
+#sub-index and docstore, so it only ever searches its own documents.
+#Vectors can be stored compressed in the index (fp16, sq8, pq); the exact float32 vectors are
+#kept on disk in the docstore and used to re-rank the top candidates of every search.
+#Thread-safe: searches share a read lock and run in parallel; concurrent ingests queue up
+#and are applied together by one writer with one index save. The writer builds and saves a
+#private copy of the index, so searches only wait while the saved copy is swapped in.
+class FaissStore:
+    def __init__(self, name, dim=EMBEDDING_DIM, persist_dir=None, index_type=INDEX_TYPE, namespace=None,
+                 storage=VECTOR_STORAGE, rerank=RERANK):
+        self.dim = dim
+        self.index_type = index_type
+        self.storage = storage
+        self.rerank = rerank
+        self.namespace = namespace
+        self.path = os.path.join(persist_dir or PERSIST_DIR, name)
+        if namespace is not None:
+            self.path = os.path.join(self.path, "namespaces", namespace_dir(namespace))
+        self.index_path = os.path.join(self.path, "index.faiss")
+        self.db_path = os.path.join(self.path, "docstore.sqlite")
+        self.lock_path = os.path.join(self.path, "write.lock")
+        self._rw = RWLock()
+        self._writer_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending = []
+        self._local = threading.local()
+        #(thread, connection) for every open connection, closed as soon as the last reference to
+        #the store goes away
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        weakref.finalize(self, _close_connections, self._connections)
+        #Written only under the writer lock; readers use their own per-thread connections. Opened on
+        #the first write, so a namespace that is only looked at leaves no files behind.
+        self._db = None
+        if os.path.exists(self.db_path):
+            self._open_db()
+        self._version = None
+        self.index = self._open_index()
+
+    def _open_db(self):
+        os.makedirs(self.path, exist_ok=True)
+        self._db = self._connect(self.db_path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        has_keyword_index = self._db.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'chunks_fts'").fetchone() is not None
+        self._db.executescript(DOCSTORE_SCHEMA)
+        #Stores written before the keyword index existed: index their chunks once
+        if not has_keyword_index:
+            self._db.execute("INSERT INTO chunks_fts (chunks_fts) VALUES ('rebuild')")
+        self._db.commit()
+
+    #Every save replaces the file, so a new inode (or mtime) means another writer saved
+    def _file_version(self):
+        stat = os.stat(self.index_path)
+        return stat.st_ino, stat.st_mtime_ns
+
+    #Open the saved index memory-mapped so processes share it through the page cache and opening
+    #it costs no copy. IO_FLAG_MMAP only maps IVF inverted lists (flat codes were read into RAM)
+    #and cannot be combined with IO_FLAG_MMAP_IFC, which maps the codes of every index type.
+    def _open_index(self):
+        if not os.path.exists(self.index_path):
+            kind = target_kind(self.index_type, 0, self.storage)
+            return build_index(kind, self.dim, storage=target_storage(self.storage, kind, 0))
+        self._version = self._file_version()
+        index = faiss.read_index(self.index_path, faiss.IO_FLAG_MMAP_IFC)
+        set_search_params(index, index_kind(index))
+        return index
+
+    #Memory-mapped indexes are read-only, and searches keep using self.index while a write is
+    #built, so writers load (or start) a private copy
+    def _open_writable(self):
+        if not os.path.exists(self.index_path):
+            kind = target_kind(self.index_type, 0, self.storage)
+            return build_index(kind, self.dim, storage=target_storage(self.storage, kind, 0))
+        return faiss.read_index(self.index_path)
+
+    #Pick up index files written by another process since we opened ours. The old index is
+    #dropped after _refresh_lock is released (see _write_batch), so other searches do not wait.
+    def _refresh(self):
+        stale = None
+        with self._refresh_lock:
+            if os.path.exists(self.index_path) and self._file_version() != self._version:
+                stale, self.index = self.index, self._open_index()
+
+    #Per-thread read connection; WAL lets these read while a writer commits. Until the first
+    #write creates the docstore, reads go to an empty in-memory one instead of creating the file.
+    def _reader(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            if not os.path.exists(self.db_path):
+                empty = getattr(self._local, "empty", None)
+                if empty is None:
+                    empty = self._local.empty = self._connect(":memory:", threading.current_thread())
+                    empty.executescript(DOCSTORE_SCHEMA)
+                return empty
+            self._local.empty = None
+            db = self._local.db = self._connect(self.db_path, threading.current_thread())
+        return db
+
+    #Connections are closed by whichever thread drops the store or opens the next one, hence
+    #check_same_thread=False; each is still only used by its own thread (the writer's under the writer lock)
+    def _connect(self, path, thread=None):
+        db = sqlite3.connect(path, check_same_thread=False)
+        with self._connections_lock:
+            #Readers of finished threads (Streamlit runs every rerun on a new one)
+            finished = [entry for entry in self._connections if entry[0] is not None and not entry[0].is_alive()]
+            for entry in finished:
+                entry[1].close()
+                self._connections.remove(entry)
+            self._connections.append((thread, db))
+        return db
+
+    #Write to a temp file that _write_batch renames into place, so readers never see a
+    #half-written index
+    def _save(self, index):
+        tmp_path = self.index_path + ".tmp"
+        faiss.write_index(index, tmp_path)
+        return tmp_path
+
+    #Held for a whole read-modify-write of the index file, so processes writing the same store
+    #(ingest.py and the apps) never save over each other's vectors
+    @contextmanager
+    def _process_lock(self):
+        os.makedirs(self.path, exist_ok=True)
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def has_document(self, source):
+        row = self._reader().execute("SELECT 1 FROM documents WHERE source = ?", (source,)).fetchone()
+        return row is not None
+
+    #Add one document's chunks and their vectors (row i of vectors belongs to texts[i])
+    def add_document(self, source, texts, vectors):
+        return self.add_documents([(source, texts, vectors)])
+
+    #Add several (source, texts, vectors) documents with a single index write. Documents whose
+    #source is already stored are skipped, and so are documents without chunks (nothing
+    #extracted, or every chunk a duplicate), so has_document stays False and they can be
+    #stored again later. Returns the number of chunks added.
+    def add_documents(self, documents):
+        pending = _PendingWrite(documents)
+        with self._pending_lock:
+            self._pending.append(pending)
+        #Includes waiting for the writer lock, which is what a caller experiences
+        with span("index.add", documents=len(documents)) as attrs:
+            with self._writer_lock, self._process_lock():
+                #Whoever got the writer lock first may have applied our documents along with theirs
+                if not pending.done:
+                    with self._pending_lock:
+                        batch, self._pending = self._pending, []
+                    self._write_batch(batch)
+            attrs["chunks"] = pending.added
+        if pending.error is not None:
+            raise pending.error
+        return pending.added
+
+    #Apply queued writes in one transaction and one index save; if that fails, retry them
+    #one at a time so a bad request only fails its own caller. Runs under the process lock, so
+    #the index is re-read here to include what other processes wrote. Reading, adding, rebuilding
+    #and saving all happen on a private copy while searches go on; they only wait for the copy
+    #to be renamed into place, the docstore commit and the saved index being mapped.
+    def _write_batch(self, batch):
+        if self._db is None:
+            self._open_db()
+        try:
+            index = self._open_writable()
+            added = [self._add_locked(index, pending.documents) for pending in batch]
+            tmp_path = self._save(self._rebuild_if_needed(index))
+            #The docstore is committed only once the index holding its vectors is saved
+            with self._rw.write():
+                os.replace(tmp_path, self.index_path)
+                self._db.commit()
+                stale, self.index = self.index, self._open_index()
+            #Unmapping the replaced file frees its disk blocks, which takes seconds for a large
+            #index, so the old index is only dropped once searches can go on
+            del stale
+        except Exception as error:
+            #Leave neither a half-written docstore transaction nor stray vectors behind
+            self._db.rollback()
+            if len(batch) == 1:
+                batch[0].error = error
+                batch[0].done = True
+            else:
+                for pending in batch:
+                    self._write_batch([pending])
+            return
+        for pending, count in zip(batch, added):
+            pending.added = count
+            pending.done = True
+
+    def _add_locked(self, index, documents):
+        added = 0
+        for source, texts, vectors in documents:
+            #Checked under the writer lock, so two sessions storing the same source cannot race
+            if not texts or self._db.execute("SELECT 1 FROM documents WHERE source = ?", (source,)).fetchone():
+                continue
+            vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+            cur = self._db.execute("INSERT INTO documents (source) VALUES (?)", (source,))
+            doc_id = cur.lastrowid
+            ids = np.array([make_chunk_id(doc_id, i) for i in range(len(texts))], dtype=np.int64)
+            for start in range(0, len(ids), INDEX_ADD_BATCH):
+                end = start + INDEX_ADD_BATCH
+                index.add_with_ids(vectors[start:end], ids[start:end])
+            self._db.executemany(
+                "INSERT INTO chunks (id, doc_id, position, text) VALUES (?, ?, ?, ?)",
+                [(int(chunk_id), doc_id, i, text) for i, (chunk_id, text) in enumerate(zip(ids, texts))],
+            )
+            #Same transaction as the chunks, so the two indexes never disagree
+            self._db.executemany(
+                "INSERT INTO chunks_fts (rowid, text) VALUES (?, ?)",
+                [(int(chunk_id), text) for chunk_id, text in zip(ids, texts)],
+            )
+            #Exact vectors on disk: the source for re-ranking and for rebuilding compressed indexes
+            self._db.executemany(
+                "INSERT INTO chunk_vectors (chunk_id, vector) VALUES (?, ?)",
+                [(int(chunk_id), vector.tobytes()) for chunk_id, vector in zip(ids, vectors)],
+            )
+            added += len(texts)
+        return added
+
+    #Promote flat -> IVF/HNSW or float32 -> compressed codes (or retrain IVF) once the index
+    #crosses a size threshold. Returns the index to save: the rebuilt one or index itself.
+    def _rebuild_if_needed(self, index):
+        if not needs_rebuild(self.index_type, index, self.storage):
+            return index
+        all_vectors, all_ids = export_vectors(index)
+        #Decoding compressed codes is lossy; rebuild from the exact vectors when we have them all
+        exact = self._exact_vectors(all_ids, self._db)
+        if len(exact) == len(all_ids):
+            all_vectors = np.stack([exact[int(i)] for i in all_ids])
+        kind = target_kind(self.index_type, len(all_ids), self.storage)
+        storage = target_storage(self.storage, kind, len(all_ids))
+        return build_index(kind, self.dim, all_vectors, all_ids, INDEX_ADD_BATCH, storage)
+
+    #{chunk id: float32 vector} for the ids that have an exact vector on disk
+    def _exact_vectors(self, ids, db):
+        vectors = {}
+        ids = [int(i) for i in ids]
+        for start in range(0, len(ids), 900):
+            batch = ids[start:start + 900]
+            placeholders = ",".join("?" * len(batch))
+            for chunk_id, blob in db.execute(
+                    f"SELECT chunk_id, vector FROM chunk_vectors WHERE chunk_id IN ({placeholders})", batch):
+                vectors[chunk_id] = np.frombuffer(blob, dtype=np.float32)
+        return vectors
+
+    #Return distances and chunk ids of the k nearest chunks. Compressed indexes return
+    #rerank x k candidates, re-ranked by exact distance to the on-disk float32 vectors.
+    def search(self, query_vector, k=2, rerank=None):
+        D, I = self.search_batch(np.asarray(query_vector).reshape(1, -1), k, rerank)
+        return D[0], I[0]
+
+    #search for many queries (one per row) with a single index.search over the whole matrix;
+    #returns per-query lists of distances and chunk ids
+    def search_batch(self, query_vectors, k=2, rerank=None):
+        query_vectors = np.ascontiguousarray(query_vectors, dtype=np.float32).reshape(-1, self.dim)
+        rerank = self.rerank if rerank is None else rerank
+        with self._rw.read():
+            self._refresh()
+            index = self.index
+            if index.ntotal == 0:
+                return [[] for _ in query_vectors], [[] for _ in query_vectors]
+            candidates = k * rerank if rerank > 1 and index_storage(index) != "float32" else k
+            with span("index.search", k=candidates, ntotal=index.ntotal, queries=len(query_vectors)):
+                D, I = index.search(query_vectors, candidates)
+        hits = [[(float(d), int(i)) for d, i in zip(row_d, row_i) if i >= 0] for row_d, row_i in zip(D, I)]
+        if candidates > k:
+            with span("rerank", candidates=sum(len(row) for row in hits)):
+                #One docstore read for every query's candidates
+                exact = self._exact_vectors({i for row in hits for _, i in row}, self._reader())
+                hits = [self._rerank(query_vector, row, exact)[:k] for query_vector, row in zip(query_vectors, hits)]
+        return [[d for d, _ in row] for row in hits], [[i for _, i in row] for row in hits]
+
+    #Exact squared L2 distances for the candidates that have a stored vector (exact: {chunk id:
+    #vector}); others keep the index's approximate distance
+    def _rerank(self, query_vector, hits, exact):
+        reranked = []
+        for distance, chunk_id in hits:
+            vector = exact.get(chunk_id)
+            if vector is not None:
+                distance = float(np.sum((vector - query_vector) ** 2))
+            reranked.append((distance, chunk_id))
+        return sorted(reranked)
+
+    #Return BM25 scores (higher is better) and chunk ids of the k best keyword matches
+    def keyword_search(self, query_text, k=2):
+        match = keyword_query(query_text)
+        if not match:
+            return [], []
+        with span("keyword_search", k=k):
+            rows = self._reader().execute(
+                "SELECT rowid, bm25(chunks_fts) FROM chunks_fts WHERE chunks_fts MATCH ? "
+                "ORDER BY bm25(chunks_fts) LIMIT ?", (match, k)
+            ).fetchall()
+        #FTS5's bm25() is negated so that ascending order is best first
+        return [-score for _, score in rows], [chunk_id for chunk_id, _ in rows]
+
+    #Fuse dense and keyword rankings with reciprocal rank fusion; returns RRF scores and chunk ids
+    def hybrid_search(self, query_vector, query_text, k=2, weights=(DENSE_WEIGHT, KEYWORD_WEIGHT)):
+        scores, ids = self.hybrid_search_batch(np.asarray(query_vector).reshape(1, -1), [query_text], k, weights)
+        return scores[0], ids[0]
+
+    #hybrid_search for many queries: one matrix search for the dense side, then a BM25 query
+    #per text; returns per-query lists of RRF scores and chunk ids
+    def hybrid_search_batch(self, query_vectors, query_texts, k=2, weights=(DENSE_WEIGHT, KEYWORD_WEIGHT)):
+        candidates = candidate_count(k)
+        _, dense_ids = self.search_batch(query_vectors, candidates)
+        all_scores, all_ids = [], []
+        for dense, query_text in zip(dense_ids, query_texts):
+            _, keyword_ids = self.keyword_search(query_text, candidates)
+            fused = reciprocal_rank_fusion([dense, keyword_ids], k, weights)
+            all_scores.append([score for score, _ in fused])
+            all_ids.append([chunk_id for _, chunk_id in fused])
+        return all_scores, all_ids
+    #Approximate index bytes per stored vector at the store's current index type and codec
+    def bytes_per_vector(self):
+        with self._rw.read():
+            return bytes_per_vector(index_kind(self.index), self.dim, index_storage(self.index))
+
+    #Index memory accounting: per-vector and total bytes of the index (codes, ids, graph links,
+    #centroids and codebooks) next to the exact vectors kept on disk for re-ranking
+    def memory_usage(self):
+        with self._rw.read():
+            index = self.index
+            kind, storage, ntotal = index_kind(index), index_storage(index), index.ntotal
+            nlist = faiss.extract_index_ivf(index).nlist if kind in TRAINED_TYPES else 0
+        per_vector = bytes_per_vector(kind, self.dim, storage)
+        exact_vectors = self._reader().execute("SELECT COUNT(*) FROM chunk_vectors").fetchone()[0]
+        return {
+            "kind": kind,
+            "storage": storage,
+            "vectors": ntotal,
+            "bytes_per_vector": per_vector,
+            "index_bytes": ntotal * per_vector + index_overhead_bytes(kind, self.dim, storage, nlist),
+            "exact_vector_bytes_on_disk": exact_vectors * self.dim * 4,
+        }
+
+    #Look up (source, chunk text) for each chunk id, keeping the search order
+    def get_chunks(self, ids):
+        if not ids:
+            return []
+        placeholders = ",".join("?" * len(ids))
+        rows = self._reader().execute(
+            f"SELECT chunks.id, documents.source, chunks.text FROM chunks "
+            f"JOIN documents ON documents.id = chunks.doc_id WHERE chunks.id IN ({placeholders})",
+            [int(i) for i in ids],
+        ).fetchall()
+        by_id = {row[0]: (row[1], row[2]) for row in rows}
+        return [by_id[i] for i in ids if i in by_id]
+
+    #All chunk texts of one document, in document order
+    def get_document_chunks(self, source):
+        return [text for (text,) in self._reader().execute(
+            "SELECT chunks.text FROM chunks JOIN documents ON documents.id = chunks.doc_id "
+            "WHERE documents.source = ? ORDER BY chunks.position", (source,))]
+
+    def __len__(self):
+        with self._rw.read():
+            return self.index.ntotal
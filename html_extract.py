@@ -0,0 +1,161 @@
+import os
+import re
+from urllib.parse import urldefrag, urljoin, urlparse
+
+try:
+    from lxml import etree, html as lxml_html
+except ImportError:  # Fall back to the original BeautifulSoup path
+    etree = lxml_html = None
+
+#"lxml" (fast path with main-content detection) or "bs4" (original <p>-only html.parser path)
+HTML_EXTRACTOR = os.getenv("HTML_EXTRACTOR", "lxml" if etree is not None else "bs4")
+
+BLOCK_TAGS = {"p", "li", "h1", "h2", "h3", "h4", "h5", "h6", "td", "th", "pre", "blockquote", "dd", "dt", "figcaption"}
+BOILERPLATE_TAGS = ["script", "style", "noscript", "nav", "header", "footer", "aside", "form", "iframe",
+                    "svg", "button", "select", "template"]
+#Matched against whole class / id / role tokens only: "sidebar" is boilerplate, but "has-sidebar"
+#(a layout modifier on the content wrapper) and "tag-social" (a post's tag) are not
+BOILERPLATE_ATTR = re.compile(
+    r"(nav|navbar|menu|footer|sidebar|cookie|banner|breadcrumbs?|comments?|share|social|promo|advert|ads?|related|subscribe|newsletter)",
+    re.I,
+)
+#Never dropped by class or id, nor are their ancestors or the best-scoring container
+CONTENT_TAGS = ("article", "main")
+MIN_BLOCK_CHARS = 25
+SIBLING_SCORE_RATIO = 0.2
+
+
+def _clean(text):
+    return " ".join(text.split())
+
+
+#Original extraction: every <p> via BeautifulSoup's pure-Python html.parser
+def _extract_bs4(html, url):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "html.parser")
+    text = "\n".join(p.get_text() for p in soup.find_all("p"))
+    links = [a["href"] for a in soup.find_all("a", href=True)]
+    return text, links
+
+
+def _strip_boilerplate(root):
+    etree.strip_elements(root, *BOILERPLATE_TAGS, etree.Comment, with_tail=False)
+    protected = set()
+    for element in list(root.iter(*CONTENT_TAGS)) + [_main_container(root)]:
+        protected.add(element)
+        protected.update(element.iterancestors())
+    boilerplate = []
+    for element in root.iter():
+        if element in protected or not isinstance(element.tag, str):
+            continue
+        tokens = f"{element.get('class', '')} {element.get('id', '')} {element.get('role', '')}".split()
+        if any(BOILERPLATE_ATTR.fullmatch(token) for token in tokens):
+            boilerplate.append(element)
+    for element in boilerplate:
+        if element.getparent() is not None:
+            element.drop_tree()
+
+
+def _link_density(element, text_length):
+    link_chars = sum(len(a.text_content()) for a in element.iter("a"))
+    return min(link_chars / text_length, 1.0) if text_length else 1.0
+
+
+#Readability-style: credit each text block's length (minus its link share) to its
+#parent and grandparent, and keep the best-scoring container
+def _main_container(root):
+    scores = {}
+    for block in root.iter(*BLOCK_TAGS):
+        text = _clean(block.text_content())
+        if len(text) < MIN_BLOCK_CHARS:
+            continue
+        score = len(text) * (1 - _link_density(block, len(text)))
+        parent = block.getparent()
+        if parent is not None:
+            scores[parent] = scores.get(parent, 0) + score
+            grandparent = parent.getparent()
+            if grandparent is not None:
+                scores[grandparent] = scores.get(grandparent, 0) + score / 2
+    if not scores:
+        return root
+    best = max(scores, key=scores.get)
+    #Content split across sibling containers (e.g. a spec table next to a feature list) shares a parent
+    parent = best.getparent()
+    if parent is None:
+        return best
+    threshold = scores[best] * SIBLING_SCORE_RATIO
+    if scores.get(parent, 0) > scores[best] * 1.2 or any(
+            sibling is not best and scores.get(sibling, 0) >= threshold for sibling in parent):
+        return parent
+    return best
+
+
+def _block_lines(container):
+    lines = []
+    for block in container.iter(*BLOCK_TAGS):
+        if any(child.tag in BLOCK_TAGS for child in block.iterdescendants()):
+            #Nested blocks are emitted on their own; keep only this block's leading text
+            text = _clean(block.text or "")
+        else:
+            text = _clean(block.text_content())
+        if text:
+            lines.append(text)
+    return lines
+
+
+def _extract_tree(root, url):
+    links = root.xpath("//a/@href") if url else []
+    _strip_boilerplate(root)
+    text = "\n".join(_block_lines(_main_container(root)))
+    return text, links
+
+
+def _absolute_links(links, url):
+    absolute = []
+    for href in links:
+        link = urldefrag(urljoin(url, href))[0]
+        if urlparse(link).scheme in ("http", "https"):
+            absolute.append(link)
+    return absolute
+
+
+#Main-content text and absolute outgoing links of a page
+def extract(html, url="", backend=None):
+    backend = backend or HTML_EXTRACTOR
+    if backend == "bs4":
+        text, links = _extract_bs4(html, url)
+    else:
+        if not html or not html.strip():
+            return "", []
+        try:
+            root = lxml_html.document_fromstring(html)
+        except (etree.ParserError, etree.XMLSyntaxError):
+            #Nothing but comments or whitespace
+            return "", []
+        text, links = _extract_tree(root, url)
+    return text, _absolute_links(links, url) if url else []
+
+
+def extract_text(html, url="", backend=None):
+    return extract(html, url, backend)[0]
+
+
+#Incremental parser: feed() response chunks as they arrive, close() for (text, links)
+class StreamingExtractor:
+    def __init__(self, url=""):
+        self.url = url
+        self._parser = lxml_html.HTMLParser()
+
+    def feed(self, chunk):
+        self._parser.feed(chunk)
+
+    def close(self):
+        try:
+            root = self._parser.close()
+        except etree.XMLSyntaxError:
+            #Empty body
+            return "", []
+        if root is None:
+            return "", []
+        text, links = _extract_tree(root, self.url)
+        return text, _absolute_links(links, self.url) if self.url else []
@@ -0,0 +1,36 @@
+import os
+import re
+
+#Constant in 1 / (RRF_K + rank); 60 is the value from the original RRF paper and rarely needs tuning
+RRF_K = int(os.getenv("RRF_K", 60))
+#Each retriever returns this many candidates per requested chunk before fusion
+CANDIDATE_MULTIPLIER = int(os.getenv("HYBRID_CANDIDATE_MULTIPLIER", 5))
+MIN_CANDIDATES = 20
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", 2))
+#Relative trust in each ranking; lower KEYWORD_WEIGHT if paraphrased questions suffer
+DENSE_WEIGHT = float(os.getenv("HYBRID_DENSE_WEIGHT", 1.0))
+KEYWORD_WEIGHT = float(os.getenv("HYBRID_KEYWORD_WEIGHT", 1.0))
+
+TERM = re.compile(r"\w+")
+
+
+#FTS5 MATCH expression for free text: every term quoted (so codes like "E-1234" or "AND"
+#are never read as query syntax) and OR-ed, leaving BM25 to rank documents matching more terms
+def keyword_query(text):
+    terms = dict.fromkeys(term.lower() for term in TERM.findall(text))
+    return " OR ".join(f'"{term}"' for term in terms)
+
+
+def candidate_count(k):
+    return max(k * CANDIDATE_MULTIPLIER, MIN_CANDIDATES)
+
+
+#Fuse ranked id lists (best first) by reciprocal rank; returns the top k (score, id) pairs
+def reciprocal_rank_fusion(rankings, k, weights=None, rrf_k=RRF_K):
+    weights = weights or [1.0] * len(rankings)
+    scores = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + weight / (rrf_k + rank)
+    fused = sorted(scores.items(), key=lambda pair: pair[1], reverse=True)[:k]
+    return [(score, item) for item, score in fused]
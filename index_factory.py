@@ -0,0 +1,182 @@
+import math
+import os
+import faiss
+import numpy as np
+
+#Index type for new stores: flat, ivf_flat, ivf_pq, hnsw, opq, or auto (flat that promotes as it grows)
+INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "auto")
+PROMOTE_TO_IVF = int(os.getenv("FAISS_PROMOTE_TO_IVF", 50_000))
+PROMOTE_TO_HNSW = int(os.getenv("FAISS_PROMOTE_TO_HNSW", 2_000_000))
+RETRAIN_GROWTH = 2  # Retrain IVF centroids once the ideal nlist is this many times the trained one
+NPROBE = int(os.getenv("FAISS_NPROBE", 16))
+EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", 64))
+HNSW_M = 32
+PQ_M = 48  # 384 dims -> 8 dims per sub-quantizer
+PQ_TRAIN_POINTS = 39 * 256  # faiss wants ~39 points per PQ centroid
+MAX_TRAIN_POINTS = 256 * 1024
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw", "opq")
+TRAINED_TYPES = ("ivf_flat", "ivf_pq", "opq")
+
+#How each vector is encoded inside flat, IVF and HNSW indexes: float32 (exact, 4 bytes/dim),
+#fp16 (2 bytes/dim), sq8 (8-bit scalar quantization, 1 byte/dim) or pq (PQ_M bytes in total).
+#ivf_pq and opq indexes are always pq.
+VECTOR_STORAGE = os.getenv("FAISS_STORAGE", "float32")
+STORAGE_TYPES = ("float32", "fp16", "sq8", "pq")
+STORAGE_CODECS = {"float32": "Flat", "fp16": "SQfp16", "sq8": "SQ8", "pq": f"PQ{PQ_M}"}
+#Vectors needed to train each codec; smaller stores keep float32 codes until they get there
+STORAGE_TRAIN_POINTS = {"float32": 0, "fp16": 0, "sq8": 1000, "pq": PQ_TRAIN_POINTS}
+#Compressed stores fetch RERANK x k candidates and re-rank them by exact distance (0 = off)
+RERANK = int(os.getenv("FAISS_RERANK", 4))
+
+
+#Rule of thumb: ~4*sqrt(n) inverted lists
+def choose_nlist(ntotal):
+    return max(1, min(65536, int(4 * math.sqrt(max(ntotal, 1)))))
+
+
+#ivf_flat is an IVF index over the chosen storage codec (IVF...,Flat for float32)
+def index_spec(kind, ntotal, storage="float32"):
+    nlist = choose_nlist(ntotal)
+    codec = STORAGE_CODECS[storage]
+    return {
+        "flat": codec,
+        "ivf_flat": f"IVF{nlist},{codec}",
+        "ivf_pq": f"IVF{nlist},PQ{PQ_M}",
+        "hnsw": f"HNSW{HNSW_M}" if storage == "float32" else f"HNSW{HNSW_M}_{codec}",
+        "opq": f"OPQ{PQ_M},IVF{nlist},PQ{PQ_M}",
+    }[kind]
+
+
+def min_train_points(kind, ntotal):
+    if kind not in TRAINED_TYPES:
+        return 0
+    points = 39 * choose_nlist(ntotal)
+    if kind != "ivf_flat":
+        points = max(points, PQ_TRAIN_POINTS)
+    return points
+
+
+#Which index type a store of ntotal vectors should use
+def target_kind(index_type, ntotal, storage="float32"):
+    if index_type == "auto":
+        if ntotal >= PROMOTE_TO_HNSW:
+            kind = "hnsw"
+        elif ntotal >= PROMOTE_TO_IVF:
+            kind = "ivf_flat"
+        else:
+            kind = "flat"
+    elif index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown FAISS index type: {index_type}")
+    #Trained indexes start flat until there is enough data to train them
+    elif ntotal < min_train_points(index_type, ntotal):
+        kind = "flat"
+    else:
+        kind = index_type
+    #IVF over PQ codes is exactly the ivf_pq index
+    if kind == "ivf_flat" and target_storage(storage, kind, ntotal) == "pq":
+        return "ivf_pq"
+    return kind
+
+
+#Which codec a store of ntotal vectors should use
+def target_storage(storage, kind, ntotal):
+    if kind in ("ivf_pq", "opq"):
+        return "pq"
+    if storage not in STORAGE_TYPES:
+        raise ValueError(f"Unknown FAISS vector storage: {storage}")
+    if ntotal < STORAGE_TRAIN_POINTS[storage]:
+        return "float32"
+    return storage
+
+
+#Promote to the target kind or codec, or retrain IVF once the corpus has outgrown its centroids
+def needs_rebuild(index_type, index, storage="float32"):
+    kind = index_kind(index)
+    target = target_kind(index_type, index.ntotal, storage)
+    if target != kind or target_storage(storage, target, index.ntotal) != index_storage(index):
+        return True
+    if kind in TRAINED_TYPES:
+        return choose_nlist(index.ntotal) >= RETRAIN_GROWTH * faiss.extract_index_ivf(index).nlist
+    return False
+
+
+def set_search_params(index, kind):
+    params = faiss.ParameterSpace()
+    if kind in TRAINED_TYPES:
+        params.set_index_parameter(index, "nprobe", NPROBE)
+    elif kind == "hnsw":
+        params.set_index_parameter(index, "efSearch", EF_SEARCH)
+
+
+#Build an id-mapped index of the given kind and codec, training it on (a sample of) vectors.
+#Plain IndexIDMap: IDMap2's reverse id map costs more RAM per vector than a PQ code.
+def build_index(kind, dim, vectors=None, ids=None, add_batch=4096, storage="float32"):
+    ntotal = 0 if vectors is None else len(vectors)
+    index = faiss.IndexIDMap(faiss.index_factory(dim, index_spec(kind, ntotal, storage), faiss.METRIC_L2))
+    if not index.is_trained:
+        sample = vectors
+        if ntotal > MAX_TRAIN_POINTS:
+            sample = vectors[np.random.default_rng(0).choice(ntotal, MAX_TRAIN_POINTS, replace=False)]
+        index.train(sample)
+    for start in range(0, ntotal, add_batch):
+        index.add_with_ids(vectors[start:start + add_batch], ids[start:start + add_batch])
+    set_search_params(index, kind)
+    return index
+
+
+#All (vectors, ids) held by an id-mapped index, for rebuilding it as another kind
+def export_vectors(index):
+    ids = faiss.vector_to_array(index.id_map).astype(np.int64)
+    vectors = index.index.reconstruct_n(0, index.ntotal) if index.ntotal else np.empty((0, index.d), np.float32)
+    return vectors, ids
+
+
+def index_kind(index):
+    inner = faiss.downcast_index(index.index if isinstance(index, faiss.IndexIDMap) else index)
+    if isinstance(inner, faiss.IndexPreTransform):
+        return "opq"
+    if isinstance(inner, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(inner, faiss.IndexIVF):
+        return "ivf_flat"
+    if isinstance(inner, faiss.IndexHNSW):
+        return "hnsw"
+    return "flat"
+
+
+def index_storage(index):
+    inner = faiss.downcast_index(index.index if isinstance(index, faiss.IndexIDMap) else index)
+    if isinstance(inner, faiss.IndexHNSW):
+        inner = faiss.downcast_index(inner.storage)
+    if isinstance(inner, (faiss.IndexPreTransform, faiss.IndexPQ, faiss.IndexIVFPQ)):
+        return "pq"
+    if isinstance(inner, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return "fp16" if inner.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+    return "float32"
+
+
+#Approximate bytes one stored vector costs: its code, its 64-bit id and (HNSW) its graph links
+def bytes_per_vector(kind, dim, storage="float32"):
+    if kind in ("ivf_pq", "opq") or storage == "pq":
+        code = PQ_M
+    else:
+        code = dim * {"float32": 4, "fp16": 2, "sq8": 1}[storage]
+    if kind == "hnsw":
+        code += HNSW_M * 2 * 4
+    return code + 8
+
+
+#Bytes an index needs on top of its codes: IVF centroids, PQ codebooks (and IVF-PQ's
+#precomputed per-list distance tables), OPQ rotation, SQ ranges
+def index_overhead_bytes(kind, dim, storage, nlist=0):
+    overhead = nlist * dim * 4 if kind in TRAINED_TYPES else 0
+    if kind in ("ivf_pq", "opq") or storage == "pq":
+        overhead += 256 * dim * 4
+    if kind in ("ivf_pq", "opq"):
+        overhead += nlist * PQ_M * 256 * 4
+    elif storage == "sq8":
+        overhead += 2 * dim * 4
+    if kind == "opq":
+        overhead += dim * dim * 4
+    return overhead
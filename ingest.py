@@ -0,0 +1,212 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+import pipelines
+from html_extract import extract_text
+from pdf_pipeline import iter_pdf_pages, split_pages
+from shared_resources import DEFAULT_WORKSPACE, get_embedding_cache, get_page_cache, get_vector_store
+from tracing import format_trace, trace
+
+#Headless bulk ingestion into the stores the apps search, for loading large collections
+#overnight instead of one upload at a time:
+#  python ingest.py --pdfs DIR --urls urls.txt --workspace shared
+#PDFs go to the document reader's store and URLs to the web scraper's, in the given workspace
+#(type its name in an app's sidebar to search it). Documents are extracted and chunked in
+#parallel, then deduplicated, embedded and written in batches of about --batch-chunks chunks,
+#one index save per batch. Every outcome is appended to ingest_checkpoint.jsonl next to the
+#index, so an interrupted run picks up where it stopped when started again.
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", os.cpu_count() or 1))
+INGEST_URL_WORKERS = int(os.getenv("INGEST_URL_WORKERS", 16))
+INGEST_BATCH_CHUNKS = int(os.getenv("INGEST_BATCH_CHUNKS", 20000))
+CHECKPOINT_FILE = "ingest_checkpoint.jsonl"
+
+
+#Outcome of every source handled so far ("stored", "empty", "duplicate" or "failed"), one JSON
+#line each.
+#Sources recorded here are skipped on the next run; failed ones only without retry_failed.
+class Checkpoint:
+    def __init__(self, path, retry_failed=False):
+        self.path = path
+        self.status = {}
+        cut_short = False
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    #The last line of a run that was killed mid-write is incomplete
+                    cut_short = not line.endswith("\n")
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.status[entry["source"]] = entry["status"]
+        if retry_failed:
+            self.status = {source: status for source, status in self.status.items() if status != "failed"}
+        #Stores only create their directory on the first write
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        if cut_short:
+            self._file.write("\n")
+
+    def __contains__(self, source):
+        return source in self.status
+
+    def record(self, entries):
+        for entry in entries:
+            self.status[entry["source"]] = entry["status"]
+            self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+#(source, path) for every PDF under root; sources are the path relative to root plus a hash of the
+#file, so an edited PDF is ingested again instead of being skipped as done
+def find_pdfs(root):
+    found = []
+    for directory, _, files in os.walk(root):
+        for name in files:
+            if name.lower().endswith(".pdf"):
+                path = os.path.join(directory, name)
+                with open(path, "rb") as f:
+                    source = pipelines.document_source(os.path.relpath(path, root).replace(os.sep, "/"),
+                                                       f.read())
+                found.append((source, path))
+    return sorted(found)
+
+
+#(url, url) for every line of a manifest, skipping blank lines and # comments
+def read_manifest(path):
+    with open(path, encoding="utf-8") as f:
+        urls = [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+    return [(url, url) for url in dict.fromkeys(urls)]
+
+
+#Chunks of one PDF. Runs in a worker process, so the PDF's pages are extracted serially there:
+#the parallelism is across documents.
+def load_pdf(path):
+    pages = (page.text for page in iter_pdf_pages(path, workers=1))
+    return list(split_pages(pages, pipelines.make_splitter()))
+
+
+#Chunks of one web page, fetched through the page cache (a rerun revalidates instead of downloading)
+def load_url(url):
+    page = get_page_cache().get(url, extract_text)
+    if page.text is None:
+        raise IOError(f"HTTP {page.http_status}")
+    return pipelines.split_text(pipelines.make_splitter(), page.text)
+
+
+#Load items (source, argument) with load(argument) on pool, keeping a bounded number in flight,
+#and store the results in batches. Sources already stored or in the checkpoint are skipped.
+#Returns counts per outcome.
+def ingest(items, load, pool, vector_store, embedder, checkpoint, batch_chunks=INGEST_BATCH_CHUNKS,
+           window=INGEST_WORKERS * 4, log=print):
+    todo = [(source, argument) for source, argument in items
+            if source not in checkpoint and not vector_store.has_document(source)]
+    counts = {"skipped": len(items) - len(todo), "stored": 0, "empty": 0, "failed": 0, "chunks": 0, "duplicates": 0}
+    log(f"{len(items)} sources, {counts['skipped']} already done, {len(todo)} to ingest")
+    start = time.perf_counter()
+    batch = []
+
+    def flush():
+        if not batch:
+            return
+        with trace("ingest_batch", documents=len(batch)) as t:
+            stored, dedup_stats = pipelines.store_documents_in_faiss(vector_store, embedder, batch)
+        stored = set(stored)
+        #Documents left without chunks once duplicates were dropped are not stored
+        checkpoint.record([{"source": source, "status": "stored", "chunks": len(chunks)} if source in stored
+                           else {"source": source, "status": "duplicate"} for source, chunks in batch])
+        counts["stored"] += len(stored)
+        counts["empty"] += len(batch) - len(stored)
+        counts["chunks"] += sum(len(chunks) for _, chunks in batch) - dedup_stats["removed"]
+        counts["duplicates"] += dedup_stats["removed"]
+        batch.clear()
+        done = counts["stored"] + counts["empty"] + counts["failed"]
+        elapsed = time.perf_counter() - start
+        eta = (len(todo) - done) * elapsed / done if done else 0
+        log(f"{done}/{len(todo)} documents, {counts['chunks']} chunks, {done / elapsed:.1f} docs/s, "
+            f"{counts['failed']} failed, ETA {eta / 60:.0f} min")
+        log(format_trace(t))
+
+    pending = {}
+    queue = iter(todo)
+    try:
+        while True:
+            #Keep the workers busy while the main thread embeds and writes
+            for source, argument in queue:
+                pending[pool.submit(load, argument)] = source
+                if len(pending) >= window:
+                    break
+            if not pending:
+                break
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                source = pending.pop(future)
+                try:
+                    chunks = future.result()
+                except Exception as e:
+                    counts["failed"] += 1
+                    checkpoint.record([{"source": source, "status": "failed", "error": f"{type(e).__name__}: {e}"}])
+                    continue
+                if not any(chunk.strip() for chunk in chunks):
+                    #Scanned PDFs without a text layer, empty pages
+                    counts["empty"] += 1
+                    checkpoint.record([{"source": source, "status": "empty"}])
+                    continue
+                batch.append((source, chunks))
+                if sum(len(c) for _, c in batch) >= batch_chunks:
+                    flush()
+    except KeyboardInterrupt:
+        log("Interrupted: storing the documents already loaded, rerun to continue")
+        for future in pending:
+            future.cancel()
+    flush()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-load PDFs and web pages into the apps' FAISS stores.")
+    parser.add_argument("--pdfs", help="directory searched recursively for *.pdf (document reader store)")
+    parser.add_argument("--urls", help="file with one URL per line (web scraper store)")
+    parser.add_argument("--workspace", default=DEFAULT_WORKSPACE,
+                        help=f"workspace to store into (default: {DEFAULT_WORKSPACE})")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS, help="PDF extraction processes")
+    parser.add_argument("--url-workers", type=int, default=INGEST_URL_WORKERS, help="concurrent downloads")
+    parser.add_argument("--batch-chunks", type=int, default=INGEST_BATCH_CHUNKS, help="chunks per index write")
+    parser.add_argument("--retry-failed", action="store_true", help="try sources that failed last time again")
+    args = parser.parse_args()
+    if not args.pdfs and not args.urls:
+        parser.error("give --pdfs and/or --urls")
+
+    embedder = get_embedding_cache()
+    jobs = []
+    if args.pdfs:
+        #Spawned so the workers never inherit the embedding model's threads
+        pool = ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context("spawn"))
+        jobs.append(("document_reader", find_pdfs(args.pdfs), load_pdf, pool, args.workers))
+    if args.urls:
+        jobs.append(("web_scraper", read_manifest(args.urls), load_url, ThreadPoolExecutor(args.url_workers),
+                     args.url_workers))
+    failed = 0
+    for name, items, load, pool, workers in jobs:
+        vector_store = get_vector_store(name, args.workspace)
+        checkpoint = Checkpoint(os.path.join(vector_store.path, CHECKPOINT_FILE), args.retry_failed)
+        print(f"Ingesting into {vector_store.path}")
+        with pool:
+            counts = ingest(items, load, pool, vector_store, embedder, checkpoint, args.batch_chunks, workers * 4)
+        checkpoint.close()
+        failed += counts["failed"]
+        print(f"Done: {counts['stored']} stored ({counts['chunks']} chunks, {counts['duplicates']} duplicate chunks "
+              f"skipped), {counts['empty']} without new text, {counts['failed']} failed, {counts['skipped']} already done")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+import json
+import logging
+import time
+from tracing import record_span
+
+logger = logging.getLogger(__name__)
+
+#Timing of the most recent streamed response (shown in the UIs)
+last_stats = None
+
+
+#Stream a completion from OllamaLLM.stream, recording time-to-first-token and tokens/sec
+#(into last_stats, and into the stats dict if one is passed)
+def stream_llm(llm, prompt, stats=None):
+    global last_stats
+    start = time.perf_counter()
+    first_token_at = None
+    tokens = 0
+    for token in llm.stream(prompt):
+        if first_token_at is None:
+            first_token_at = time.perf_counter()
+        #Ollama streams roughly one token per chunk
+        tokens += 1
+        yield token
+    end = time.perf_counter()
+    first_token_at = first_token_at or end
+    generation_s = end - first_token_at
+    last_stats = {
+        "model": getattr(llm, "model", type(llm).__name__),
+        "prompt_chars": len(prompt),
+        "ttft_s": round(first_token_at - start, 3),
+        "total_s": round(end - start, 3),
+        "tokens": tokens,
+        "tokens_per_s": round(tokens / generation_s, 1) if generation_s > 0 else None,
+    }
+    if stats is not None:
+        stats.update(last_stats)
+    logger.info("llm_stream %s", json.dumps(last_stats))
+    #Spans the whole generation, including time the caller spends rendering each token
+    record_span("llm.stream", start, end, model=last_stats["model"], prompt_chars=len(prompt),
+                ttft_s=last_stats["ttft_s"], tokens=tokens)
+
+
+def format_stats(stats):
+    if not stats:
+        return ""
+    if stats.get("cache") == "hit":
+        return "⚡ answered from the response cache"
+    rate = f"{stats['tokens_per_s']} tok/s" if stats["tokens_per_s"] else "n/a"
+    return f"⏱️ first token {stats['ttft_s']:.2f}s · {stats['tokens']} tokens · {rate}"
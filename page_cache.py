@@ -0,0 +1,151 @@
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import namedtuple
+import requests
+from shared_resources import PERSIST_DIR
+
+PAGE_CACHE_MAX_BYTES = int(os.getenv("PAGE_CACHE_MAX_BYTES", 128 * 1024 * 1024))
+PAGE_CACHE_MAX_AGE = float(os.getenv("PAGE_CACHE_MAX_AGE", 3600))  # Seconds before revalidating
+FETCH_TIMEOUT = 15
+
+
+def parser_name(parse):
+    return f"{parse.__module__}.{parse.__qualname__}"
+
+
+#text is the parsed page; status is "fresh", "revalidated" (304), "fetched" or "error"
+CachedPage = namedtuple("CachedPage", ["text", "status", "http_status"])
+
+
+#On-disk HTTP page cache: zlib-compressed bodies plus their parsed text, revalidated with
+#ETag / If-Modified-Since so unchanged pages come back as 304 and are never re-parsed
+class PageCache:
+    def __init__(self, path=None, max_bytes=PAGE_CACHE_MAX_BYTES, max_age=PAGE_CACHE_MAX_AGE,
+                 headers=None, timeout=FETCH_TIMEOUT):
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(headers or {"User-Agent": "Mozilla/5.0"})
+        self.fresh_hits = 0
+        self.revalidated = 0
+        self.fetched = 0
+        self.bytes_saved = 0
+        self.seconds_saved = 0.0
+        path = path or os.path.join(PERSIST_DIR, "page_cache.sqlite")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                parser TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                body BLOB NOT NULL,
+                body_size INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                cost_s REAL NOT NULL,
+                fetched_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS pages_last_used ON pages (last_used);
+            """
+        )
+        self._db.commit()
+
+    def stats(self):
+        return {"fresh_hits": self.fresh_hits, "revalidated": self.revalidated, "fetched": self.fetched,
+                "bytes_saved": self.bytes_saved, "seconds_saved": round(self.seconds_saved, 3)}
+
+    def _lookup(self, url):
+        with self._lock:
+            return self._db.execute(
+                "SELECT parser, etag, last_modified, body_size, text, cost_s, fetched_at FROM pages WHERE url = ?",
+                (url,)
+            ).fetchone()
+
+    #Cached text, re-parsed from the stored body if it was produced by a different parser
+    def _cached_text(self, url, parser, text, parse):
+        if parser == parser_name(parse):
+            return text
+        with self._lock:
+            body = self._db.execute("SELECT body FROM pages WHERE url = ?", (url,)).fetchone()[0]
+        text = parse(zlib.decompress(body), url)
+        with self._lock:
+            self._db.execute("UPDATE pages SET parser = ?, text = ? WHERE url = ?", (parser_name(parse), text, url))
+            self._db.commit()
+        return text
+
+    def _hit(self, url, body_size, cost_s, elapsed, refresh):
+        now = time.time()
+        with self._lock:
+            self.bytes_saved += body_size
+            self.seconds_saved += max(cost_s - elapsed, 0.0)
+            if refresh:
+                self._db.execute("UPDATE pages SET fetched_at = ?, last_used = ? WHERE url = ?", (now, now, url))
+            else:
+                self._db.execute("UPDATE pages SET last_used = ? WHERE url = ?", (now, url))
+            self._db.commit()
+
+    def _store(self, url, response, parse, text, cost_s):
+        now = time.time()
+        body = zlib.compress(response.content)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, parser_name(parse), response.headers.get("ETag"), response.headers.get("Last-Modified"), body,
+                 len(response.content), text, cost_s, now, now),
+            )
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(LENGTH(body)), 0) FROM pages").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        freed = 0
+        stale = []
+        for url, size in self._db.execute("SELECT url, LENGTH(body) FROM pages ORDER BY last_used"):
+            stale.append((url,))
+            freed += size
+            if freed >= total - self.max_bytes:
+                break
+        self._db.executemany("DELETE FROM pages WHERE url = ?", stale)
+
+    #Fetch url and return CachedPage(parse(body, url), ...), skipping the download and the
+    #parse when the cached copy is fresh or the server answers 304 Not Modified
+    def get(self, url, parse):
+        start = time.perf_counter()
+        entry = self._lookup(url)
+        if entry:
+            parser, etag, last_modified, body_size, text, cost_s, fetched_at = entry
+            if time.time() - fetched_at < self.max_age:
+                self.fresh_hits += 1
+                text = self._cached_text(url, parser, text, parse)
+                self._hit(url, body_size, cost_s, time.perf_counter() - start, refresh=False)
+                return CachedPage(text, "fresh", 200)
+            headers = {}
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+            if response.status_code == 304:
+                self.revalidated += 1
+                text = self._cached_text(url, parser, text, parse)
+                self._hit(url, body_size, cost_s, time.perf_counter() - start, refresh=True)
+                return CachedPage(text, "revalidated", 304)
+        else:
+            response = self.session.get(url, timeout=self.timeout)
+        if response.status_code != 200:
+            return CachedPage(None, "error", response.status_code)
+        text = parse(response.content, url)
+        self.fetched += 1
+        self._store(url, response, parse, text, time.perf_counter() - start)
+        return CachedPage(text, "fetched", 200)
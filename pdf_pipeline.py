@@ -0,0 +1,86 @@
+import io
+import multiprocessing
+import os
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from pypdf import PdfReader
+from tracing import span
+
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", min(4, os.cpu_count() or 1)))
+PAGES_PER_TASK = 8
+SERIAL_PAGE_LIMIT = 16  # Smaller PDFs are not worth starting a process pool for
+
+PdfPage = namedtuple("PdfPage", ["number", "text", "seconds"])
+
+#Per-process reader, opened once by the pool initializer
+_worker_reader = None
+
+
+def _open_reader(source):
+    if isinstance(source, (bytes, bytearray)):
+        return PdfReader(io.BytesIO(source))
+    return PdfReader(source)
+
+
+def _init_worker(source):
+    global _worker_reader
+    _worker_reader = _open_reader(source)
+
+
+def _extract_pages(reader, numbers):
+    pages = []
+    for number in numbers:
+        start = time.perf_counter()
+        text = reader.pages[number].extract_text() or ""
+        pages.append(PdfPage(number + 1, text, time.perf_counter() - start))
+    return pages
+
+
+def _extract_in_worker(numbers):
+    return _extract_pages(_worker_reader, numbers)
+
+
+#Yield PdfPage(number, text, seconds) in page order, extracting across a process pool
+def iter_pdf_pages(source, workers=PDF_WORKERS):
+    #Uploaded files are read once and shipped to each worker; paths are opened per worker
+    if hasattr(source, "read"):
+        source.seek(0)
+        source = source.read()
+    reader = _open_reader(source)
+    page_count = len(reader.pages)
+    if workers <= 1 or page_count <= SERIAL_PAGE_LIMIT:
+        for number in range(page_count):
+            yield from _extract_pages(reader, [number])
+        return
+    del reader
+    tasks = (range(i, min(i + PAGES_PER_TASK, page_count)) for i in range(0, page_count, PAGES_PER_TASK))
+    #Spawned, not forked: the apps call this from a multi-threaded server process
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker, initargs=(source,)) as pool:
+        #Keep a bounded window of tasks in flight so memory stays flat on huge PDFs
+        pending = deque()
+        for numbers in tasks:
+            pending.append(pool.submit(_extract_in_worker, list(numbers)))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+#Split a stream of page texts into chunks without joining the whole document
+def split_pages(pages, splitter, flush_size=None):
+    flush_size = flush_size or splitter._chunk_size * 8
+    buffer = ""
+    for page in pages:
+        buffer += page + "\n"
+        if len(buffer) >= flush_size:
+            with span("split_text", chars=len(buffer)):
+                chunks = splitter.split_text(buffer)
+            #Carry the last chunk over so chunks still overlap across the flush boundary
+            yield from chunks[:-1]
+            buffer = chunks[-1] + "\n" if chunks else ""
+    if buffer.strip():
+        with span("split_text", chars=len(buffer)):
+            chunks = splitter.split_text(buffer)
+        yield from chunks
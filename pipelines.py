@@ -0,0 +1,224 @@
+import hashlib
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import numpy as np
+from chunk_dedup import drop_duplicates, duplicate_mask
+from html_extract import extract_text
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from hybrid_search import RETRIEVAL_K
+from llm_streaming import stream_llm
+from pdf_pipeline import iter_pdf_pages
+from response_cache import hash_text, stream_cached
+from tracing import span, traced_iter
+
+#The apps' pipeline steps without Streamlit: resources are passed in and progress messages go
+#to log (st.write in the apps), so the same code runs in scripts and benchmarks.
+SLOW_PAGE_SECONDS = 1.0  # Pages slower than this are reported while extracting
+WEB_PROMPT = "Using the following context, answer the question:\n\nContext:\n{context}\n\nQuestion: {query}"
+DOCUMENT_PROMPT = ("Using the following context from the document, answer the question:\n\n"
+                   "Context:\n{context}\n\nQuestion: {query}\nAnswer:")
+#Concurrent LLM generations in answer_batch; Ollama only runs OLLAMA_NUM_PARALLEL at once
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 4))
+QUERY_BATCH_SIZE = 256  # Questions embedded and searched together
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 100
+
+
+def _ignore(message):
+    pass
+
+
+#Yield page texts in order, extracted in parallel
+def extract_text_from_pdf(source, log=_ignore):
+    for page in traced_iter("extract_text_from_pdf", iter_pdf_pages(source)):
+        if page.seconds > SLOW_PAGE_SECONDS:
+            log(f"⏱️ Page {page.number} took {page.seconds:.1f}s to extract")
+        yield page.text
+
+
+#Chunking for everything that is stored or summarized, so the apps and ingest.py split alike.
+#pypdf and the HTML extractors separate lines with single newlines and rarely emit blank lines,
+#so falling back from paragraphs to lines (then words) matters: splitting on "\n\n" alone left
+#most documents as one oversized chunk.
+def make_splitter(chunk_overlap=CHUNK_OVERLAP):
+    return RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=chunk_overlap)
+
+
+#splitter.split_text, timed as its own stage
+def split_text(splitter, text):
+    with span("split_text", chars=len(text)):
+        return splitter.split_text(text)
+
+
+#Fetch a page through the page cache (unchanged pages are revalidated, not re-downloaded).
+#Returns (text, None), or (None, error message): page text can say "error" or "Failed" too.
+def scrape_web_page(url, page_cache, log=_ignore, max_chars=None):
+    try:
+        log(f"Scraping content from: {url}")
+        with span("scrape_web_page", url=url) as attrs:
+            page = page_cache.get(url, extract_text)
+            attrs["status"] = page.status
+
+        if page.text is None:
+            return None, f"Failed to fetch {url}"
+        if page.status != "fetched":
+            log(f"♻️ Page unchanged, served from cache ({page.status}); {page_cache.bytes_saved / 1024:.0f} KB and {page_cache.seconds_saved:.1f}s saved so far")
+
+        return (page.text[:max_chars] if max_chars else page.text), None
+    except Exception as e:
+        return None, f"An error occurred: {str(e)}"
+
+
+#Store key of an uploaded or ingested file: its name plus a hash of its bytes, so a different file
+#with the same name (or an edited re-upload) is stored as a new document instead of being skipped
+def document_source(name, data):
+    return f"{name}#{hashlib.sha256(data).hexdigest()[:16]}"
+
+
+#Drop duplicate chunks, embed the rest and store them under source. chunks may be a lazy
+#iterable: nothing is extracted or split for a source that is already stored.
+def store_in_faiss(vector_store, embedder, source, chunks, log=_ignore, kind="Document"):
+    if vector_store.has_document(source):
+        return f"{kind} already stored."
+    log("Storing data in FAISS vector store...")
+
+    #Drop repeated headers, footers and boilerplate before paying for their embeddings
+    chunks = list(chunks)
+    with span("dedup", chunks=len(chunks)):
+        texts, dedup_stats = drop_duplicates(vector_store, chunks)
+    if dedup_stats["removed"]:
+        log(f"🧹 Skipped {dedup_stats['removed']} duplicate chunks ({dedup_stats['embeddings_saved']} embeddings, {dedup_stats['index_bytes_saved'] / 1024:.0f} KB of index saved)")
+    if not texts:
+        #Not recorded as stored, so it is tried again next time (e.g. once the page has content)
+        return f"No text found; {kind.lower()} not stored."
+
+    vectors = embedder.embed_documents(texts)
+    if hasattr(embedder, "hit_rate"):
+        log(f"Embedding cache hit rate: {embedder.hit_rate:.0%} ({embedder.hits} hits, {embedder.misses} misses)")
+
+    vector_store.add_document(source, texts, vectors)
+    return "Data stored successfully."
+
+
+#Store many (source, chunks) documents with one duplicate check, one embedding call and one
+#index write (every write saves the whole index, so per-document writes get slower as it grows).
+#Sources already stored are skipped, as are documents left without chunks (they are not stored,
+#so they can be retried). Returns the sources stored and the duplicate-chunk stats.
+def store_documents_in_faiss(vector_store, embedder, documents):
+    documents = [(source, list(chunks)) for source, chunks in documents if not vector_store.has_document(source)]
+    #Repeated headers, footers and site navigation: keep only the first copy across the batch
+    all_texts = [t for _, texts in documents for t in texts]
+    with span("dedup", chunks=len(all_texts)):
+        duplicate = iter(duplicate_mask(all_texts))
+        documents = [(source, [t for t in texts if not next(duplicate)]) for source, texts in documents]
+    removed = len(all_texts) - sum(len(texts) for _, texts in documents)
+    documents = [(source, texts) for source, texts in documents if texts]
+    dedup_stats = {"removed": removed, "index_bytes_saved": removed * vector_store.bytes_per_vector()}
+    if not documents:
+        return [], dedup_stats
+    vectors = embedder.embed_documents([t for _, texts in documents for t in texts])
+    batch = []
+    start = 0
+    for source, texts in documents:
+        batch.append((source, texts, vectors[start:start + len(texts)]))
+        start += len(texts)
+    vector_store.add_documents(batch)
+    return [source for source, _ in documents], dedup_stats
+
+
+#Context from the retrieved chunk ids and the prompt built from it
+def build_prompt(vector_store, ids, query, template=WEB_PROMPT):
+    with span("build_prompt", k=len(ids)):
+        context = ""
+        for source, chunk in vector_store.get_chunks(ids):
+            context += chunk + "\n\n"
+        return context, template.format(context=context, query=query)
+
+
+#Hybrid (dense + BM25) retrieval of the top k chunks, then the answer streamed from the LLM,
+#or from the response cache when one is given and the question was answered before
+def retrieve_and_answer(query, vector_store, embedder, llm, response_cache=None, stats=None, k=RETRIEVAL_K,
+                        template=WEB_PROMPT, not_found="No relevant information found in the vector store."):
+    query_vector = np.array(embedder.embed_query(query)).astype(np.float32).reshape(1, -1)
+
+    #Exact terms such as part numbers or error codes are found even when the embedding misses them
+    D, I = vector_store.hybrid_search(query_vector, query, k=k)
+    context, prompt = build_prompt(vector_store, I, query, template)
+
+    if not context:
+        yield not_found
+        return
+
+    if response_cache is None:
+        yield from stream_llm(llm, prompt, stats)
+    else:
+        yield from stream_cached(response_cache, llm, prompt, query_vector, hash_text(context), stats)
+
+
+#Answer one retrieved question on a pool thread: the answer text plus its stats
+def _answer(number, query, query_vector, context, prompt, llm, response_cache, not_found):
+    stats = {}
+    start = time.perf_counter()
+    try:
+        if not context:
+            answer = not_found
+        elif response_cache is None:
+            answer = "".join(stream_llm(llm, prompt, stats))
+        else:
+            answer = "".join(stream_cached(response_cache, llm, prompt, query_vector, hash_text(context), stats))
+    except Exception as e:
+        #One failed generation should not end a run of thousands
+        answer = None
+        stats["error"] = f"{type(e).__name__}: {e}"
+    return {"index": number, "query": query, "answer": answer, "seconds": round(time.perf_counter() - start, 3),
+            **stats}
+
+
+#retrieve_and_answer for many questions: each group of batch_size questions is embedded in one
+#call and searched with one matrix index.search, and the LLM calls run on a pool of concurrency
+#threads while the next group is retrieved. Yields result dicts (index = position in queries)
+#as they finish, so in completion order rather than question order.
+def answer_batch(queries, vector_store, embedder, llm, response_cache=None, k=RETRIEVAL_K, template=WEB_PROMPT,
+                 not_found="No relevant information found in the vector store.", concurrency=BATCH_CONCURRENCY,
+                 batch_size=QUERY_BATCH_SIZE):
+    queries = list(queries)
+    with ThreadPoolExecutor(concurrency) as pool:
+        pending = set()
+        for start in range(0, len(queries), batch_size):
+            group = queries[start:start + batch_size]
+            #One model call per group; the embedding cache's embed_queries bypasses its document cache
+            embed = embedder.embed_queries if hasattr(embedder, "embed_queries") else embedder.embed_documents
+            query_vectors = np.asarray(embed(group), dtype=np.float32).reshape(len(group), -1)
+            _, ids = vector_store.hybrid_search_batch(query_vectors, group, k=k)
+            for offset, (query, query_vector, chunk_ids) in enumerate(zip(group, query_vectors, ids)):
+                context, prompt = build_prompt(vector_store, chunk_ids, query, template)
+                pending.add(pool.submit(_answer, start + offset, query, query_vector.reshape(1, -1), context, prompt,
+                                        llm, response_cache, not_found))
+            #Hand back finished answers, keeping about one group queued behind the workers
+            while len(pending) > batch_size:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+#One chat turn with bounded memory: yields response tokens, then records the turn (as far as
+#it got, if the caller stops early) in chat_history
+def run_chain(question, llm, prompt, memory, chat_history, stats=None):
+    #Retrieve recent turns plus a rolling summary of older ones, within a token budget
+    with span("build_context"):
+        chat_history_text = memory.build_context(question)
+    response = ""
+    try:
+        for token in stream_llm(llm, prompt.format(chat_history=chat_history_text, question=question), stats):
+            response += token
+            yield token
+    finally:
+        chat_history.add_user_message(question)
+        chat_history.add_ai_message(response)
+        #Summarize aged-out turns now, between turns, rather than ahead of the next answer
+        memory.after_turn()
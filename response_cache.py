@@ -0,0 +1,136 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import numpy as np
+from shared_resources import PERSIST_DIR
+from llm_streaming import stream_llm
+from tracing import span
+
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", 7 * 24 * 3600))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 10_000))
+SEMANTIC_THRESHOLD = float(os.getenv("RESPONSE_CACHE_SIMILARITY", 0.95))
+
+
+def normalize_prompt(prompt):
+    return re.sub(r"\s+", " ", prompt).strip().casefold()
+
+
+def hash_text(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+#Two-tier LLM response cache: exact (normalized prompt + model) and semantic
+#(question embedding within the same retrieved-context scope), persisted in SQLite
+class ResponseCache:
+    def __init__(self, model_name, path=None, ttl=RESPONSE_CACHE_TTL, max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+                 similarity_threshold=SEMANTIC_THRESHOLD):
+        self.model_name = model_name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        path = path or os.path.join(PERSIST_DIR, "response_cache.sqlite")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                scope TEXT NOT NULL,
+                vector BLOB,
+                response TEXT NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS responses_scope ON responses (model, scope);
+            CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+            """
+        )
+        self._db.commit()
+
+    def _key(self, prompt):
+        return hash_text(f"{self.model_name}\0{normalize_prompt(prompt)}")
+
+    @property
+    def hit_rate(self):
+        total = self.exact_hits + self.semantic_hits + self.misses
+        return (self.exact_hits + self.semantic_hits) / total if total else 0.0
+
+    def stats(self):
+        return {"exact_hits": self.exact_hits, "semantic_hits": self.semantic_hits,
+                "misses": self.misses, "hit_rate": round(self.hit_rate, 3)}
+
+    #Cached response for prompt, or None. query_vector enables the semantic tier within scope.
+    def get(self, prompt, query_vector=None, scope=""):
+        now = time.time()
+        oldest = now - self.ttl
+        with self._lock:
+            row = self._db.execute(
+                "SELECT key, response FROM responses WHERE key = ? AND created >= ?", (self._key(prompt), oldest)
+            ).fetchone()
+            if row:
+                self.exact_hits += 1
+            elif query_vector is not None:
+                query = np.asarray(query_vector, dtype=np.float32).ravel()
+                query = query / (np.linalg.norm(query) or 1.0)
+                best = None
+                for key, blob, response in self._db.execute(
+                        "SELECT key, vector, response FROM responses "
+                        "WHERE model = ? AND scope = ? AND vector IS NOT NULL AND created >= ?",
+                        (self.model_name, scope, oldest)):
+                    score = float(np.frombuffer(blob, dtype=np.float32) @ query)
+                    if score >= self.similarity_threshold and (best is None or score > best[0]):
+                        best = (score, key, response)
+                if best:
+                    row = best[1:]
+                    self.semantic_hits += 1
+            if not row:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, row[0]))
+            self._db.commit()
+            return row[1]
+
+    def put(self, prompt, response, query_vector=None, scope=""):
+        now = time.time()
+        vector = None
+        if query_vector is not None:
+            vector = np.asarray(query_vector, dtype=np.float32).ravel()
+            vector = (vector / (np.linalg.norm(vector) or 1.0)).tobytes()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self._key(prompt), self.model_name, scope, vector, response, now, now),
+            )
+            #Expire old entries, then trim least recently used past the cap
+            self._db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._db.commit()
+
+
+#Yield a cached response if there is one, otherwise stream from the LLM and cache the result
+def stream_cached(cache, llm, prompt, query_vector=None, scope="", stats=None):
+    with span("response_cache.get") as attrs:
+        cached = cache.get(prompt, query_vector, scope)
+        attrs["hit"] = cached is not None
+    if cached is not None:
+        if stats is not None:
+            stats["cache"] = "hit"
+        yield cached
+        return
+    response = ""
+    for token in stream_llm(llm, prompt, stats):
+        response += token
+        yield token
+    cache.put(prompt, response, query_vector, scope)
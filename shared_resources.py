@@ -0,0 +1,184 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+#Root of every persistent store (FAISS indexes, docstore and the SQLite caches)
+PERSIST_DIR = os.getenv("PERSIST_DIR", "data")
+LLM_MODEL = os.getenv("LLM_MODEL", "llama3.2:1b")
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2")
+#Workspace ingest.py / batch_query.py use; app sessions get their own workspace and open this
+#one only when the user enters its name
+DEFAULT_WORKSPACE = os.getenv("DEFAULT_WORKSPACE", "shared")
+#Vector stores (app, workspace) kept open; the least recently used one beyond this is dropped,
+#and its index and SQLite connections are released once no running session still holds it
+VECTOR_STORE_CACHE = int(os.getenv("VECTOR_STORE_CACHE", 16))
+
+logger = logging.getLogger(__name__)
+
+#Process-wide instances. Streamlit re-executes the app script on every rerun and in every
+#session, but imported modules live as long as the server process, so these are built once.
+_instances = {}
+_key_locks = {}
+_registry_lock = threading.Lock()
+_warmed_up = set()
+_vector_stores = OrderedDict()
+#Seconds each resource took to build, e.g. {"embedding_model": 4.2}
+load_seconds = {}
+
+
+#Return the instance for key, calling factory() the first time; concurrent sessions asking
+#for the same key wait for one build instead of each loading their own copy
+def shared(key, factory):
+    instance = _instances.get(key)
+    if instance is not None:
+        return instance
+    with _registry_lock:
+        lock = _key_locks.setdefault(key, threading.Lock())
+    with lock:
+        if key not in _instances:
+            start = time.perf_counter()
+            _instances[key] = factory()
+            load_seconds[key] = time.perf_counter() - start
+            logger.info("Loaded %s in %.2fs", key, load_seconds[key])
+        return _instances[key]
+
+
+def get_llm(model=LLM_MODEL):
+    def build():
+        from langchain_ollama import OllamaLLM
+        return OllamaLLM(model=model)
+    return shared(("llm", model), build)
+
+
+def get_embedding_model(model_name=EMBEDDING_MODEL_NAME):
+    def build():
+        #Pulls in torch and sentence-transformers; only paid by the first caller
+        from langchain_huggingface import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name=model_name)
+    return shared(("embedding_model", model_name), build)
+
+
+#Stand-in for the shared HuggingFace model that only loads it on the first embed call,
+#so pages that never embed anything render without waiting for torch
+class LazyEmbeddings:
+    def __init__(self, model_name=EMBEDDING_MODEL_NAME):
+        self.model_name = model_name
+
+    def embed_documents(self, texts):
+        return get_embedding_model(self.model_name).embed_documents(texts)
+
+    def embed_query(self, text):
+        return get_embedding_model(self.model_name).embed_query(text)
+
+
+#Cached, multi-process embedding front-end shared by every session (one worker pool per process)
+def get_embedding_cache(model_name=EMBEDDING_MODEL_NAME):
+    def build():
+        from embedding_cache import EmbeddingCache
+        from embedding_engine import EmbeddingEngine
+        engine = EmbeddingEngine(LazyEmbeddings(model_name), model_name=model_name)
+        return EmbeddingCache(engine, model_name=model_name)
+    return shared(("embedding_cache", model_name), build)
+
+
+#One store per (app, namespace); every session using a namespace shares its instance and lock.
+#Only the VECTOR_STORE_CACHE most recently used stay registered, so typing many workspace names
+#does not keep a FAISS index and its files open for each one until the server stops.
+def get_vector_store(name, namespace=None):
+    def build():
+        from faiss_store import FaissStore
+        return FaissStore(name, namespace=namespace)
+    key = ("vector_store", name, namespace)
+    store = shared(key, build)
+    with _registry_lock:
+        _vector_stores[key] = True
+        _vector_stores.move_to_end(key)
+        while len(_vector_stores) > VECTOR_STORE_CACHE:
+            evicted, _ = _vector_stores.popitem(last=False)
+            _instances.pop(evicted, None)
+            _key_locks.pop(evicted, None)
+            load_seconds.pop(evicted, None)
+    return store
+
+
+def get_response_cache(model=LLM_MODEL):
+    def build():
+        from response_cache import ResponseCache
+        return ResponseCache(model)
+    return shared(("response_cache", model), build)
+
+
+def get_page_cache():
+    def build():
+        from page_cache import PageCache
+        return PageCache()
+    return shared("page_cache", build)
+
+
+def get_summarizer(model=LLM_MODEL):
+    def build():
+        from summarizer import MapReduceSummarizer
+        return MapReduceSummarizer(get_llm(model))
+    return shared(("summarizer", model), build)
+
+
+#Serve the stage timings recorded by tracing.py at http://localhost:METRICS_PORT/metrics;
+#started once per process, and only when METRICS_PORT is set
+def serve_metrics():
+    def build():
+        from tracing import start_metrics_server
+        return start_metrics_server()
+    return shared("metrics_server", build)
+
+
+#Speech recognizer plus its VAD noise floor, calibrated once and kept across turns and reruns
+def get_speech_listener(backend=None):
+    def build():
+        from speech_input import SpeechListener, STT_BACKEND, make_backend
+        return SpeechListener(make_backend(backend or STT_BACKEND))
+    return shared(("speech_listener", backend), build)
+
+
+#Text-to-speech engine, started once per process on its own thread; replies are queued to it.
+#prerender phrases are rendered into its WAV cache when it is first built.
+def get_speech_worker(prerender=()):
+    def build():
+        from voice_pipeline import SpeechWorker
+        worker = SpeechWorker()
+        worker.prerender(prerender)
+        return worker
+    return shared("speech_worker", build)
+
+
+def _warm_up(llm_model, embedding_model_name):
+    start = time.perf_counter()
+    if embedding_model_name:
+        try:
+            get_embedding_model(embedding_model_name).embed_query("warm up")
+        except Exception:
+            logger.exception("Embedding model warm-up failed")
+    if llm_model:
+        try:
+            #An empty prompt makes Ollama load the model into memory without generating
+            import ollama
+            ollama.Client(host=get_llm(llm_model).base_url).generate(model=llm_model, prompt="")
+        except Exception:
+            logger.exception("LLM warm-up failed")
+    logger.info("Warm-up finished in %.2fs", time.perf_counter() - start)
+
+
+#Load the embedding model and the Ollama model in the background, once per process, so the
+#first question does not pay for them; later calls (reruns, other sessions) are no-ops
+def warm_up(llm_model=LLM_MODEL, embedding_model_name=EMBEDDING_MODEL_NAME):
+    with _registry_lock:
+        if ("llm", llm_model) in _warmed_up:
+            llm_model = None
+        if ("embedding_model", embedding_model_name) in _warmed_up:
+            embedding_model_name = None
+        if not llm_model and not embedding_model_name:
+            return
+        _warmed_up.update({("llm", llm_model), ("embedding_model", embedding_model_name)})
+    threading.Thread(target=_warm_up, args=(llm_model, embedding_model_name), daemon=True,
+                     name="warm-up").start()
@@ -0,0 +1,258 @@
+import json
+import logging
+import os
+import time
+import wave
+from collections import deque
+import numpy as np
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+#All audio is 16 kHz, 16-bit mono, handled in 30 ms frames
+SAMPLE_RATE = 16000
+FRAME_MS = 30
+FRAME_SAMPLES = SAMPLE_RATE * FRAME_MS // 1000
+#Speech-to-text backend: vosk (local, CPU, streaming partial transcripts) or google (online, the old behaviour)
+STT_BACKEND = os.getenv("STT_BACKEND", "vosk")
+VOSK_MODEL_PATH = os.getenv("VOSK_MODEL_PATH", "models/vosk-model-small-en-us-0.15")
+
+#Voice activity detection: a frame is voiced when its RMS exceeds the noise floor times
+#VAD_SPEECH_FACTOR. The floor is measured once over the first CALIBRATION_MS of audio and then
+#follows the background noise on every unvoiced frame.
+SPEECH_FACTOR = float(os.getenv("VAD_SPEECH_FACTOR", 3.0))
+MIN_SPEECH_RMS = 100.0  # Near-digital silence is never speech
+CALIBRATION_MS = 300
+NOISE_ADAPT = 0.05  # Weight of each unvoiced frame in the noise floor's moving average
+SPEECH_START_MS = 90  # Voiced audio needed to start an utterance
+END_SILENCE_MS = int(os.getenv("VAD_END_SILENCE_MS", 450))  # Trailing silence that ends it
+PRE_ROLL_MS = 300  # Audio from before the start, so the first syllable is not clipped
+MAX_UTTERANCE_S = 30
+
+
+def frame_rms(frame):
+    samples = np.frombuffer(frame, dtype=np.int16).astype(np.float32)
+    return float(np.sqrt(np.mean(samples ** 2))) if samples.size else 0.0
+
+
+#Raw frames from a speech_recognition Microphone, until the generator is closed
+def microphone_frames(microphone):
+    with microphone as source:
+        while True:
+            yield source.stream.read(source.CHUNK)
+
+
+def open_microphone():
+    import speech_recognition as sr
+
+    return sr.Microphone(sample_rate=SAMPLE_RATE, chunk_size=FRAME_SAMPLES)
+
+
+#Frames from a 16 kHz 16-bit mono WAV file; realtime paces them like a live microphone
+def wav_frames(path, realtime=False):
+    with wave.open(path, "rb") as wav:
+        if (wav.getframerate(), wav.getsampwidth(), wav.getnchannels()) != (SAMPLE_RATE, 2, 1):
+            raise ValueError(f"{path}: expected a 16 kHz 16-bit mono WAV file")
+        next_at = time.perf_counter()
+        while True:
+            frame = wav.readframes(FRAME_SAMPLES)
+            if len(frame) < FRAME_SAMPLES * 2:
+                return
+            if realtime:
+                next_at += FRAME_MS / 1000
+                time.sleep(max(0.0, next_at - time.perf_counter()))
+            yield frame
+
+
+class NoiseFloor:
+    def __init__(self):
+        self.level = None
+
+    def calibrate(self, rms_values):
+        #The median ignores a cough or a word spoken during calibration
+        self.level = float(np.median(rms_values))
+
+    def update(self, rms):
+        self.level = (1 - NOISE_ADAPT) * self.level + NOISE_ADAPT * rms
+
+    @property
+    def threshold(self):
+        return max(self.level * SPEECH_FACTOR, MIN_SPEECH_RMS)
+
+
+#Frame-level energy VAD with start and end hysteresis. process() returns "start", "end" or None.
+class VoiceActivityDetector:
+    def __init__(self, noise=None):
+        self.noise = noise or NoiseFloor()
+        self._calibration = []
+        self.voiced = False
+        self.in_speech = False
+        self._run = 0
+
+    #Forget an utterance that was cut off (frames ran out, or it hit MAX_UTTERANCE_S); the noise
+    #floor is kept
+    def reset(self):
+        self.voiced = False
+        self.in_speech = False
+        self._run = 0
+
+    def process(self, frame):
+        rms = frame_rms(frame)
+        if self.noise.level is None:
+            self._calibration.append(rms)
+            if len(self._calibration) * FRAME_MS >= CALIBRATION_MS:
+                self.noise.calibrate(self._calibration)
+            return None
+        self.voiced = rms > self.noise.threshold
+        if not self.in_speech:
+            if not self.voiced:
+                self.noise.update(rms)
+            self._run = self._run + 1 if self.voiced else 0
+            if self._run * FRAME_MS >= SPEECH_START_MS:
+                self.in_speech, self._run = True, 0
+                return "start"
+            return None
+        self._run = 0 if self.voiced else self._run + 1
+        if self._run * FRAME_MS >= END_SILENCE_MS:
+            self.in_speech, self._run = False, 0
+            return "end"
+        return None
+
+
+#Local recognizer (https://alphacephei.com/vosk/models); decodes while the user is still talking
+class VoskBackend:
+    def __init__(self, model_path=VOSK_MODEL_PATH):
+        import vosk
+
+        if not os.path.isdir(model_path):
+            raise FileNotFoundError(f"No Vosk model at {model_path}")
+        vosk.SetLogLevel(-1)
+        self._vosk = vosk
+        self._model = vosk.Model(model_path)
+
+    def start(self):
+        return _VoskSession(self._vosk.KaldiRecognizer(self._model, SAMPLE_RATE))
+
+
+class _VoskSession:
+    def __init__(self, recognizer):
+        self.recognizer = recognizer
+        self._final = []
+
+    #Returns the transcript so far
+    def accept(self, frame):
+        if self.recognizer.AcceptWaveform(frame):
+            self._final.append(json.loads(self.recognizer.Result())["text"])
+            return " ".join(t for t in self._final if t)
+        partial = json.loads(self.recognizer.PartialResult())["partial"]
+        return " ".join(t for t in self._final + [partial] if t)
+
+    def finish(self):
+        with span("recognize_vosk"):
+            self._final.append(json.loads(self.recognizer.FinalResult())["text"])
+        return " ".join(t for t in self._final if t)
+
+
+#Google Web Speech API via speech_recognition: no partial transcripts, one request per utterance
+class GoogleBackend:
+    def __init__(self):
+        import speech_recognition as sr
+
+        self._sr = sr
+        self._recognizer = sr.Recognizer()
+
+    def start(self):
+        return _GoogleSession(self)
+
+
+class _GoogleSession:
+    def __init__(self, backend):
+        self.backend = backend
+        self.frames = []
+
+    def accept(self, frame):
+        self.frames.append(frame)
+        return None
+
+    def finish(self):
+        sr = self.backend._sr
+        try:
+            with span("recognize_google", frames=len(self.frames)):
+                return self.backend._recognizer.recognize_google(sr.AudioData(b"".join(self.frames), SAMPLE_RATE, 2))
+        except sr.UnknownValueError:
+            return ""
+        except sr.RequestError:
+            logger.warning("Could not request results; check your network connection.")
+            return ""
+
+
+#vosk needs the package and a downloaded model; installs that have neither keep working on google
+def make_backend(name=STT_BACKEND):
+    backends = {"vosk": VoskBackend, "google": GoogleBackend}
+    if name not in backends:
+        raise ValueError(f"Unknown STT backend: {name}")
+    if name == "vosk":
+        try:
+            return VoskBackend()
+        except (ImportError, FileNotFoundError) as e:
+            logger.warning("Vosk unavailable (%s); using the google STT backend", e)
+            return GoogleBackend()
+    return backends[name]()
+
+
+#Turns a stream of frames into utterances: waits for speech, feeds it (with pre-roll) to the
+#recognizer as it arrives, reports partial transcripts and ends the utterance END_SILENCE_MS
+#after the user stops. Keep one listener per microphone so the noise floor carries over turns.
+class SpeechListener:
+    def __init__(self, backend=None, vad=None):
+        self.backend = backend or make_backend()
+        self.vad = vad or VoiceActivityDetector()
+        self.last_stats = {}
+
+    #Returns the transcript ("" if nothing was understood), or None if the frames ran out
+    #before anyone spoke. on_partial(text) is called whenever the partial transcript changes.
+    def listen(self, frames, on_partial=None):
+        self.vad.reset()
+        pre_roll = deque(maxlen=PRE_ROLL_MS // FRAME_MS)
+        session = None
+        partial = ""
+        position = 0
+        start = last_voiced = None
+        for frame in frames:
+            position += 1
+            event = self.vad.process(frame)
+            if session is None:
+                pre_roll.append(frame)
+                if event != "start":
+                    continue
+                session = self.backend.start()
+                start = position - SPEECH_START_MS // FRAME_MS
+                to_accept = list(pre_roll)
+            else:
+                to_accept = [frame]
+            if self.vad.voiced:
+                last_voiced = position
+            for audio in to_accept:
+                text = session.accept(audio)
+                if text and text != partial:
+                    partial = text
+                    if on_partial is not None:
+                        on_partial(text)
+            if event == "end" or (position - start) * FRAME_MS >= MAX_UTTERANCE_S * 1000:
+                break
+        if session is None:
+            return None
+        finish_start = time.perf_counter()
+        text = session.finish()
+        transcript_ms = (time.perf_counter() - finish_start) * 1000
+        #With live audio, the transcript is ready this long after the user's last voiced frame
+        endpoint_ms = (position - last_voiced) * FRAME_MS
+        self.last_stats = {
+            "speech_start_s": start * FRAME_MS / 1000,
+            "speech_end_s": last_voiced * FRAME_MS / 1000,
+            "endpoint_ms": endpoint_ms,
+            "transcript_ms": round(transcript_ms, 1),
+            "latency_ms": round(endpoint_ms + transcript_ms, 1),
+            "noise_floor": round(self.vad.noise.level, 1),
+        }
+        return text
@@ -0,0 +1,124 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from shared_resources import PERSIST_DIR
+from llm_streaming import stream_llm
+from tracing import current_trace, span
+
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", 4))
+CHUNKS_PER_GROUP = 6  # ~3000 characters of 500-character chunks per map call, on average
+FAN_IN = 4  # Partial summaries merged per reduce call, on average
+
+MAP_PROMPT = "Summarize the following document content:\n\n{text}"
+REDUCE_PROMPT = "Combine the following partial summaries of one document into a single concise summary:\n\n{text}"
+
+
+#Split items into groups of about size items whose boundaries depend on the items themselves:
+#a group ends after an item whose hash picks it (and once it reaches min_size), or at 2 * size.
+#Inserting or editing one item then only changes its own group, where fixed positional
+#windows would shift every later group and miss the cache for all of them.
+def content_defined_groups(items, size, min_size=1):
+    min_size = max(min_size, size // 2)
+    spread = max(1, size - min_size + 1)
+    groups = [[]]
+    for item in items:
+        group = groups[-1]
+        group.append(item)
+        digest = hashlib.sha256(item.encode("utf-8")).digest()
+        if (len(group) >= min_size and int.from_bytes(digest[:8], "little") % spread == 0) or len(group) >= 2 * size:
+            groups.append([])
+    return [group for group in groups if group]
+
+
+#Hierarchical map-reduce summarizer with a per-node summary cache
+class MapReduceSummarizer:
+    def __init__(self, llm, max_concurrency=SUMMARY_CONCURRENCY, chunks_per_group=CHUNKS_PER_GROUP,
+                 fan_in=FAN_IN, cache_path=None):
+        self.llm = llm
+        self.model_name = getattr(llm, "model", type(llm).__name__)
+        self.max_concurrency = max_concurrency
+        self.chunks_per_group = chunks_per_group
+        self.fan_in = fan_in
+        self.llm_calls = 0
+        cache_path = cache_path or os.path.join(PERSIST_DIR, "summary_cache.sqlite")
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(cache_path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS summaries (key BLOB PRIMARY KEY, summary TEXT NOT NULL)")
+        self._db.commit()
+
+    #A node's cache key is the hash of its prompt, so only edited branches miss
+    def _key(self, prompt):
+        return hashlib.sha256(f"{self.model_name}\0{prompt}".encode("utf-8")).digest()
+
+    def _cached(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT summary FROM summaries WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _store(self, key, summary):
+        with self._lock:
+            self.llm_calls += 1
+            self._db.execute("INSERT OR REPLACE INTO summaries VALUES (?, ?)", (key, summary))
+            self._db.commit()
+
+    #trace: the request to record the LLM call in (pool threads do not inherit it)
+    def _summarize_node(self, prompt, trace=None):
+        key = self._key(prompt)
+        summary = self._cached(key)
+        if summary is None:
+            with span("llm.invoke", trace=trace, purpose="summary", prompt_chars=len(prompt)):
+                summary = self.llm.invoke(prompt)
+            self._store(key, summary)
+        return summary
+
+    def _run_level(self, pool, template, groups):
+        prompts = [template.format(text="\n\n".join(group)) for group in groups]
+        trace = current_trace()
+        return list(pool.map(lambda prompt: self._summarize_node(prompt, trace), prompts))
+
+    def _merge(self, pool, summaries):
+        #Unchanged branches give the same (cached) summaries, so their merge groups stay aligned too
+        groups = content_defined_groups(summaries, self.fan_in, min_size=2)
+        merged = self._run_level(pool, REDUCE_PROMPT, [g for g in groups if len(g) > 1])
+        #A lone trailing summary is carried up a level instead of re-summarized
+        if len(groups[-1]) == 1:
+            merged.append(groups[-1][0])
+        return merged
+
+    #Run the tree down to the final prompt (the root), which callers invoke or stream
+    def _root_prompt(self, chunks):
+        groups = content_defined_groups(chunks, self.chunks_per_group)
+        if len(groups) == 1:
+            return MAP_PROMPT.format(text="\n\n".join(groups[0]))
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            summaries = self._run_level(pool, MAP_PROMPT, groups)
+            while len(summaries) > self.fan_in:
+                summaries = self._merge(pool, summaries)
+        return REDUCE_PROMPT.format(text="\n\n".join(summaries))
+
+    #Summarize every chunk: concurrent map over chunk groups, then a tree of merges
+    def summarize(self, chunks):
+        chunks = list(chunks)
+        if not chunks:
+            return ""
+        return self._summarize_node(self._root_prompt(chunks))
+
+    #Same as summarize, but streams the tokens of the final merge
+    def stream_summary(self, chunks, stats=None):
+        chunks = list(chunks)
+        if not chunks:
+            return
+        prompt = self._root_prompt(chunks)
+        key = self._key(prompt)
+        summary = self._cached(key)
+        if summary is not None:
+            yield summary
+            return
+        summary = ""
+        for token in stream_llm(self.llm, prompt, stats):
+            summary += token
+            yield token
+        self._store(key, summary)
@@ -0,0 +1,38 @@
+from langchain_community.chat_message_histories import ChatMessageHistory
+from chat_memory import ConversationMemory
+
+
+class CountingLLM:
+    def __init__(self):
+        self.folds = 0
+
+    def invoke(self, prompt):
+        self.folds += 1
+        return f"summary {self.folds}"
+
+
+def _turn(memory, history, n):
+    memory.build_context(f"question {n}")
+    history.add_user_message(f"question {n}")
+    history.add_ai_message(f"answer {n}")
+    memory.after_turn()
+    memory.wait()
+
+
+#Folds happen after a reply, fold_turns aged-out turns at a time, and unfolded turns stay in the prompt
+def test_folds_run_after_turns_in_batches():
+    llm = CountingLLM()
+    history = ChatMessageHistory()
+    memory = ConversationMemory(llm, history, recent_turns=2, fold_turns=3)
+    for n in range(4):
+        _turn(memory, history, n)
+    assert llm.folds == 0
+    assert "question 0" in memory.build_context("next")
+    assert llm.folds == 0
+    _turn(memory, history, 4)
+    assert llm.folds == 1
+    context = memory.build_context("next")
+    assert "summary 1" in context and "question 0" not in context and "question 3" in context
+    for n in range(5, 8):
+        _turn(memory, history, n)
+    assert llm.folds == 2
@@ -0,0 +1,69 @@
+import threading
+import numpy as np
+from embedding_cache import EmbeddingCache
+
+
+class FakeModel:
+    model_name = "fake"
+
+    def embed_documents(self, texts):
+        return [np.random.default_rng(len(text)).normal(size=8).tolist() for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+#Batched queries skip the document cache: nothing is written or evicted, and the vectors are not
+#rounded to the cache's float16
+def test_embed_queries_bypasses_the_cache(tmp_path):
+    cache = EmbeddingCache(FakeModel(), path=str(tmp_path / "cache.sqlite"))
+    cache.embed_documents(["a stored chunk"])
+    queries = ["what is the limit?", "who wrote it?"]
+    vectors = cache.embed_queries(queries)
+    assert vectors.dtype == np.float32
+    assert np.array_equal(vectors[0], np.float32(cache.embed_query(queries[0])))
+    assert cache._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] == 1
+    assert (cache.hits, cache.misses) == (0, 1)
+
+
+#Freshly computed vectors are returned at full precision; only the cached copy is float16
+def test_misses_are_returned_exactly(tmp_path):
+    model = FakeModel()
+    cache = EmbeddingCache(model, path=str(tmp_path / "cache.sqlite"))
+    texts = ["first chunk", "second, longer chunk"]
+    expected = np.asarray(model.embed_documents(texts), dtype=np.float32)
+    assert np.array_equal(cache.embed_documents(texts), expected)
+    assert np.array_equal(cache.embed_documents(texts), expected.astype(np.float16).astype(np.float32))
+    assert cache.hits == 2
+
+
+class BlockingModel(FakeModel):
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def embed_documents(self, texts):
+        if "slow" in texts[0]:
+            self.started.set()
+            assert self.release.wait(10)
+        return super().embed_documents(texts)
+
+
+#A long model call does not hold up other sessions' cache lookups and embeddings
+def test_model_call_does_not_block_other_callers(tmp_path):
+    model = BlockingModel()
+    cache = EmbeddingCache(model, path=str(tmp_path / "cache.sqlite"))
+    cache.embed_documents(["a stored chunk"])
+    slow = threading.Thread(target=cache.embed_documents, args=(["slow chunk"],))
+    slow.start()
+    assert model.started.wait(10)
+    done = threading.Event()
+    other = threading.Thread(target=lambda: (cache.embed_documents(["a stored chunk", "a new chunk"]), done.set()))
+    other.start()
+    try:
+        assert done.wait(5)
+    finally:
+        model.release.set()
+        slow.join(10)
+        other.join(10)
+    assert cache._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] == 3
@@ -0,0 +1,74 @@
+import multiprocessing
+import threading
+import time
+import numpy as np
+import faiss_store
+from faiss_store import FaissStore
+
+
+def _add_documents(path, tag):
+    store = FaissStore("shared", persist_dir=path)
+    rng = np.random.default_rng(len(tag))
+    for d in range(10):
+        store.add_document(f"{tag}-{d}", [f"{tag} document {d} chunk {i}" for i in range(20)],
+                           rng.normal(size=(20, 384)).astype(np.float32))
+
+
+#Two processes writing one store: every chunk in the docstore must also be in the index
+def test_concurrent_processes_keep_every_vector(tmp_path):
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=_add_documents, args=(str(tmp_path), tag)) for tag in ("a", "bb")]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(120)
+        assert process.exitcode == 0
+    store = FaissStore("shared", persist_dir=str(tmp_path))
+    chunks = store._reader().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+    assert chunks == 400
+    assert len(store) == 400
+
+
+#A document without chunks (nothing extracted, or all duplicates) is not recorded as stored
+def test_documents_without_chunks_are_not_stored(tmp_path):
+    store = FaissStore("empty", persist_dir=str(tmp_path))
+    assert store.add_document("scan.pdf", [], np.empty((0, 384), dtype=np.float32)) == 0
+    assert not store.has_document("scan.pdf")
+    assert store.add_document("scan.pdf", ["now with text"], np.ones((1, 384), dtype=np.float32)) == 1
+    assert store.has_document("scan.pdf")
+
+
+#Opening and searching a namespace nobody wrote to creates no files; the first write does
+def test_namespace_files_are_created_on_first_write(tmp_path):
+    store = FaissStore("reader", persist_dir=str(tmp_path), namespace="visitor")
+    assert not store.has_document("a.pdf")
+    assert store.search(np.ones((1, 384), dtype=np.float32))[1] == []
+    assert store.keyword_search("anything")[1] == []
+    assert not (tmp_path / "reader").exists()
+    store.add_document("a.pdf", ["some text"], np.ones((1, 384), dtype=np.float32))
+    assert store.has_document("a.pdf")
+    assert len(store.keyword_search("text")[1]) == 1
+
+
+#Searches keep running on the current index while a write builds and saves its copy
+def test_search_is_not_blocked_by_a_write(tmp_path, monkeypatch):
+    store = FaissStore("reader", persist_dir=str(tmp_path))
+    store.add_document("a.pdf", ["first"], np.ones((1, 384), dtype=np.float32))
+    saving = threading.Event()
+    write_index = faiss_store.faiss.write_index
+
+    def slow_write_index(index, path):
+        saving.set()
+        time.sleep(2)
+        write_index(index, path)
+
+    monkeypatch.setattr(faiss_store.faiss, "write_index", slow_write_index)
+    writer = threading.Thread(target=store.add_document,
+                              args=("b.pdf", ["second"], np.full((1, 384), 2, dtype=np.float32)))
+    writer.start()
+    assert saving.wait(10)
+    start = time.perf_counter()
+    assert len(store.search(np.ones((1, 384), dtype=np.float32), k=2)[1]) == 1
+    assert time.perf_counter() - start < 1
+    writer.join(10)
+    assert len(store.search(np.ones((1, 384), dtype=np.float32), k=2)[1]) == 2
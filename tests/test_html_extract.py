@@ -0,0 +1,28 @@
+from html_extract import StreamingExtractor, extract
+
+PARAGRAPH = "This paragraph is long enough to count as real article content for the extractor."
+
+
+def test_layout_classes_do_not_drop_content():
+    html = f'<html><body><div id="content" class="has-sidebar"><p>{PARAGRAPH}</p></div></body></html>'
+    assert extract(html)[0] == PARAGRAPH
+    html = f'<html><body><article class="post tag-social"><p>{PARAGRAPH}</p></article></body></html>'
+    assert extract(html)[0] == PARAGRAPH
+
+
+def test_boilerplate_tokens_are_still_dropped():
+    html = (f'<html><body><main><p>{PARAGRAPH}</p></main>'
+            f'<div class="sidebar"><p>Sidebar text that is long enough to be a block on its own.</p></div></body></html>')
+    assert extract(html)[0] == PARAGRAPH
+
+
+def test_highest_scoring_container_is_kept():
+    html = f'<html><body><div class="comments"><p>{PARAGRAPH}</p><p>{PARAGRAPH}</p></div></body></html>'
+    assert extract(html)[0] == f"{PARAGRAPH}\n{PARAGRAPH}"
+
+
+def test_empty_and_unparseable_bodies():
+    assert extract("") == ("", [])
+    assert extract("<!-- nothing here -->") == ("", [])
+    extractor = StreamingExtractor("http://example.com/")
+    assert extractor.close() == ("", [])
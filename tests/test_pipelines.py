@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+import numpy as np
+import pipelines
+from faiss_store import FaissStore
+
+
+class FakeEmbeddings:
+    def embed_documents(self, texts):
+        return [np.random.default_rng(len(text)).normal(size=384).tolist() for text in texts]
+
+
+def _chunks(tag):
+    header = "ACME Corp quarterly report, confidential, do not distribute outside the company."
+    return [f"{header} Page {page}: {tag} results for region {page} grew by {page * 3} percent this quarter."
+            for page in range(20)] + [header] * 5
+
+
+#Duplicates only count within one document: the same PDF under another name is stored whole, so it
+#can be searched and summarized by that name
+def test_reuploaded_document_is_stored_whole(tmp_path):
+    store = FaissStore("reader", persist_dir=str(tmp_path))
+    assert pipelines.store_in_faiss(store, FakeEmbeddings(), "report.pdf", _chunks("sales")) == "Data stored successfully."
+    assert pipelines.store_in_faiss(store, FakeEmbeddings(), "copy.pdf", _chunks("sales")) == "Data stored successfully."
+    assert store.get_document_chunks("copy.pdf") == store.get_document_chunks("report.pdf")
+    #The header repeated on its own is stored once per document
+    assert len(store.get_document_chunks("copy.pdf")) == 21
+
+
+#Two different files uploaded under one name are both stored, and each is summarized from its own chunks
+def test_same_name_different_content_is_stored_separately(tmp_path):
+    store = FaissStore("reader", persist_dir=str(tmp_path))
+    first = pipelines.document_source("report.pdf", b"%PDF sales")
+    second = pipelines.document_source("report.pdf", b"%PDF hiring")
+    assert first != second
+    assert pipelines.store_in_faiss(store, FakeEmbeddings(), first, _chunks("sales")) == "Data stored successfully."
+    assert pipelines.store_in_faiss(store, FakeEmbeddings(), second, _chunks("hiring")) == "Data stored successfully."
+    assert "hiring results" in store.get_document_chunks(second)[0]
+    assert pipelines.store_in_faiss(store, FakeEmbeddings(), first, _chunks("sales")) == "Document already stored."
+
+
+#Within a batch, a page repeating another page's chunks only keeps what is new
+def test_batch_drops_repeats_across_documents(tmp_path):
+    store = FaissStore("crawl", persist_dir=str(tmp_path))
+    stored, stats = pipelines.store_documents_in_faiss(store, FakeEmbeddings(),
+                                                       [("a", _chunks("sales")), ("b", _chunks("sales"))])
+    assert stored == ["a"]
+    assert stats["removed"] == 25 + 4
+
+
+class FakePageCache:
+    def __init__(self, text):
+        self.text = text
+
+    def get(self, url, extract):
+        return SimpleNamespace(text=self.text, status="fetched")
+
+
+#Failures come back as an error, separate from the text, which may well mention errors itself
+def test_scrape_web_page_returns_errors_separately():
+    text = "Troubleshooting: an error occurred? Failed logins are listed below."
+    assert pipelines.scrape_web_page("http://example.com", FakePageCache(text)) == (text, None)
+    text, error = pipelines.scrape_web_page("http://example.com", FakePageCache(None))
+    assert text is None and error == "Failed to fetch http://example.com"
@@ -0,0 +1,28 @@
+import os
+import threading
+import numpy as np
+import faiss_store
+import shared_resources
+
+
+def _open_files():
+    return len(os.listdir("/proc/self/fd"))
+
+
+#Stores for workspaces nobody uses any more are dropped and their files closed
+def test_idle_vector_stores_are_evicted(tmp_path, monkeypatch):
+    monkeypatch.setattr(faiss_store, "PERSIST_DIR", str(tmp_path))
+    monkeypatch.setattr(shared_resources, "VECTOR_STORE_CACHE", 2)
+    before = _open_files()
+    for n in range(20):
+        store = shared_resources.get_vector_store("test_app", f"session-{n}")
+        store.add_document("a.pdf", ["some text"], np.ones((1, 384), dtype=np.float32))
+        #Searches from another thread open a per-thread reader connection
+        thread = threading.Thread(target=store.keyword_search, args=("text",))
+        thread.start()
+        thread.join()
+    del store
+    stores = [key for key in shared_resources._instances if key[:2] == ("vector_store", "test_app")]
+    assert stores == [("vector_store", "test_app", "session-18"), ("vector_store", "test_app", "session-19")]
+    assert _open_files() - before <= 2 * 5
+    assert shared_resources.get_vector_store("test_app", "session-0").has_document("a.pdf")
@@ -0,0 +1,41 @@
+import numpy as np
+import speech_input
+from speech_input import FRAME_SAMPLES, SpeechListener
+
+
+class FakeBackend:
+    def start(self):
+        return FakeSession()
+
+
+class FakeSession:
+    def __init__(self):
+        self.frames = 0
+
+    def accept(self, frame):
+        self.frames += 1
+
+    def finish(self):
+        return f"{self.frames} frames"
+
+
+def _frames(level, count, rng):
+    return [(rng.normal(size=FRAME_SAMPLES) * level).astype(np.int16).tobytes() for _ in range(count)]
+
+
+#An utterance cut off when the frames ran out must not make the next listen() miss a whole one
+def test_listen_starts_fresh_after_a_cut_off_utterance():
+    rng = np.random.default_rng(0)
+    listener = SpeechListener(FakeBackend())
+    assert listener.listen(_frames(50, 20, rng) + _frames(3000, 20, rng)) is not None
+    assert listener.vad.noise.level is not None
+    assert listener.listen(_frames(50, 10, rng) + _frames(3000, 20, rng) + _frames(50, 30, rng)) is not None
+
+
+#Without the vosk package (as here) or its model, the default backend falls back to google
+def test_missing_vosk_falls_back_to_google(monkeypatch):
+    class Google:
+        pass
+
+    monkeypatch.setattr(speech_input, "GoogleBackend", Google)
+    assert isinstance(speech_input.make_backend("vosk"), Google)
@@ -0,0 +1,22 @@
+import hashlib
+import random
+from summarizer import MapReduceSummarizer
+
+
+class HashLLM:
+    model = "fake"
+
+    def invoke(self, prompt):
+        return "summary " + hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+
+
+#Inserting a chunk into an already summarized document only recomputes the branches around it
+def test_inserted_chunk_only_recomputes_its_branch(tmp_path):
+    rng = random.Random(0)
+    chunks = [f"chunk {i} " + " ".join(rng.choice("abcdefghij") for _ in range(50)) for i in range(300)]
+    summarizer = MapReduceSummarizer(HashLLM(), cache_path=str(tmp_path / "summaries.sqlite"))
+    summarizer.summarize(chunks)
+    first = summarizer.llm_calls
+    summarizer.summarize(chunks[:150] + ["a new paragraph"] + chunks[150:])
+    assert first > 50
+    assert summarizer.llm_calls - first <= 8
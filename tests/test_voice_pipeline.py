@@ -0,0 +1,36 @@
+import time
+from voice_pipeline import CachedSpeechBackend, SpeechWorker, speak_stream
+
+RENDER_S = 0.2
+
+
+class SlowRenderer:
+    def render(self, text):
+        time.sleep(RENDER_S)
+        return text.encode()
+
+
+class RecordingPlayer:
+    def __init__(self):
+        self.started = []
+
+    def reset(self):
+        pass
+
+    def play(self, wav):
+        self.started.append(time.perf_counter())
+
+    def stop(self):
+        pass
+
+
+#Time to first audio includes rendering the first sentence: it is measured to when playback starts
+def test_first_audio_is_stamped_when_playback_starts():
+    player = RecordingPlayer()
+    worker = SpeechWorker(lambda: CachedSpeechBackend(SlowRenderer(), player))
+    start = time.perf_counter()
+    _, stats = speak_stream(iter(["Hello there, this is the answer. "]), worker)
+    worker.close()
+    assert stats["time_to_first_audio_s"] >= RENDER_S
+    assert abs(worker.first_audio_at - player.started[0]) < 0.05
+    assert player.started[0] - start >= RENDER_S
@@ -0,0 +1,66 @@
+import threading
+import html_extract
+from benchmarks.site_server import start_site
+from web_crawler import WebCrawler
+
+
+#Run the crawl on a thread so a hang fails the test instead of blocking the suite
+def crawl(crawler, seeds, timeout=30):
+    pages = []
+    thread = threading.Thread(target=lambda: pages.extend(crawler.iter_pages(seeds)), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "crawl did not finish"
+    return pages
+
+
+def test_empty_pages_do_not_hang_the_crawl():
+    files = {f"/empty/{n}": "" for n in range(40)}
+    server, base_url = start_site(pages=0, latency=0, files=files)
+    try:
+        crawler = WebCrawler(max_depth=0, concurrency=8)
+        pages = crawl(crawler, [base_url + path for path in files])
+    finally:
+        server.shutdown()
+    assert len(pages) == 40
+    assert all(page.text == "" for page in pages)
+
+
+def test_extraction_errors_are_counted_and_workers_survive(monkeypatch):
+    def fail(self):
+        raise ValueError("broken page")
+
+    monkeypatch.setattr(html_extract.StreamingExtractor, "close", fail)
+    monkeypatch.setattr("web_crawler.HTML_EXTRACTOR", "lxml")
+    files = {f"/page-{n}": "<p>text</p>" for n in range(40)}
+    server, base_url = start_site(pages=0, latency=0, files=files)
+    try:
+        crawler = WebCrawler(max_depth=0, concurrency=8)
+        pages = crawl(crawler, [base_url + path for path in files])
+    finally:
+        server.shutdown()
+    assert pages == []
+    assert crawler.errors == 40
+
+
+def test_malformed_sitemap_is_skipped():
+    server, base_url = start_site(pages=0, latency=0, files={"/broken.xml": "<urlset><url>"})
+    try:
+        crawler = WebCrawler(max_depth=0)
+        pages = crawl(crawler, [base_url + "/broken.xml"])
+    finally:
+        server.shutdown()
+    assert pages == []
+    assert crawler.errors == 1
+
+
+#Concurrent workers must not overshoot the page limit, from a sitemap or following links
+def test_max_pages_is_enforced():
+    server, base_url = start_site(pages=100, latency=0.02)
+    try:
+        crawler = WebCrawler(max_depth=0, max_pages=5, concurrency=32)
+        assert len(crawl(crawler, [base_url + "/sitemap.xml"])) == 5
+        crawler = WebCrawler(max_depth=3, max_pages=20, concurrency=32)
+        assert len(crawl(crawler, [base_url + "/page/0"])) == 20
+    finally:
+        server.shutdown()
@@ -0,0 +1,229 @@
+import bisect
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+#Stage timings for every app: spans are recorded into the current request's trace (for the
+#waterfall), into Prometheus-style histograms (served on METRICS_PORT, 0 = off) and, at INFO
+#level, as one JSON log line per span
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_current = contextvars.ContextVar("trace", default=None)
+
+
+#Timings of one request (a question, an upload, a voice turn); spans are (name, start offset s,
+#duration s, attrs) in the order they finished
+class Trace:
+    def __init__(self, name, attrs=None):
+        self.name = name
+        self.id = uuid.uuid4().hex[:12]
+        self.attrs = attrs or {}
+        self.start = time.perf_counter()
+        self.duration = None
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, name, start, end, attrs):
+        with self._lock:
+            self.spans.append((name, start - self.start, end - start, attrs))
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+
+_metrics_lock = threading.Lock()
+_stage_seconds = {}
+_stage_errors = {}
+_request_seconds = {}
+
+
+def _observe(histograms, label, seconds):
+    with _metrics_lock:
+        histogram = histograms.get(label)
+        if histogram is None:
+            histogram = histograms[label] = Histogram()
+        histogram.observe(seconds)
+
+
+def current_trace():
+    return _current.get()
+
+
+#Record a finished stage; trace defaults to the request being handled on this thread
+def record_span(name, start, end, trace=None, **attrs):
+    _observe(_stage_seconds, name, end - start)
+    if "error" in attrs:
+        with _metrics_lock:
+            _stage_errors[name] = _stage_errors.get(name, 0) + 1
+    trace = trace or _current.get()
+    if trace is not None:
+        trace.add(name, start, end, attrs)
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("span %s", json.dumps({"stage": name, "ms": round((end - start) * 1000, 3),
+                                           "trace_id": trace.id if trace else None, **attrs}, default=str))
+
+
+#Time a block as one stage. Yields the span's attrs dict so the block can add results
+#(hit counts, status); an exception is recorded as the error attr and re-raised.
+@contextmanager
+def span(name, trace=None, **attrs):
+    start = time.perf_counter()
+    try:
+        yield attrs
+    except Exception as e:
+        attrs["error"] = type(e).__name__
+        raise
+    finally:
+        record_span(name, start, time.perf_counter(), trace, **attrs)
+
+
+#Pass items through, recording one span with the time spent producing them (not the time the
+#consumer spends between items), e.g. PDF pages extracted lazily while they are being chunked
+def traced_iter(name, iterable, **attrs):
+    iterator = iter(iterable)
+    trace = _current.get()
+    first = None
+    busy = 0.0
+    items = 0
+    try:
+        while True:
+            start = time.perf_counter()
+            first = first or start
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                busy += time.perf_counter() - start
+            items += 1
+            yield item
+    finally:
+        if first is not None:
+            record_span(name, first, first + busy, trace, items=items, **attrs)
+
+
+#Group the spans of a request into one timed operation (with trace("ask") as t: ...)
+@contextmanager
+def trace(name, **attrs):
+    t = Trace(name, attrs)
+    token = _current.set(t)
+    try:
+        yield t
+    finally:
+        _current.reset(token)
+        t.duration = time.perf_counter() - t.start
+        _observe(_request_seconds, name, t.duration)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("trace %s", json.dumps({"request": name, "trace_id": t.id, "ms": round(t.duration * 1000, 3),
+                                                "stages": len(t.spans), **attrs}, default=str))
+
+
+#Spans grouped by stage in order of first appearance: (stage, first start s, busy s, calls)
+def waterfall(t):
+    rows = {}
+    for name, offset, duration, _ in sorted(t.spans, key=lambda s: s[1]):
+        row = rows.setdefault(name, [name, offset, 0.0, 0])
+        row[2] += duration
+        row[3] += 1
+    return [tuple(row) for row in rows.values()]
+
+
+#One-line summary for terminals and logs
+def format_trace(t):
+    total = t.duration if t.duration is not None else time.perf_counter() - t.start
+    stages = " · ".join(f"{name} {busy * 1000:.0f} ms" + (f" ×{calls}" if calls > 1 else "")
+                        for name, _, busy, calls in waterfall(t))
+    return f"⏱️ {t.name} {total * 1000:.0f} ms: {stages}"
+
+
+#Draw the waterfall into a Streamlit container (e.g. st.sidebar): one bar per stage, placed at
+#its first start and as wide as its busy time
+def render_waterfall(t, container):
+    rows = waterfall(t)
+    end = max([t.duration or 0.0] + [offset + busy for _, offset, busy, _ in rows]) or 1e-9
+    html = [f"<div style='font-size:0.8em'><b>{t.name}</b> · {end * 1000:.0f} ms"]
+    for name, offset, busy, calls in rows:
+        label = f"{name} {busy * 1000:.1f} ms" + (f" ×{calls}" if calls > 1 else "")
+        html.append(f"<div>{label}</div><div style='background:#eee;height:8px;position:relative'>"
+                    f"<div style='position:absolute;left:{offset / end:.1%};width:{max(busy / end, 0.005):.1%};"
+                    f"height:8px;background:#4A90E2'></div></div>")
+    html.append("</div>")
+    container.markdown("".join(html), unsafe_allow_html=True)
+
+
+def _histogram_lines(metric, label, histograms):
+    lines = []
+    for value, histogram in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ("+Inf",), histogram.counts):
+            cumulative += count
+            lines.append(f'{metric}_bucket{{{label}="{value}",le="{bound}"}} {cumulative}')
+        lines.append(f'{metric}_sum{{{label}="{value}"}} {histogram.sum:.6f}')
+        lines.append(f'{metric}_count{{{label}="{value}"}} {histogram.count}')
+    return lines
+
+
+#Prometheus text exposition format
+def metrics_text():
+    with _metrics_lock:
+        lines = ["# HELP ai_agent_stage_seconds Time spent in each pipeline stage.",
+                 "# TYPE ai_agent_stage_seconds histogram"]
+        lines += _histogram_lines("ai_agent_stage_seconds", "stage", _stage_seconds)
+        lines += ["# HELP ai_agent_stage_errors_total Stages that raised an exception.",
+                  "# TYPE ai_agent_stage_errors_total counter"]
+        lines += [f'ai_agent_stage_errors_total{{stage="{name}"}} {count}' for name, count in sorted(_stage_errors.items())]
+        lines += ["# HELP ai_agent_request_seconds End-to-end time of each request type.",
+                  "# TYPE ai_agent_request_seconds histogram"]
+        lines += _histogram_lines("ai_agent_request_seconds", "request", _request_seconds)
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_response(404)
+            self.end_headers()
+            return
+        data = metrics_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+#Serve /metrics on port in a background thread; returns the server, or None if the port is
+#0 or already taken (e.g. by another app on the same machine)
+def start_metrics_server(port=METRICS_PORT):
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+    except OSError as e:
+        logger.warning("metrics endpoint not started on port %s: %s", port, e)
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info("Serving metrics on http://localhost:%s/metrics", port)
+    return server
@@ -0,0 +1,348 @@
+import io
+import logging
+import os
+import queue
+import re
+import tempfile
+import threading
+import time
+import wave
+from collections import OrderedDict
+from speech_input import frame_rms
+from tracing import current_trace, span
+
+logger = logging.getLogger(__name__)
+
+#A sentence ends at . ! ? (plus closing quotes/brackets) followed by whitespace, or at a line break
+SENTENCE_END = re.compile(r"""[.!?]+["')\]]*\s+|\n+""")
+#Shorter pieces ("1.", "Yes.") are joined to the next sentence rather than spoken on their own
+MIN_SENTENCE_CHARS = 12
+ABBREVIATIONS = {"e.g.", "i.e.", "mr.", "mrs.", "ms.", "dr.", "st.", "vs.", "no."}
+#Barge-in: the user is talking over the assistant once this many consecutive mic frames are
+#louder than the speech threshold times BARGE_IN_FACTOR (the assistant's own voice
+#leaks into the mic, so the plain speech threshold would trigger on it)
+BARGE_IN_FACTOR = float(os.getenv("BARGE_IN_FACTOR", 2.0))
+BARGE_IN_FRAMES = 3
+#Sentences are rendered to WAV and the last TTS_WAV_CACHE of them kept for instant replay;
+#0 speaks straight through pyttsx3 instead
+TTS_WAV_CACHE = int(os.getenv("TTS_WAV_CACHE", 64))
+
+
+def _sentence_end(text):
+    for match in SENTENCE_END.finditer(text):
+        if len(text[:match.end()].strip()) < MIN_SENTENCE_CHARS:
+            continue
+        words = text[:match.start() + 1].split()
+        if words and words[-1].lower() in ABBREVIATIONS:
+            continue
+        return match.end()
+    return None
+
+
+class SentenceSplitter:
+    def __init__(self):
+        self.buffer = ""
+
+    #Add a token; returns the sentences it completed
+    def feed(self, token):
+        self.buffer += token
+        sentences = []
+        end = _sentence_end(self.buffer)
+        while end is not None:
+            sentences.append(self.buffer[:end].strip())
+            self.buffer = self.buffer[end:]
+            end = _sentence_end(self.buffer)
+        return sentences
+
+    def flush(self):
+        rest, self.buffer = self.buffer.strip(), ""
+        return [rest] if rest else []
+
+
+#Regroup a stream of LLM tokens into whole sentences as soon as each one is complete
+def split_sentences(tokens):
+    splitter = SentenceSplitter()
+    for token in tokens:
+        yield from splitter.feed(token)
+    yield from splitter.flush()
+
+
+#pyttsx3 voice; created on the speech worker thread, which is the only thread that may drive it
+class Pyttsx3Backend:
+    def __init__(self, rate=160):
+        import pyttsx3
+
+        self.engine = pyttsx3.init()
+        self.engine.setProperty("rate", rate)
+
+    def say(self, text):
+        self.engine.say(text)
+        self.engine.runAndWait()
+
+    #Called from other threads to cut the current utterance short
+    def stop(self):
+        self.engine.stop()
+
+    #Synthesize text to WAV bytes without playing it
+    def render(self, text):
+        fd, path = tempfile.mkstemp(suffix=".wav")
+        os.close(fd)
+        try:
+            self.engine.save_to_file(text, path)
+            self.engine.runAndWait()
+            with open(path, "rb") as f:
+                return f.read()
+        finally:
+            os.remove(path)
+
+
+#Plays WAV bytes through PyAudio (already installed for the microphone) in 20 ms chunks, so
+#stop() takes effect almost immediately
+class WavPlayer:
+    def __init__(self):
+        import pyaudio
+
+        self._audio = pyaudio.PyAudio()
+        self._stop = threading.Event()
+
+    #Clear a previous stop() before rendering the next sentence, so a stop() that arrives while
+    #it renders still prevents it from playing
+    def reset(self):
+        self._stop.clear()
+
+    def play(self, wav_bytes):
+        with wave.open(io.BytesIO(wav_bytes)) as wav:
+            stream = self._audio.open(format=self._audio.get_format_from_width(wav.getsampwidth()),
+                                      channels=wav.getnchannels(), rate=wav.getframerate(), output=True)
+            try:
+                chunk = wav.getframerate() // 50
+                data = wav.readframes(chunk)
+                while data and not self._stop.is_set():
+                    stream.write(data)
+                    data = wav.readframes(chunk)
+            finally:
+                stream.stop_stream()
+                stream.close()
+
+    def stop(self):
+        self._stop.set()
+
+
+#Renders each sentence to WAV once and replays repeats (greetings, "Sorry, I did not understand
+#that.") from an LRU cache of max_items sentences. on_play, if set, is called once a sentence is
+#rendered and its playback is starting.
+class CachedSpeechBackend:
+    def __init__(self, backend, player, max_items=TTS_WAV_CACHE):
+        self.backend = backend
+        self.player = player
+        self.max_items = max_items
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.on_play = None
+
+    def render(self, text):
+        wav = self._cache.get(text)
+        if wav is not None:
+            self._cache.move_to_end(text)
+            self.hits += 1
+            return wav
+        self.misses += 1
+        wav = self._cache[text] = self.backend.render(text)
+        while len(self._cache) > self.max_items:
+            self._cache.popitem(last=False)
+        return wav
+
+    def say(self, text):
+        self.player.reset()
+        wav = self.render(text)
+        if self.on_play is not None:
+            self.on_play()
+        self.player.play(wav)
+
+    def stop(self):
+        self.player.stop()
+
+
+def default_speech_backend():
+    backend = Pyttsx3Backend()
+    if TTS_WAV_CACHE <= 0:
+        return backend
+    return CachedSpeechBackend(backend, WavPlayer())
+
+
+#Speaks queued sentences one after another on a long-lived background thread, so the TTS
+#engine starts once rather than on every reply and callers never block on speech.
+#backend_factory builds the TTS backend (say(text) blocks while speaking, stop() interrupts it,
+#optional render(text) pre-renders) on that thread.
+class SpeechWorker:
+    def __init__(self, backend_factory=default_speech_backend):
+        self._queue = queue.Queue()
+        self._cond = threading.Condition()
+        self._pending = 0
+        #Bumped by cancel(); sentences queued before that are dropped unspoken
+        self._generation = 0
+        self._backend = None
+        self._ready = threading.Event()
+        self.first_audio_at = None
+        threading.Thread(target=self._run, args=(backend_factory,), daemon=True).start()
+
+    def _run(self, backend_factory):
+        #Without a backend, queued sentences are dropped so callers never wait forever
+        try:
+            self._backend = backend_factory()
+        except Exception:
+            logger.exception("text-to-speech backend failed to start")
+        #Backends that render before playing report when playback starts; others speak at once
+        timed_by_backend = hasattr(self._backend, "on_play")
+        if timed_by_backend:
+            self._backend.on_play = self._audio_started
+        self._ready.set()
+        while True:
+            generation, text, play, trace = self._queue.get()
+            if text is None:
+                return
+            try:
+                if self._backend is None:
+                    pass
+                elif not play:
+                    if hasattr(self._backend, "render"):
+                        with span("tts.render", trace=trace, chars=len(text)):
+                            self._backend.render(text)
+                elif generation == self._generation:
+                    if not timed_by_backend:
+                        self._audio_started()
+                    with span("speak", trace=trace, chars=len(text)):
+                        self._backend.say(text)
+            except Exception:
+                logger.exception("text-to-speech failed")
+            finally:
+                with self._cond:
+                    self._pending -= 1
+                    self._cond.notify_all()
+
+    def _audio_started(self):
+        if self.first_audio_at is None:
+            self.first_audio_at = time.perf_counter()
+
+    #Queue text to be spoken; returns immediately. The sentence is timed as part of the
+    #caller's current trace.
+    def say(self, text):
+        with self._cond:
+            self._pending += 1
+        self._queue.put((self._generation, text, True, current_trace()))
+
+    #Render phrases into the WAV cache ahead of time (ignored by backends without one)
+    def prerender(self, texts):
+        for text in texts:
+            with self._cond:
+                self._pending += 1
+            self._queue.put((self._generation, text, False, current_trace()))
+
+    @property
+    def speaking(self):
+        return self._pending > 0
+
+    #Stop the sentence being spoken and go on with the next one
+    def skip(self):
+        self._ready.wait()
+        if self._backend is not None:
+            self._backend.stop()
+
+    #Drop everything queued and stop the sentence being spoken
+    def cancel(self):
+        self._generation += 1
+        self.skip()
+
+    #Block until everything queued has been spoken, or until stop (an Event) is set
+    def wait(self, stop=None):
+        with self._cond:
+            while self._pending and not (stop is not None and stop.is_set()):
+                self._cond.wait(0.05)
+
+    def close(self):
+        self._queue.put((self._generation, None, True, None))
+
+
+#Pass tokens through unchanged (e.g. into st.write_stream) while queueing each sentence to the
+#worker as soon as it is complete; speech carries on in the background after the last token
+def speak_as_generated(tokens, worker):
+    splitter = SentenceSplitter()
+    for token in tokens:
+        yield token
+        for sentence in splitter.feed(token):
+            worker.say(sentence)
+    for sentence in splitter.flush():
+        worker.say(sentence)
+
+
+#Speak an LLM token stream sentence by sentence while it is still being generated, so audio
+#starts after the first sentence instead of the whole answer. Setting interrupted (an Event,
+#e.g. BargeInMonitor.interrupted) stops both generation and speech.
+#Returns (text generated, stats).
+def speak_stream(tokens, worker, interrupted=None):
+    interrupted = interrupted or threading.Event()
+    start = time.perf_counter()
+    worker.first_audio_at = None
+    parts = []
+
+    def read_tokens():
+        for token in tokens:
+            if interrupted.is_set():
+                return
+            parts.append(token)
+            yield token
+
+    sentences = 0
+    try:
+        for sentence in split_sentences(read_tokens()):
+            if interrupted.is_set():
+                break
+            worker.say(sentence)
+            sentences += 1
+        worker.wait(interrupted)
+    finally:
+        #Closing the LLM stream ends the HTTP request instead of generating tokens nobody hears
+        if hasattr(tokens, "close"):
+            tokens.close()
+    if interrupted.is_set():
+        worker.cancel()
+    first_audio = worker.first_audio_at
+    stats = {
+        "time_to_first_audio_s": round(first_audio - start, 3) if first_audio else None,
+        "total_s": round(time.perf_counter() - start, 3),
+        "sentences": sentences,
+        "interrupted": interrupted.is_set(),
+    }
+    return "".join(parts), stats
+
+
+#Watches audio frames on a background thread while the assistant talks and sets interrupted
+#as soon as the user starts speaking over it
+class BargeInMonitor:
+    def __init__(self, frames, threshold, min_frames=BARGE_IN_FRAMES):
+        self.interrupted = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(frames, threshold, min_frames), daemon=True)
+        self._thread.start()
+
+    def _run(self, frames, threshold, min_frames):
+        loud = 0
+        try:
+            for frame in frames:
+                if self._stop.is_set():
+                    return
+                loud = loud + 1 if frame_rms(frame) > threshold else 0
+                if loud >= min_frames:
+                    self.interrupted.set()
+                    return
+        except Exception:
+            logger.exception("barge-in monitor failed")
+        finally:
+            #Release the microphone so the next listen() can open it
+            if hasattr(frames, "close"):
+                frames.close()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=1)
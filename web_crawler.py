@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+import aiohttp
+from html_extract import HTML_EXTRACTOR, StreamingExtractor, extract
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "Mozilla/5.0"
+CrawledPage = namedtuple("CrawledPage", ["url", "depth", "text"])
+
+#Sentinel pushed by the crawler thread when it is finished
+_DONE = object()
+
+
+READ_CHUNK = 64 * 1024
+
+
+#Same text extraction as scrape_web_page, plus the page's outgoing links
+def parse_page(html, base_url):
+    return extract(html, base_url)
+
+
+def parse_sitemap(xml):
+    root = ET.fromstring(xml)
+    namespace = root.tag.split("}")[0] + "}" if root.tag.startswith("{") else ""
+    locs = [loc.text.strip() for loc in root.iter(f"{namespace}loc") if loc.text]
+    #A sitemap index lists further sitemaps rather than pages
+    return root.tag.endswith("sitemapindex"), locs
+
+
+#Asyncio crawler: pooled keep-alive connections, per-host limits, robots.txt, bounded output queue
+class WebCrawler:
+    def __init__(self, max_depth=1, max_pages=1000, concurrency=32, per_host=4, timeout=15,
+                 same_host=True, queue_size=64, user_agent=USER_AGENT):
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.same_host = same_host
+        self.queue_size = queue_size
+        self.user_agent = user_agent
+        self.pages_fetched = 0
+        self.errors = 0
+        #Fetches under way; they count against max_pages until they fail or finish
+        self._in_flight = 0
+        self._stop = threading.Event()
+
+    async def _fetch(self, session, url):
+        host = urlparse(url).netloc
+        async with self._host_limits.setdefault(host, asyncio.Semaphore(self.per_host)):
+            async with session.get(url) as response:
+                if response.status != 200:
+                    return None
+                return await response.text(errors="replace")
+
+    #Fetch url and return (text, links); with lxml the body is parsed as it streams in
+    async def _fetch_page(self, session, url):
+        if HTML_EXTRACTOR == "bs4":
+            html = await self._fetch(session, url)
+            #Parsing is CPU work; keep it off the event loop
+            return None if html is None else await asyncio.to_thread(parse_page, html, url)
+        host = urlparse(url).netloc
+        async with self._host_limits.setdefault(host, asyncio.Semaphore(self.per_host)):
+            async with session.get(url) as response:
+                if response.status != 200:
+                    return None
+                extractor = StreamingExtractor(url)
+                async for chunk in response.content.iter_chunked(READ_CHUNK):
+                    extractor.feed(chunk)
+        #Scoring the finished tree is the expensive part; keep it off the event loop
+        return await asyncio.to_thread(extractor.close)
+
+    async def _allowed(self, session, url):
+        parts = urlparse(url)
+        root = f"{parts.scheme}://{parts.netloc}"
+        if root not in self._robots:
+            parser = RobotFileParser()
+            try:
+                robots = await self._fetch(session, root + "/robots.txt")
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                robots = None
+            parser.parse(robots.splitlines() if robots else [])
+            self._robots[root] = parser
+        return self._robots[root].can_fetch(self.user_agent, url)
+
+    async def _expand_sitemaps(self, session, seeds):
+        urls = []
+        pending = list(seeds)
+        while pending:
+            url = pending.pop()
+            if not urlparse(url).path.endswith(".xml"):
+                urls.append(url)
+                continue
+            try:
+                xml = await self._fetch(session, url)
+                if xml:
+                    is_index, locs = parse_sitemap(xml)
+                    (pending if is_index else urls).extend(locs)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ET.ParseError) as e:
+                logger.warning("Skipping sitemap %s: %s", url, e)
+                self.errors += 1
+        return urls
+
+    async def _worker(self, session, frontier, out):
+        while True:
+            url, depth = await frontier.get()
+            try:
+                if self._stop.is_set() or self.pages_fetched >= self.max_pages:
+                    continue
+                if not await self._allowed(session, url):
+                    continue
+                #Checked and claimed with no await in between, so workers cannot all pass the
+                #check together and fetch more than max_pages
+                if self._stop.is_set() or self.pages_fetched + self._in_flight >= self.max_pages:
+                    continue
+                self._in_flight += 1
+                try:
+                    page = await self._fetch_page(session, url)
+                finally:
+                    self._in_flight -= 1
+                if page is None:
+                    self.errors += 1
+                    continue
+                self.pages_fetched += 1
+                text, links = page
+                #Blocks while the consumer is behind: this is the backpressure
+                await out(CrawledPage(url, depth, text))
+                if depth < self.max_depth:
+                    for link in links:
+                        if link not in self._seen and (not self.same_host or urlparse(link).netloc in self._hosts):
+                            self._seen.add(link)
+                            frontier.put_nowait((link, depth + 1))
+            except (aiohttp.ClientError, asyncio.TimeoutError, UnicodeDecodeError):
+                self.errors += 1
+            except Exception:
+                #A page that breaks extraction must not take its worker down: once every worker
+                #has died, frontier.join() never returns and the crawl hangs
+                logger.exception("Failed to extract %s", url)
+                self.errors += 1
+            finally:
+                frontier.task_done()
+
+    #Crawl from seed URLs (sitemap .xml URLs are expanded), awaiting out(page) for each page
+    async def crawl(self, seeds, out):
+        self._host_limits = {}
+        self._robots = {}
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.per_host)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                         headers={"User-Agent": self.user_agent}) as session:
+            seeds = await self._expand_sitemaps(session, seeds)
+            self._hosts = {urlparse(url).netloc for url in seeds}
+            self._seen = set(seeds)
+            frontier = asyncio.Queue()
+            for url in seeds:
+                frontier.put_nowait((url, 0))
+            workers = [asyncio.create_task(self._worker(session, frontier, out)) for _ in range(self.concurrency)]
+            await frontier.join()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    #Synchronous generator over crawled pages; the crawl runs on its own event loop thread
+    #and pauses whenever queue_size pages are waiting to be consumed
+    def iter_pages(self, seeds):
+        pages = queue.Queue(maxsize=self.queue_size)
+
+        async def out(page):
+            await asyncio.to_thread(pages.put, page)
+
+        def run():
+            try:
+                asyncio.run(self.crawl(seeds, out))
+            finally:
+                pages.put(_DONE)
+
+        self._stop.clear()
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        self.started_at = time.perf_counter()
+        self.finished_at = None
+        try:
+            while True:
+                page = pages.get()
+                if page is _DONE:
+                    return
+                yield page
+        finally:
+            self.finished_at = time.perf_counter()
+            #Consumer stopped early: let the workers wind down and unblock any pending put
+            self._stop.set()
+            while thread.is_alive():
+                try:
+                    pages.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+
+    @property
+    def pages_per_second(self):
+        elapsed = (self.finished_at or time.perf_counter()) - self.started_at
+        return self.pages_fetched / elapsed if elapsed > 0 else 0.0